@@ -1,6 +1,10 @@
 import os, json
 from typing import Union
+import uuid
+import errno
+import shutil
 import logging
+import itertools
 import urllib.error
 import aiofiles
 import json
@@ -9,6 +13,12 @@ from asyncio import Lock
 import urllib
 from requests_toolbelt import MultipartEncoder
 from security import FileValidator
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+FICLONE = 0x40049409    # linux/fs.h의 reflink ioctl
 
 # Manage json file
 class AsyncJsonWrapper:
@@ -51,19 +61,9 @@ def make_workflow_alias_list_and_map(wf_dir, wf_alias_fn) -> dict:
     with open(wf_alias_fn, mode="r") as f:
         jsonlike = json.load(f)
     
+    # thumbnail은 파일 이름만 보관하고, 이미지는 /thumbnail에서 제공합니다.
     wf_alias_list_with_desc = jsonlike
-    for idx, cur in enumerate(jsonlike):
-
-        # thumbnail 이미지 정보 추가
-        thumbnail_fn = cur.get("thumbnail", None)
-        if thumbnail_fn is None:
-            continue
-        thumbnail_path = os.path.join(wf_dir, "thumbnail", thumbnail_fn)
-        thumbnail_byte = open_image(thumbnail_path)
-        thumbnail_b64 = encode_byte_base64(thumbnail_byte)
 
-        wf_alias_list_with_desc[idx]["thumbnail"] = thumbnail_b64
-        
     wf_fns = [cur["fn"] for cur in jsonlike]
     wf_alias_map = {cur["alias"]:cur["fn"] for cur in jsonlike}
     
@@ -116,6 +116,20 @@ def get_queue_state(server_address):
     with urllib.request.urlopen(f"http://{server_address}/queue") as response:
         return json.loads(response.read())
 
+def get_system_stats(server_address, timeout=5):
+    """
+    ComfyUI 서버의 시스템 상태를 가져옵니다. 서버가 살아있는지 확인하는 데 사용합니다.
+    
+    Args:
+        server_address (str): 확인할 ComfyUI 서버주소
+        timeout (int, optional): 응답을 기다릴 시간(초). 기본값은 5초입니다.
+    
+    Returns:
+        dict: 시스템 상태를 JSON 형식으로 반환
+    """
+    with urllib.request.urlopen(f"http://{server_address}/system_stats", timeout=timeout) as response:
+        return json.loads(response.read())
+
 def get_history(prompt_id, server_address):
     """
     특정 ComfyUI의 prompt_id 대한 history를 가져옵니다.
@@ -151,6 +165,26 @@ def delete_history(prompt_id, server_address):
     with urllib.request.urlopen(request) as response:
         return response.status
 
+def delete_queue(prompt_ids:list, server_address):
+    """
+    ComfyUI 서버의 대기열에서 아직 실행되지 않은 prompt들을 삭제합니다.
+    
+    Args:
+        prompt_ids (list): 삭제할 ComfyUI의 prompt_id 목록
+        server_address (str): Bridge server에서 할당한 ComfyUI 서버주소
+    
+    Returns:
+        int: 서버 응답 상태 코드 (예: 200은 성공)
+    """
+    url = f"http://{server_address}/queue"
+    data = json.dumps({"delete": prompt_ids}).encode('utf-8')
+    headers = {
+        'Content-Type': 'application/json'
+    }
+    request = urllib.request.Request(url, data=data, headers=headers, method='POST')
+    with urllib.request.urlopen(request) as response:
+        return response.status
+
 def post_free_memory(server_address):
     """
     ComfyUI 서버에 RAM, GPU 메모리 해제를 요청합니다.
@@ -274,8 +308,66 @@ def upload_image(input_path, file_name, server_address, image_type="input", over
             else:
                 raise urllib.error.HTTPError(msg="Bad request on upload image")
 
+def stage_input_file(input_path, file_name, input_dir, move=False):
+    """
+    ComfyUI서버와 파일시스템을 공유할 때, HTTP 업로드 대신 input 폴더에 파일을 직접 둡니다.
+    move가 아니라면 hardlink, reflink, 복사 순서로 시도하고, 임시 이름으로 만든 뒤 rename하여 완성된 파일만 보이게 합니다.
+    
+    Args:
+        input_path (str): 검증을 마친 임시 파일의 경로
+        file_name (str): input 폴더에 둘 파일 이름
+        input_dir (str): ComfyUI 서버의 input 폴더 경로
+        move (bool): 임시 파일을 옮길지 여부. 임시 파일을 다시 사용하지 않을 때 사용합니다. (기본값: False)
+    
+    Returns:
+        tuple: upload_image와 같은 형식의 결과 {"name", "subfolder", "type"}와 사용한 방법(move, hardlink, reflink, copy)
+    """
+    dst_path = os.path.join(input_dir, file_name)
+    staging_path = os.path.join(input_dir, f".{file_name}.{uuid.uuid4().hex}.staging")
+
+    method = None
+    if move:
+        try:
+            os.replace(input_path, dst_path)
+            method = "move"
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+    if method is None:
+        try:
+            try:
+                os.link(input_path, staging_path)
+                method = "hardlink"
+            except OSError:
+                method = None
+            if method is None and fcntl is not None:
+                try:
+                    with open(input_path, 'rb') as src, open(staging_path, 'wb') as dst:
+                        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                    method = "reflink"
+                except OSError:
+                    method = None
+            if method is None:
+                # 커널 내부 복사(copy_file_range, sendfile)를 사용합니다.
+                shutil.copyfile(input_path, staging_path)
+                method = "copy"
+            # bridge server의 임시 파일은 소유자만 읽을 수 있으므로 ComfyUI가 읽을 수 있게 합니다.
+            os.chmod(staging_path, 0o644)
+            os.replace(staging_path, dst_path)
+        except BaseException:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+            raise
+        if move:
+            os.remove(input_path)
+    else:
+        os.chmod(dst_path, 0o644)
+
+    return {"name": file_name, "subfolder": "", "type": "input"}, method
+
 # Parsing text
-def get_parsed_input_nodes(workflow_json, wf_dir:str=None, include_descimage:bool=False, tracing_mime_types:list=[]):
+def get_parsed_input_nodes(workflow_json, wf_dir:str=None, include_descimage:bool=False, tracing_mime_types:list=[], descimage_url_fn=None):
     """
     ComfyUI의 워크플로우를 파싱하여 Custom input 정보를 가져옵니다.
     
@@ -284,6 +376,7 @@ def get_parsed_input_nodes(workflow_json, wf_dir:str=None, include_descimage:boo
         wf_dir: workdlow가 저장된 directory 경로(str). desc image 추적 위해 필요
         include_descimage(bool): 파싱한 결과에 desc image를 포함할 것인지
         tracing_mime_types (list): 워크플로우 제공 정보에서 str을 mime type으로 변환할 수 있을 때, 추적하는 mimetype입니다.
+        descimage_url_fn (Callable, optional): desc image 파일 이름을 받아 URL을 반환하는 함수. 주어지면 이미지 대신 URL을 포함합니다.
     
     Returns:
         dict: 파싱된 Custom input 정보를 담은 dictionary
@@ -333,8 +426,9 @@ def get_parsed_input_nodes(workflow_json, wf_dir:str=None, include_descimage:boo
                         desc_imgs = [desc_imgs] * len(api_inputs)
                     if len(api_inputs) != len(desc_imgs):
                         raise ValueError(f"'api inputs' and 'desc images' length does not match. {len(api_inputs)} != {len(desc_imgs)}")
-                    # 이미지 파일 열기. 없으면 None
-                    desc_img_byte = open_image(os.path.join(wf_dir, "descimage", desc_imgs[idx]))
+                    if descimage_url_fn is None:
+                        # 이미지 파일 열기. 없으면 None
+                        desc_img_byte = open_image(os.path.join(wf_dir, "descimage", desc_imgs[idx]))
 
                 # 파싱된 입력 노드 정보를 사전에 추가
                 parsed_input_nodes[f"{node_number}/{api_input}"] = {
@@ -344,7 +438,10 @@ def get_parsed_input_nodes(workflow_json, wf_dir:str=None, include_descimage:boo
                 }
 
                 if include_descimage == True:
-                    parsed_input_nodes[f"{node_number}/{api_input}"]["descimage"] = encode_byte_base64(desc_img_byte)
+                    if descimage_url_fn is not None:
+                        parsed_input_nodes[f"{node_number}/{api_input}"]["descimage"] = descimage_url_fn(desc_imgs[idx])
+                    else:
+                        parsed_input_nodes[f"{node_number}/{api_input}"]["descimage"] = encode_byte_base64(desc_img_byte)
 
     return parsed_input_nodes
 
@@ -389,13 +486,68 @@ def parse_workflow_prompt(workflow_path, tracing_mime_types:list=[], **kwargs):
 
     return prompt
 
-def process_outputs(outputs: dict, server_address):
+def expand_parameter_sets(base:dict=None, inputs:list=None, sweep:dict=None):
+    """
+    배치 요청의 custom input을 parameter set 목록으로 펼칩니다.
+    inputs의 각 항목마다 sweep 값들의 cartesian product를 조합하며, 모든 parameter set은 base 값을 공유합니다.
+    
+    Args:
+        base (dict, optional): 모든 parameter set에 공통으로 적용할 custom input
+        inputs (list, optional): parameter set 별 custom input 목록
+        sweep (dict, optional): custom input 키를 키로, 시도할 값 목록을 값으로 받는 사전
+    
+    Returns:
+        list: 'parse_workflow_prompt'에 전달할 수 있는 custom input 사전 목록
+    
+    Raises:
+        ValueError: inputs 또는 sweep의 형식이 잘못된 경우 발생
+    """
+    base = base or {}
+    inputs = inputs or [{}]
+    sweep = sweep or {}
+
+    if not isinstance(base, dict):
+        raise ValueError(f"'base' must be dict but got {type(base).__name__}")
+    if not isinstance(inputs, list) or not all(isinstance(cur, dict) for cur in inputs):
+        raise ValueError("'inputs' must be list of dict")
+    if not isinstance(sweep, dict) or not all(isinstance(cur, list) and len(cur) > 0 for cur in sweep.values()):
+        raise ValueError("'sweep' must be dict of non-empty list")
+
+    sweep_keys = list(sweep.keys())
+    parameter_sets = []
+    for cur_input in inputs:
+        # sweep이 비어있다면 product는 빈 조합 하나만 반환합니다.
+        for sweep_values in itertools.product(*[sweep[key] for key in sweep_keys]):
+            parameter_sets.append({**base, **cur_input, **dict(zip(sweep_keys, sweep_values))})
+
+    return parameter_sets
+
+def get_execution_seconds(history:dict):
+    """
+    ComfyUI history의 status 메시지로 execution_start부터 완료까지 걸린 시간을 계산합니다.
+    
+    Args:
+        history (dict): 특정 prompt_id의 history
+    
+    Returns:
+        float or None: 실행 시간(초). 시간 정보가 없다면 None
+    """
+    messages = history.get("status", {}).get("messages", [])
+    timestamps = {name: data.get("timestamp", None) for name, data in messages if isinstance(data, dict)}
+    start, end = timestamps.get("execution_start", None), timestamps.get("execution_success", None)
+    if start is None or end is None:
+        return None
+    # ComfyUI는 밀리초 단위로 기록합니다.
+    return (end - start) / 1000
+
+def process_outputs(outputs: dict, server_address, nodes:list=None):
     """
     ComfyUI의 history를 처리하여 파일 이름과 파일 내용을 반환합니다.
     
     Args:
         outputs (dict): 출력 노드 정보가 담긴 사전
         server_address (str): 서버 주소
+        nodes (list, optional): 결과물을 가져올 출력 노드 ID 목록. None이면 모든 출력 노드입니다.
     
     Returns:
         tuple: 파일 이름 리스트와 파일 내용 리스트
@@ -405,7 +557,7 @@ def process_outputs(outputs: dict, server_address):
     """
     file_names, file_contents = [], []
 
-    output_nodes = list(outputs.values())
+    output_nodes = [output_node for node_id, output_node in outputs.items() if nodes is None or node_id in nodes]
     for output_node in output_nodes:
         for _, values in output_node.items():
             for value in values:
@@ -425,6 +577,46 @@ def process_outputs(outputs: dict, server_address):
 
     return file_names, file_contents
 
+def resolve_output_paths(outputs: dict, output_dir:str, nodes:list=None):
+    """
+    ComfyUI의 history에 담긴 결과물 파일 이름을 output 폴더의 로컬 경로로 변환합니다.
+    bridge server와 ComfyUI가 같은 호스트나 공유 파일시스템에 있을 때 사용합니다.
+    
+    Args:
+        outputs (dict): 출력 노드 정보가 담긴 사전
+        output_dir (str): ComfyUI 서버의 output 폴더 경로
+        nodes (list, optional): 결과물을 가져올 출력 노드 ID 목록. None이면 모든 출력 노드입니다.
+    
+    Returns:
+        tuple: 파일 이름 리스트와 파일 경로 리스트
+    
+    Raises:
+        FileNotFoundError: 파일이 없거나 output 폴더 밖을 가리킬 때 발생
+    """
+    file_names, file_paths = [], []
+    output_dir = os.path.realpath(output_dir)
+
+    output_nodes = [output_node for node_id, output_node in outputs.items() if nodes is None or node_id in nodes]
+    for output_node in output_nodes:
+        for _, values in output_node.items():
+            for value in values:
+                if not isinstance(value, dict):
+                    continue
+                if value.get("type") != "output":
+                    continue
+                file_name = value.get("filename", None)
+                if file_name is None:
+                    continue
+
+                file_path = os.path.realpath(os.path.join(output_dir, value.get("subfolder", "") or "", file_name))
+                if os.path.commonpath([output_dir, file_path]) != output_dir or not os.path.isfile(file_path):
+                    raise FileNotFoundError(f"{file_name} is not found in {output_dir}")
+
+                file_names.append(file_name)
+                file_paths.append(file_path)
+
+    return file_names, file_paths
+
 def open_image(img_path:str):
     try:
         with open(img_path, mode="rb") as f:
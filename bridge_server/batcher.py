@@ -0,0 +1,194 @@
+import json
+import time
+import asyncio
+import logging
+
+def split_outputs(outputs:dict, batch_size:int):
+    """
+    batch로 실행한 prompt의 history outputs를 요청 별로 나눕니다.
+    출력 노드의 결과물 목록이 batch 크기의 배수라면 순서대로 나누고, 그렇지 않다면(batch와 무관한 출력) 모든 요청에 같은 목록을 담습니다.
+
+    Args:
+        outputs (dict): history의 outputs
+        batch_size (int): prompt의 batch 크기
+
+    Returns:
+        list: 요청 순서대로 나눈 outputs 목록
+    """
+    split = [{} for _ in range(batch_size)]
+    for node_id, output_node in outputs.items():
+        for key, values in output_node.items():
+            if isinstance(values, list) and len(values) > 0 and len(values) % batch_size == 0:
+                chunk = len(values) // batch_size
+                for idx in range(batch_size):
+                    split[idx].setdefault(node_id, {})[key] = values[idx*chunk:(idx+1)*chunk]
+            else:
+                for idx in range(batch_size):
+                    split[idx].setdefault(node_id, {})[key] = values
+    return split
+
+class BatchMember:
+    def __init__(self, sid:str, data:dict, owner:str):
+        """
+        batch로 묶일 요청 하나입니다.
+
+        Args:
+            sid (str): client id
+            data (dict): client가 보낸 custom input
+            owner (str): 요청자 (ex: client IP)
+        """
+        self.sid = sid
+        self.data = data
+        self.owner = owner
+        self.joined_at = time.time()
+        self.future = asyncio.get_running_loop().create_future()    # batch가 등록되면 (대기 순번, batch 크기)로 완료
+
+class DynamicBatcher:
+    def __init__(self, workflows:dict, submit_fn, max_batch_size:int=4, max_wait:float=0.05):
+        """
+        같은 워크플로우에 짧은 시간 안에 들어온 custom input이 같은 요청들을 모아 하나의 prompt로 실행합니다.
+        batch는 하나의 seed로 만들어지므로, seed처럼 요청마다 다른 input을 묶으면 결과물이 요청한 input과 달라집니다.
+        요청이 들어오면 max_wait초 동안 같은 묶음의 요청을 기다리고, max_batch_size개가 모이면 바로 등록합니다.
+        혼자 남은 요청은 묶지 않고 그대로 진행합니다.
+
+        Args:
+            workflows (dict): 워크플로우 alias -> {"batch_size_input": prompt의 batch 크기 입력("노드 ID/키")}
+            submit_fn (Callable): (워크플로우 alias, 우선순위, BatchMember 목록)을 받아 하나의 prompt로 대기열에 등록하고 대기 순번을 반환하는 코루틴 함수
+            max_batch_size (int, optional): prompt 하나에 묶을 최대 요청 수. 기본값은 4입니다.
+            max_wait (float, optional): 같은 묶음의 요청을 기다릴 최대 시간(초). 기본값은 0.05초입니다.
+        """
+        self.workflows = workflows
+        self.submit_fn = submit_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.groups: dict[tuple, list[BatchMember]] = {}    # (워크플로우 alias, 우선순위, custom input) -> 모인 요청 목록
+        self.timers: dict[tuple, asyncio.Task] = {}
+        self.batches = 0    # 묶어서 등록한 prompt 수
+        self.batched_requests = 0   # 묶여서 실행된 요청 수
+        self.single_requests = 0    # 묶이지 않고 그대로 진행한 요청 수
+
+    def is_batchable(self, workflow:str):
+        """
+        워크플로우를 묶어서 실행할 수 있는지 확인합니다.
+
+        Args:
+            workflow (str): 워크플로우 alias
+
+        Returns:
+            bool: 묶어서 실행할 수 있는지 여부
+        """
+        return workflow in self.workflows and self.max_batch_size > 1
+
+    def batch_size_input(self, workflow:str):
+        """
+        prompt에서 batch 크기를 지정하는 입력을 반환합니다.
+
+        Args:
+            workflow (str): 워크플로우 alias
+
+        Returns:
+            tuple: (노드 ID, 키)
+        """
+        node_id, input_key = self.workflows[workflow]["batch_size_input"].split("/")
+        return node_id, input_key
+
+    def make_key(self, workflow:str, priority:str, data:dict):
+        """
+        함께 묶을 수 있는 요청끼리 같은 값을 갖는 키를 만듭니다. 모든 custom input이 같은 요청만 함께 묶습니다.
+
+        Args:
+            workflow (str): 워크플로우 alias
+            priority (str): 우선순위 등급
+            data (dict): 업로드한 파일을 내용 해시로 바꾼 custom input
+
+        Returns:
+            tuple: 묶음 키
+        """
+        return (workflow, priority, json.dumps(data, sort_keys=True, ensure_ascii=False))
+
+    async def add(self, key:tuple, sid:str, data:dict, owner:str):
+        """
+        요청을 묶음에 추가하고 묶음이 등록될 때까지 기다립니다.
+
+        Args:
+            key (tuple): make_key로 만든 묶음 키
+            sid (str): client id
+            data (dict): client가 보낸 custom input
+            owner (str): 요청자 (ex: client IP)
+
+        Returns:
+            tuple or None: (대기 순번, batch 크기). 함께 묶인 요청이 없다면 None
+
+        Raises:
+            Exception: 묶음을 등록하지 못한 경우 submit_fn이 발생시킨 예외
+        """
+        member = BatchMember(sid=sid, data=data, owner=owner)
+        group = self.groups.setdefault(key, [])
+        group.append(member)
+        if len(group) >= self.max_batch_size:
+            self._flush(key)
+        elif len(group) == 1:
+            self.timers[key] = asyncio.create_task(self._flush_later(key))
+
+        try:
+            return await member.future
+        except asyncio.CancelledError:
+            # 기다리는 동안 client와 연결이 끊기면 묶음에서 제외합니다.
+            group = self.groups.get(key, [])
+            if member in group:
+                group.remove(member)
+            raise
+
+    def stats(self):
+        """
+        동적 batch 현황을 반환합니다.
+
+        Returns:
+            dict: 대상 워크플로우, 설정값, 기다리는 요청 수, 묶어서 등록한 prompt 수와 평균 batch 크기
+        """
+        return {
+            "workflows": sorted(self.workflows.keys()),
+            "max_batch_size": self.max_batch_size,
+            "max_wait": self.max_wait,
+            "pending": sum(len(group) for group in self.groups.values()),
+            "batches": self.batches,
+            "batched_requests": self.batched_requests,
+            "single_requests": self.single_requests,
+            "avg_batch_size": round(self.batched_requests / self.batches, 2) if self.batches > 0 else None,
+        }
+
+    async def _flush_later(self, key:tuple):
+        await asyncio.sleep(self.max_wait)
+        self._flush(key)
+
+    def _flush(self, key:tuple):
+        timer = self.timers.pop(key, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        members = [member for member in self.groups.pop(key, []) if not member.future.done()]
+        if len(members) == 0:
+            return
+        if len(members) == 1:
+            self.single_requests += 1
+            members[0].future.set_result(None)
+            return
+        asyncio.create_task(self._submit(key, members))
+
+    async def _submit(self, key:tuple, members:list):
+        workflow, priority, _ = key
+        try:
+            position = await self.submit_fn(workflow, priority, members)
+        except Exception as e:
+            logging.error(f"[BATCHER] SUBMIT FAILED / {e} / {workflow} / {len(members)}")
+            for member in members:
+                if not member.future.done():
+                    member.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.batched_requests += len(members)
+        logging.info(f"[BATCHER] SUBMITTED / {workflow} / {len(members)} / {position}")
+        for member in members:
+            if not member.future.done():
+                member.future.set_result((position, len(members)))
@@ -0,0 +1,203 @@
+import time
+
+class ExecutionStats:
+    def __init__(self, records:dict=None, node_records:dict=None, alpha:float=0.3, default_seconds:float=30.0):
+        """
+        ComfyUI 서버 별, 워크플로우 별 실행 시간과 워크플로우의 노드 별 실행 시간을 지수 가중 이동 평균(EWMA)으로 관리합니다.
+
+        Args:
+            records (dict, optional): 서버 주소 -> 워크플로우 -> {"ewma", "count"} 형태의 기록. 주어진 사전을 그대로 갱신합니다.
+            node_records (dict, optional): 워크플로우 -> 노드 ID -> {"ewma", "count"} 형태의 기록. 주어진 사전을 그대로 갱신합니다.
+            alpha (float, optional): 새로운 측정값의 가중치. 기본값은 0.3입니다.
+            default_seconds (float, optional): 측정값이 없을 때 사용할 실행 시간(초). 기본값은 30초입니다.
+        """
+        self.records = records if records is not None else {}
+        self.node_records = node_records if node_records is not None else {}
+        self.alpha = alpha
+        self.default_seconds = default_seconds
+
+    def record(self, server_address:str, workflow:str, seconds:float):
+        """
+        실행 시간을 기록합니다.
+
+        Args:
+            server_address (str): 작업을 실행한 ComfyUI 서버 주소
+            workflow (str): 워크플로우 alias
+            seconds (float): execution_start부터 완료까지 걸린 시간(초)
+        """
+        self._update(self.records.setdefault(server_address, {}), workflow, seconds)
+
+    def record_nodes(self, workflow:str, timings:dict):
+        """
+        워크플로우의 노드 별 실행 시간을 기록합니다.
+
+        Args:
+            workflow (str): 워크플로우 alias
+            timings (dict): 노드 ID -> 실행 시간(초)
+        """
+        node_records = self.node_records.setdefault(workflow, {})
+        for node_id, seconds in timings.items():
+            self._update(node_records, node_id, seconds)
+
+    def node_weights(self, workflow:str, node_ids):
+        """
+        진행률 계산에 사용할 노드 별 가중치를 반환합니다. 측정한 적 없는 노드는 측정된 노드의 평균을 사용합니다.
+
+        Args:
+            workflow (str): 워크플로우 alias
+            node_ids (Iterable): prompt의 노드 ID 목록
+
+        Returns:
+            dict: 노드 ID -> 가중치. 측정값이 하나도 없다면 모든 노드의 가중치는 1입니다.
+        """
+        node_records = self.node_records.get(workflow, {})
+        if len(node_records) == 0:
+            return {node_id: 1.0 for node_id in node_ids}
+        mean = sum(cur["ewma"] for cur in node_records.values()) / len(node_records)
+        return {node_id: node_records[node_id]["ewma"] if node_id in node_records else mean for node_id in node_ids}
+
+    def count(self, server_address:str, workflow:str):
+        """
+        ComfyUI 서버에서 워크플로우의 실행 시간을 측정한 횟수를 반환합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            workflow (str): 워크플로우 alias
+
+        Returns:
+            int: 측정 횟수
+        """
+        return self.records.get(server_address, {}).get(workflow, {}).get("count", 0)
+
+    def expected(self, server_address:str, workflow:str=None):
+        """
+        ComfyUI 서버에서 워크플로우를 실행하는 데 걸릴 시간을 예측합니다.
+        해당 서버에서 측정한 적이 없다면, 다른 서버의 측정값을 서버 간 속도 비율로 보정합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            workflow (str, optional): 워크플로우 alias. None이면 서버의 평균 실행 시간을 반환합니다.
+
+        Returns:
+            float: 예상 실행 시간(초)
+        """
+        server_records = self.records.get(server_address, {})
+        if workflow is None:
+            if len(server_records) == 0:
+                return self.default_seconds
+            return sum(cur["ewma"] for cur in server_records.values()) / len(server_records)
+
+        if workflow in server_records:
+            return server_records[workflow]["ewma"]
+
+        others = [cur[workflow]["ewma"] for address, cur in self.records.items() if address != server_address and workflow in cur]
+        if len(others) == 0:
+            return self.expected(server_address) if len(server_records) > 0 else self.default_seconds
+        return sum(others) / len(others) * self._speed_ratio(server_address)
+
+    def _update(self, records:dict, key:str, seconds:float):
+        cur = records.get(key, None)
+        if cur is None:
+            records[key] = {"ewma": seconds, "count": 1}
+        else:
+            cur["ewma"] = self.alpha*seconds + (1-self.alpha)*cur["ewma"]
+            cur["count"] += 1
+
+    def _speed_ratio(self, server_address:str):
+        # 같은 워크플로우를 실행한 다른 서버 대비 이 서버의 실행 시간 비율
+        ratios = []
+        for workflow, cur in self.records.get(server_address, {}).items():
+            others = [records[workflow]["ewma"] for address, records in self.records.items() if address != server_address and workflow in records]
+            if len(others) > 0 and sum(others) > 0:
+                ratios.append(cur["ewma"] / (sum(others) / len(others)))
+        return sum(ratios) / len(ratios) if len(ratios) > 0 else 1.0
+
+class ProgressTracker:
+    def __init__(self, weights:dict):
+        """
+        노드 별 가중치로 작업의 진행률과 남은 시간을 계산합니다.
+
+        Args:
+            weights (dict): 노드 ID -> 가중치. prompt의 모든 노드를 포함해야 합니다.
+        """
+        self.weights = weights
+        self.total_weight = sum(weights.values()) or 1.0
+        self.fractions = {}     # 노드 ID -> 완료된 비율(0~1)
+        self.timings = {}   # 노드 ID -> 실제 실행 시간(초)
+        self.started_at = time.time()
+        self.cur_node = None
+        self.cur_node_started_at = None
+
+    def executing(self, node_id:str):
+        """
+        노드의 실행이 시작되었음을 기록합니다. 이전에 실행 중이던 노드는 완료된 것으로 처리합니다.
+
+        Args:
+            node_id (str): 실행을 시작한 노드 ID
+        """
+        self._finish_cur_node()
+        # 같은 노드를 다시 실행한다면 처음부터 진행 상황에 반영
+        self.fractions[node_id] = 0.0
+        self.cur_node = node_id
+        self.cur_node_started_at = time.time()
+
+    def step(self, node_id:str, value:int, max_value:int):
+        """
+        sampling처럼 단계가 있는 노드의 진행 상황을 기록합니다.
+
+        Args:
+            node_id (str): 노드 ID
+            value (int): 현재 단계
+            max_value (int): 전체 단계
+        """
+        if max_value > 0:
+            self.fractions[node_id] = min(value / max_value, 1.0)
+
+    def cached(self, node_ids):
+        """
+        캐시되어 실행하지 않는 노드를 완료된 것으로 처리합니다.
+
+        Args:
+            node_ids (Iterable): 캐시된 노드 ID 목록
+        """
+        for node_id in node_ids:
+            self.fractions[node_id] = 1.0
+
+    def finish(self):
+        """
+        실행 중이던 노드를 완료된 것으로 처리합니다.
+        """
+        self._finish_cur_node()
+
+    @property
+    def progress(self):
+        """
+        가중치를 반영한 진행률(0~1)입니다.
+        """
+        done = sum(self.weights.get(node_id, 0.0) * fraction for node_id, fraction in self.fractions.items())
+        return min(done / self.total_weight, 1.0)
+
+    def eta(self, expected_seconds:float):
+        """
+        남은 실행 시간을 예측합니다. 진행될수록 예상 실행 시간보다 실제 진행 속도의 비중을 높입니다.
+
+        Args:
+            expected_seconds (float): 작업 전체의 예상 실행 시간(초)
+
+        Returns:
+            float: 남은 시간(초)
+        """
+        progress = self.progress
+        elapsed = time.time() - self.started_at
+        total = expected_seconds
+        if progress > 0:
+            total = (1-progress)*expected_seconds + progress*(elapsed / progress)
+        return max(total - elapsed, 0.0)
+
+    def _finish_cur_node(self):
+        if self.cur_node is None:
+            return
+        self.fractions[self.cur_node] = 1.0
+        self.timings[self.cur_node] = time.time() - self.cur_node_started_at
+        self.cur_node = None
+        self.cur_node_started_at = None
@@ -0,0 +1,141 @@
+import time
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+def timed_call(fn, *args, **kwargs):
+    """
+    함수를 실행하고 시작, 종료 시간을 함께 반환합니다.
+    worker process에서도 실행되므로 모듈 최상위 함수로 둡니다.
+
+    Args:
+        fn (Callable): 실행할 함수
+        *args: 함수의 인자
+        **kwargs: 함수의 키워드 인자
+
+    Returns:
+        tuple: (결과, 시작 시간, 종료 시간)
+    """
+    started_at = time.time()
+    result = fn(*args, **kwargs)
+    return result, started_at, time.time()
+
+class ExecutorStats:
+    def __init__(self, max_workers:int, alpha:float=0.3):
+        """
+        executor 하나의 대기열 길이와 대기, 실행 시간을 기록합니다.
+
+        Args:
+            max_workers (int): worker 수
+            alpha (float, optional): 대기, 실행 시간 EWMA에서 새로운 측정값의 가중치. 기본값은 0.3입니다.
+        """
+        self.max_workers = max_workers
+        self.alpha = alpha
+        self.inflight = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.tasks: dict[str, dict] = {}    # 함수 이름 -> {"count", "run_seconds"}
+
+    def record(self, name:str, submitted_at:float, started_at:float, finished_at:float):
+        wait_seconds = max(0.0, started_at - submitted_at)
+        run_seconds = max(0.0, finished_at - started_at)
+        self.wait_seconds = self.alpha * wait_seconds + (1 - self.alpha) * self.wait_seconds
+        self.run_seconds = self.alpha * run_seconds + (1 - self.alpha) * self.run_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+        task = self.tasks.setdefault(name, {"count": 0, "run_seconds": 0.0})
+        task["count"] += 1
+        task["run_seconds"] = round(task["run_seconds"] + run_seconds, 4)
+
+    def to_dict(self):
+        return {
+            "max_workers": self.max_workers,
+            "running": min(self.inflight, self.max_workers),
+            "queued": max(0, self.inflight - self.max_workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_seconds": round(self.wait_seconds, 4),
+            "run_seconds": round(self.run_seconds, 4),
+            "max_wait_seconds": round(self.max_wait_seconds, 4),
+            "tasks": self.tasks,
+        }
+
+class Executor:
+    def __init__(self, thread_workers:int=4, process_workers:int=2):
+        """
+        이벤트 루프를 막는 파일 작업과 CPU 작업을 실행할 thread pool과 process pool을 관리합니다.
+        MIME 타입 검사, 해시 계산, base64 인코딩, 임시 파일 쓰기는 thread pool에서,
+        이미지 변환처럼 GIL을 오래 잡는 작업은 process pool에서 실행합니다.
+
+        Args:
+            thread_workers (int, optional): thread pool의 worker 수. 기본값은 4입니다.
+            process_workers (int, optional): process pool의 worker 수. 기본값은 2입니다.
+        """
+        self.thread_executor = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="bridge_server")
+        # 이벤트 루프의 스레드를 복제하지 않도록 spawn으로 worker를 만듭니다.
+        self.process_executor = ProcessPoolExecutor(max_workers=process_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.thread_stats = ExecutorStats(thread_workers)
+        self.process_stats = ExecutorStats(process_workers)
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        함수를 thread pool에서 실행합니다.
+
+        Args:
+            fn (Callable): 실행할 함수
+            *args: 함수의 인자
+            **kwargs: 함수의 키워드 인자
+
+        Returns:
+            Any: 함수의 결과
+        """
+        return await self._submit(self.thread_executor, self.thread_stats, fn, *args, **kwargs)
+
+    async def run_process(self, fn, *args, **kwargs):
+        """
+        함수를 process pool에서 실행합니다. 함수와 인자는 pickle할 수 있어야 합니다.
+
+        Args:
+            fn (Callable): 실행할 모듈 최상위 함수
+            *args: 함수의 인자
+            **kwargs: 함수의 키워드 인자
+
+        Returns:
+            Any: 함수의 결과
+        """
+        return await self._submit(self.process_executor, self.process_stats, fn, *args, **kwargs)
+
+    def stats(self):
+        """
+        thread pool과 process pool의 대기열 길이와 평균 대기, 실행 시간을 반환합니다.
+
+        Returns:
+            dict: {"thread": 통계, "process": 통계}
+        """
+        return {"thread": self.thread_stats.to_dict(), "process": self.process_stats.to_dict()}
+
+    def shutdown(self):
+        """
+        thread pool과 process pool을 종료합니다.
+        """
+        self.thread_executor.shutdown(wait=False, cancel_futures=True)
+        self.process_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, executor, stats:ExecutorStats, fn, *args, **kwargs):
+        name = getattr(fn, "__qualname__", None) or getattr(fn, "__name__", repr(fn))
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        stats.inflight += 1
+        try:
+            result, started_at, finished_at = await loop.run_in_executor(executor, functools.partial(timed_call, fn, *args, **kwargs))
+        except Exception:
+            stats.failed += 1
+            raise
+        finally:
+            stats.inflight -= 1
+        stats.completed += 1
+        stats.record(name, submitted_at, started_at, finished_at)
+        return result
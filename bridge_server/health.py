@@ -0,0 +1,142 @@
+import time
+import asyncio
+import logging
+import urllib.error
+
+def is_connection_error(error:Exception):
+    """
+    ComfyUI 서버에 연결할 수 없어서 발생한 예외인지 확인합니다.
+    ComfyUI가 응답한 HTTP 에러(ex: prompt 검증 실패)는 서버 장애로 보지 않습니다.
+
+    Args:
+        error (Exception): 확인할 예외
+
+    Returns:
+        bool: 연결 장애 여부
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return False
+    return isinstance(error, (urllib.error.URLError, ConnectionError, TimeoutError))
+
+class HealthChecker:
+    def __init__(self,
+                 server_address:list,
+                 check_fn,
+                 on_change=None,
+                 interval:int=5,
+                 failure_threshold:int=3,
+                 recovery_timeout:int=30):
+        """
+        ComfyUI 서버의 상태를 주기적으로 확인하고, circuit breaker로 장애 서버를 제외하거나 복구합니다.
+        연속으로 failure_threshold번 실패한 서버는 제외(open)되고, recovery_timeout이 지나면 다시 확인(half_open)하여 성공하면 복구(closed)됩니다.
+
+        Args:
+            server_address (list): ComfyUI 서버 주소 목록
+            check_fn (Callable): 서버 주소를 받아 상태를 확인하는 함수. 실패하면 예외를 발생해야 합니다.
+            on_change (Callable, optional): (서버 주소, 사용 가능 여부)를 받는 코루틴 함수. 서버가 제외되거나 복구될 때 호출합니다.
+            interval (int, optional): 상태 확인 간격(초). 기본값은 5초입니다.
+            failure_threshold (int, optional): 서버를 제외할 연속 실패 횟수. 기본값은 3입니다.
+            recovery_timeout (int, optional): 제외된 서버를 다시 확인하기까지 기다릴 시간(초). 기본값은 30초입니다.
+        """
+        self.server_address = server_address
+        self.check_fn = check_fn
+        self.on_change = on_change
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.states = {
+            server_address: {"state": "closed", "failures": 0, "opened_at": None, "last_error": None}
+            for server_address in server_address
+        }
+
+        self.check_task = asyncio.create_task(self.check_servers(interval=interval))
+
+    def is_available(self, server_address:str):
+        """
+        작업을 할당할 수 있는 서버인지 확인합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+
+        Returns:
+            bool: 사용 가능 여부. 제외되었거나 복구를 확인 중인 서버는 False입니다.
+        """
+        state = self.states.get(server_address, None)
+        return state is None or state["state"] == "closed"
+
+    def record_success(self, server_address:str):
+        """
+        서버가 정상 응답했음을 기록합니다. 제외된 서버였다면 복구합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+        """
+        state = self.states.setdefault(server_address, {"state": "closed", "failures": 0, "opened_at": None, "last_error": None})
+        state["failures"] = 0
+        state["last_error"] = None
+        if state["state"] != "closed":
+            state["state"] = "closed"
+            state["opened_at"] = None
+            logging.warning(f"[HEALTH] REINSTATED / {server_address}")
+            self._notify(server_address, True)
+
+    def record_failure(self, server_address:str, error:Exception=None):
+        """
+        서버 장애를 기록합니다. 연속 실패 횟수가 기준을 넘거나 복구 확인에 실패하면 서버를 제외합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            error (Exception, optional): 장애 원인
+        """
+        state = self.states.setdefault(server_address, {"state": "closed", "failures": 0, "opened_at": None, "last_error": None})
+        state["failures"] += 1
+        state["last_error"] = f"{error}" if error is not None else None
+        if state["state"] == "half_open" or (state["state"] == "closed" and state["failures"] >= self.failure_threshold):
+            was_closed = state["state"] == "closed"
+            state["state"] = "open"
+            state["opened_at"] = time.time()
+            if was_closed:
+                logging.warning(f"[HEALTH] EJECTED / {error} / {server_address}")
+                self._notify(server_address, False)
+        elif state["state"] == "open":
+            state["opened_at"] = time.time()
+
+    async def check_servers(self, interval:int):
+        """
+        주기적으로 모든 서버의 상태를 확인합니다. 제외된 서버는 recovery_timeout이 지난 뒤에만 확인합니다.
+
+        Args:
+            interval (int): 확인 간격(초)
+        """
+        while True:
+            await asyncio.gather(*[self._check(server_address) for server_address in list(self.states.keys())])
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        """
+        서버 별 상태를 반환합니다.
+
+        Returns:
+            dict: 서버 주소 -> 상태(closed, open, half_open), 연속 실패 횟수, 마지막 장애 원인
+        """
+        return {
+            server_address: {"state": state["state"], "failures": state["failures"], "last_error": state["last_error"]}
+            for server_address, state in self.states.items()
+        }
+
+    async def _check(self, server_address:str):
+        state = self.states[server_address]
+        if state["state"] == "open":
+            if time.time() - state["opened_at"] < self.recovery_timeout:
+                return
+            state["state"] = "half_open"
+        try:
+            await asyncio.to_thread(self.check_fn, server_address)
+        except Exception as e:
+            logging.debug(f"[HEALTH] CHECK FAILED / {e} / {server_address}")
+            self.record_failure(server_address, e)
+            return
+        self.record_success(server_address)
+
+    def _notify(self, server_address:str, available:bool):
+        if self.on_change is not None:
+            asyncio.create_task(self.on_change(server_address, available))
@@ -0,0 +1,136 @@
+import os, json
+import time
+import asyncio
+import logging
+import threading
+
+class SessionJournal:
+    def __init__(self, journal_fn:str, ttl:int=3600, interval:int=60):
+        """
+        client id에 할당된 ComfyUI 서버와 prompt_id를 기록하는 추가 전용(append-only) 기록을 초기화합니다.
+        bridge server가 비정상 종료되어도 다시 시작할 때 기록을 재생하여 실행 중이던 prompt의 결과물을 가져올 수 있도록 합니다.
+        변경 사항은 한 줄의 JSON으로 파일 끝에 추가하고, 주기적으로 살아 있는 항목만 남도록 파일을 다시 씁니다(compaction).
+
+        Args:
+            journal_fn (str): 기록 파일 경로
+            ttl (int, optional): 마지막으로 갱신한 뒤 항목을 보관할 시간(초). 기본값은 3600초입니다.
+            interval (int, optional): 기록 파일을 정리하는 간격(초). 기본값은 60초입니다.
+        """
+        self.journal_fn = journal_fn
+        self.ttl = ttl
+        self.sessions: dict[str, dict] = {}    # client id -> {"server", "prompt_id", "workflow", ...}
+        self.appended = 0   # 마지막 정리 이후 추가한 줄 수
+        self.compactions = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(journal_fn)), exist_ok=True)
+        self._replay()
+        self._compact()
+        self.compact_task = asyncio.create_task(self.check_compact(interval=interval))
+
+    def record(self, sid:str, **fields):
+        """
+        client id의 항목을 갱신하고 기록 파일에 추가합니다.
+
+        Args:
+            sid (str): client id
+            **fields: 갱신할 값 (ex: server, prompt_id, workflow, cache_key, owner, callback)
+        """
+        with self.lock:
+            session = self.sessions.setdefault(sid, {"created": time.time()})
+            session.update(fields)
+            session["updated"] = time.time()
+            self._append({"op": "set", "sid": sid, **fields, "updated": session["updated"]})
+
+    def remove(self, sid:str):
+        """
+        client id의 항목을 삭제합니다. 결과물을 가져갔거나 생명 주기가 끝난 client id입니다.
+
+        Args:
+            sid (str): client id
+        """
+        with self.lock:
+            if self.sessions.pop(sid, None) is not None:
+                self._append({"op": "del", "sid": sid})
+
+    def recovered(self):
+        """
+        다시 시작할 때 재생한 항목 목록을 반환합니다.
+
+        Returns:
+            dict: client id -> 항목
+        """
+        with self.lock:
+            return {sid: dict(session) for sid, session in self.sessions.items()}
+
+    async def check_compact(self, interval:int):
+        """
+        주기적으로 만료된 항목을 삭제하고 기록 파일을 정리합니다.
+
+        Args:
+            interval (int): 정리 간격(초)
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if self.appended > 0:
+                try:
+                    with self.lock:
+                        self._compact()
+                except OSError as e:
+                    logging.error(f"[JOURNAL] COMPACT FAILED / {e}")
+
+    def stats(self):
+        """
+        기록 현황을 반환합니다.
+
+        Returns:
+            dict: 살아 있는 항목 수, 마지막 정리 이후 추가한 줄 수, 정리 횟수
+        """
+        with self.lock:
+            return {
+                "file": self.journal_fn,
+                "sessions": len(self.sessions),
+                "appended": self.appended,
+                "compactions": self.compactions,
+            }
+
+    def _append(self, entry:dict):
+        # 한 줄은 한 번의 write로 기록하므로, 비정상 종료되어도 마지막 줄만 잘립니다.
+        with open(self.journal_fn, mode="a") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.appended += 1
+
+    def _compact(self):
+        now = time.time()
+        for sid in [sid for sid, session in self.sessions.items() if now - session.get("updated", 0) > self.ttl]:
+            del self.sessions[sid]
+        tmp_fn = self.journal_fn + ".tmp"
+        with open(tmp_fn, mode="w") as f:
+            for sid, session in self.sessions.items():
+                f.write(json.dumps({"op": "set", "sid": sid, **session}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_fn, self.journal_fn)
+        self.appended = 0
+        self.compactions += 1
+
+    def _replay(self):
+        try:
+            with open(self.journal_fn, mode="r") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                op, sid = entry.pop("op"), entry.pop("sid")
+            except (ValueError, KeyError):
+                # 기록 도중 종료되어 잘린 줄
+                logging.warning(f"[JOURNAL] BROKEN LINE IS IGNORED / {line.strip()[:80]}")
+                continue
+            if op == "set":
+                self.sessions.setdefault(sid, {"created": entry.get("updated", time.time())}).update(entry)
+            elif op == "del":
+                self.sessions.pop(sid, None)
+        logging.info(f"[JOURNAL] REPLAYED / {len(lines)} lines / {len(self.sessions)} sessions")
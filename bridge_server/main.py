@@ -1,17 +1,28 @@
 import os, json
+import signal
 import asyncio
 import logging
 from dotenv import load_dotenv
 from aiohttp import web
 from server import BridgeServer
 
-async def run_app(app, host, port):
+async def run_app(app, host, port, server):
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, host, port)
+    # drain이 끝난 뒤에도 남아 있는 연결(웹소켓 등)은 잠시만 기다리고 닫습니다.
+    site = web.TCPSite(runner, host, port, shutdown_timeout=5)
     await site.start()
     print(f"Server started at http://{host}:{port}")
-    await asyncio.Event().wait()
+
+    # SIGTERM을 받으면 새로운 작업을 받지 않고 진행 중인 작업이 끝나기를 기다린 뒤 종료합니다. 다시 받으면 기다리지 않습니다.
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda: server.drain(timeout=0 if server.draining else None))
+    await server.stopped.wait()
+
+    await runner.cleanup()
+    await server.close()
+    print("Server stopped")
 
 async def main():
     load_dotenv()
@@ -28,6 +39,40 @@ async def main():
     state_fn = os.path.join(root_dir, configs.get("CURRENT_STATE"))
     wf_alias_fn = os.path.join(root_dir, configs.get("WORKFLOW_ALIAS"))
     wf_dir = os.path.join(root_dir, configs.get("WORKFLOW_DIR"))
+    scheduler_configs = configs.get("SCHEDULER", {})
+    load_balancer_configs = configs.get("LOAD_BALANCER", {})
+    health_check_configs = configs.get("HEALTH_CHECK", {})
+    warmup_configs = configs.get("WARMUP", {})
+    unload_policy_configs = configs.get("UNLOAD_POLICY", {})
+    colocated_configs = configs.get("COLOCATED", {})
+    transcode_configs = configs.get("TRANSCODE", {})
+    executor_configs = configs.get("EXECUTOR", {})
+    output_validation_configs = configs.get("OUTPUT_VALIDATION", {})
+    upload_store_configs = configs.get("UPLOAD_STORE", {})
+    resumable_upload_configs = configs.get("RESUMABLE_UPLOAD", {})
+    dynamic_batch_configs = configs.get("DYNAMIC_BATCH", {})
+    single_flight_configs = configs.get("SINGLE_FLIGHT", {})
+    webhook_configs = configs.get("WEBHOOK", {})
+    drain_configs = configs.get("DRAIN", {})
+    journal_configs = configs.get("JOURNAL", {})
+    rate_limit_configs = configs.get("RATE_LIMIT", {})
+    usage_configs = configs.get("USAGE", {})
+    rate_limit_rules = {
+        scope.lower(): (float(rate_limit_configs[scope]["RATE"]), float(rate_limit_configs[scope]["BURST"]))
+        for scope in ("CLIENT", "IP", "WORKFLOW") if scope in rate_limit_configs
+    } if rate_limit_configs.get("ENABLE", False) else None
+    dynamic_batch_workflows = {
+        alias: {"batch_size_input": cur["BATCH_SIZE_INPUT"]}
+        for alias, cur in dynamic_batch_configs.get("WORKFLOWS", {}).items()
+    } if dynamic_batch_configs.get("ENABLE", False) else None
+    warmup_workflows = {
+        alias: {"inputs": cur.get("INPUTS", {}), "servers": cur.get("SERVERS", None) or None}
+        for alias, cur in warmup_configs.get("WORKFLOWS", {}).items()
+    } if warmup_configs.get("ENABLE", False) else None
+    result_cache_configs = configs.get("RESULT_CACHE", {})
+    result_cache_dir = os.path.join(root_dir, result_cache_configs.get("DIR", "result_cache")) if result_cache_configs.get("ENABLE", False) else None
+    workflow_asset_configs = configs.get("WORKFLOW_ASSETS", {})
+    asset_cache_dir = os.path.join(root_dir, workflow_asset_configs.get("CACHE_DIR", "asset_cache")) if workflow_asset_configs.get("ENABLE", False) else None
 
     logging_level = configs.get("LOGGING_LEVEL", "WARN").upper()
     logging.basicConfig(level=getattr(logging, logging_level, logging.INFO),
@@ -45,10 +90,73 @@ async def main():
                           limit_timeout_count=configs.get("LIMIT_TIMEOUT_COUNT"),
                           timeout_interval=configs.get("TIMEOUT_INTERVAL"),
                           allowed_mime_type_extension_map=configs.get("ALLOWED_MIME_TYPE_EXTENSION_MAP"),
-                          upload_max_size=int(configs.get("UPLOAD_MAX_SIZE"))*1024**2)
+                          upload_max_size=int(configs.get("UPLOAD_MAX_SIZE"))*1024**2,
+                          batch_max_size=int(configs.get("BATCH_MAX_SIZE", 64)),
+                          trusted_proxies=configs.get("TRUSTED_PROXIES", None),
+                          result_cache_dir=result_cache_dir,
+                          result_cache_max_size=int(result_cache_configs.get("MAX_SIZE", 1024))*1024**2,
+                          result_cache_ttl=int(result_cache_configs.get("TTL", 86400)),
+                          max_inflight_per_server=int(scheduler_configs.get("MAX_INFLIGHT_PER_SERVER", 2)),
+                          queue_limit=int(scheduler_configs.get("QUEUE_LIMIT", 200)),
+                          priority_classes=scheduler_configs.get("PRIORITY_CLASSES", None),
+                          ewma_alpha=float(load_balancer_configs.get("EWMA_ALPHA", 0.3)),
+                          default_execution_seconds=float(load_balancer_configs.get("DEFAULT_EXECUTION_SECONDS", 30)),
+                          health_check_interval=int(health_check_configs.get("INTERVAL", 5)),
+                          health_check_timeout=int(health_check_configs.get("TIMEOUT", 3)),
+                          failure_threshold=int(health_check_configs.get("FAILURE_THRESHOLD", 3)),
+                          recovery_timeout=int(health_check_configs.get("RECOVERY_TIMEOUT", 30)),
+                          failover_max_retries=int(health_check_configs.get("FAILOVER_MAX_RETRIES", 2)),
+                          warmup_workflows=warmup_workflows,
+                          warmup_timeout=int(warmup_configs.get("TIMEOUT", 300)),
+                          cold_start_penalty=float(warmup_configs.get("COLD_START_PENALTY", 10)),
+                          unload_idle_seconds=int(unload_policy_configs.get("IDLE_SECONDS", 600)) if unload_policy_configs.get("ENABLE", False) else None,
+                          unload_window=int(unload_policy_configs.get("WINDOW", 3600)),
+                          keep_hot_min_jobs=int(unload_policy_configs.get("KEEP_HOT_MIN_JOBS", 10)),
+                          vram_required={alias: int(size)*1024**2 for alias, size in unload_policy_configs.get("VRAM_REQUIRED", {}).items()},
+                          unload_check_interval=int(unload_policy_configs.get("INTERVAL", 30)),
+                          output_dirs=colocated_configs.get("OUTPUT_DIRS", {}),
+                          input_dirs=colocated_configs.get("INPUT_DIRS", {}),
+                          executor_thread_workers=int(executor_configs.get("THREAD_WORKERS", 4)),
+                          executor_process_workers=int(executor_configs.get("PROCESS_WORKERS", transcode_configs.get("WORKERS", 2))),
+                          transcode_cache_max_size=int(transcode_configs.get("CACHE_MAX_SIZE", 256))*1024**2,
+                          upload_chunk_max_size=int(resumable_upload_configs.get("CHUNK_MAX_SIZE", 8))*1024**2,
+                          upload_expire_seconds=int(resumable_upload_configs.get("EXPIRE", 3600)),
+                          asset_cache_dir=asset_cache_dir,
+                          asset_sizes=[int(size) for size in workflow_asset_configs.get("SIZES", [128, 256, 512])],
+                          asset_default_size=workflow_asset_configs.get("DEFAULT_SIZE", None) if asset_cache_dir is not None else None,
+                          output_trust=output_validation_configs.get("TRUST", {}),
+                          default_output_trust=output_validation_configs.get("DEFAULT_TRUST", "full"),
+                          verdict_cache_size=int(output_validation_configs.get("VERDICT_CACHE_SIZE", 1024)),
+                          upload_store_dir=os.path.join(root_dir, upload_store_configs["DIR"]) if upload_store_configs.get("DIR", None) else None,
+                          upload_store_max_size=int(upload_store_configs.get("MAX_SIZE", 10240))*1024**2,
+                          upload_store_ttl=int(upload_store_configs.get("TTL", 3600)),
+                          dynamic_batch_workflows=dynamic_batch_workflows,
+                          dynamic_batch_max_size=int(dynamic_batch_configs.get("MAX_BATCH_SIZE", 4)),
+                          dynamic_batch_max_wait=float(dynamic_batch_configs.get("MAX_WAIT_MS", 50))/1000,
+                          single_flight=bool(single_flight_configs.get("ENABLE", True)),
+                          webhook=bool(webhook_configs.get("ENABLE", False)),
+                          webhook_secret=os.getenv("WEBHOOK_SECRET", None),
+                          webhook_max_concurrency=int(webhook_configs.get("MAX_CONCURRENCY", 4)),
+                          webhook_max_retries=int(webhook_configs.get("MAX_RETRIES", 3)),
+                          webhook_retry_backoff=float(webhook_configs.get("RETRY_BACKOFF", 1)),
+                          webhook_timeout=float(webhook_configs.get("TIMEOUT", 30)),
+                          webhook_max_pending=int(webhook_configs.get("MAX_PENDING", 1000)),
+                          webhook_allowed_hosts=webhook_configs.get("ALLOWED_HOSTS", []),
+                          webhook_allow_loopback=bool(webhook_configs.get("ALLOW_LOOPBACK", False)),
+                          drain_timeout=int(drain_configs.get("TIMEOUT", 300)),
+                          drain_allowed_ips=drain_configs.get("ALLOWED_IPS", None),
+                          journal_fn=os.path.join(root_dir, journal_configs.get("FILE", "session_journal.jsonl")) if journal_configs.get("ENABLE", False) else None,
+                          journal_ttl=int(journal_configs.get("TTL", 3600)),
+                          journal_compact_interval=int(journal_configs.get("COMPACT_INTERVAL", 60)),
+                          rate_limit_rules=rate_limit_rules,
+                          rate_limit_paths=rate_limit_configs.get("PATHS", None),
+                          usage_fn=os.path.join(root_dir, usage_configs.get("FILE", "usage_ledger.jsonl")) if usage_configs.get("ENABLE", False) else None,
+                          usage_bucket_seconds=int(usage_configs.get("BUCKET_SECONDS", 3600)),
+                          usage_retention_days=int(usage_configs.get("RETENTION_DAYS", 90)),
+                          usage_allowed_ips=usage_configs.get("ALLOWED_IPS", None))
     
     app = await server.init_app()
-    await run_app(app, host, int(port))
+    await run_app(app, host, int(port), server)
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -0,0 +1,123 @@
+import math
+import time
+import asyncio
+import logging
+
+class RateLimitError(Exception):
+    def __init__(self, scope:str, key:str, retry_after:int):
+        """
+        요청 한도를 넘었을 때 발생하는 예외입니다.
+
+        Args:
+            scope (str): 한도를 넘은 기준 (client, ip, workflow)
+            key (str): 한도를 넘은 client id, IP 또는 workflow alias
+            retry_after (int): client가 다시 요청하기까지 기다려야 할 시간(초)
+        """
+        super().__init__(f"too many requests for {scope} '{key}'. retry after {retry_after}s")
+        self.scope = scope
+        self.key = key
+        self.retry_after = retry_after
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens:float, updated:float):
+        """
+        기준 하나(client id, IP, workflow)의 남은 요청 수입니다. 마지막으로 갱신한 시각부터 흐른 시간만큼 채워서 계산하므로 항목마다 두 값만 보관합니다.
+
+        Args:
+            tokens (float): 남은 요청 수
+            updated (float): 마지막으로 갱신한 시각(time.monotonic)
+        """
+        self.tokens = tokens
+        self.updated = updated
+
+class RateLimiter:
+    def __init__(self, rules:dict, interval:int=60):
+        """
+        client id, IP, workflow 별로 요청 수를 제한하는 token bucket을 초기화합니다.
+        bucket은 초당 rate개씩 burst개까지 채워지고, 요청마다 하나씩 꺼냅니다. 가득 찬 bucket은 없는 것과 같으므로 주기적으로 삭제합니다.
+
+        Args:
+            rules (dict): 기준 -> (rate, burst). 기준은 client, ip, workflow이며, 없는 기준은 제한하지 않습니다.
+            interval (int, optional): 가득 찬 bucket을 삭제하는 간격(초). 기본값은 60초입니다.
+        """
+        self.rules = {scope: (float(rate), float(burst)) for scope, (rate, burst) in rules.items() if rate > 0 and burst > 0}
+        self.buckets: dict[tuple[str, str], TokenBucket] = {}   # (기준, key) -> bucket
+        self.allowed = 0
+        self.limited = 0
+        self.evict_task = asyncio.create_task(self.check_evict(interval=interval))
+
+    def acquire(self, keys:dict, cost:int=1):
+        """
+        모든 기준의 bucket에 요청 cost개가 남아 있다면 cost개씩 꺼냅니다. 하나라도 모자라다면 어느 bucket에서도 꺼내지 않습니다.
+
+        Args:
+            keys (dict): 기준 -> key. key가 None인 기준은 건너뜁니다.
+            cost (int, optional): 꺼낼 요청 수 (ex: batch 요청의 parameter set 수). 기본값은 1입니다.
+
+        Raises:
+            RateLimitError: 비어 있는 bucket이 있을 때 발생. 가장 오래 기다려야 하는 기준을 알립니다.
+        """
+        now = time.monotonic()
+        buckets = []
+        limited = None
+        for scope, key in keys.items():
+            rule = self.rules.get(scope, None)
+            if rule is None or key is None:
+                continue
+            rate, burst = rule
+            bucket = self.buckets.get((scope, key), None)
+            if bucket is None:
+                bucket = self.buckets[(scope, key)] = TokenBucket(burst, now)
+            else:
+                bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+                bucket.updated = now
+            if bucket.tokens < cost:
+                retry_after = (cost - bucket.tokens) / rate
+                if limited is None or retry_after > limited[2]:
+                    limited = (scope, key, retry_after)
+            buckets.append(bucket)
+
+        if limited is not None:
+            self.limited += 1
+            scope, key, retry_after = limited
+            logging.warning(f"[RATE LIMIT] LIMITED / {scope} / {key} / retry after {round(retry_after, 2)}s")
+            raise RateLimitError(scope, key, max(1, math.ceil(retry_after)))
+        for bucket in buckets:
+            bucket.tokens -= cost
+        self.allowed += 1
+
+    async def check_evict(self, interval:int):
+        """
+        주기적으로 가득 찬 bucket을 삭제하여 요청하고 있는 key만큼만 메모리를 사용합니다.
+
+        Args:
+            interval (int): 삭제 확인 간격(초)
+        """
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            full = [(scope, key) for (scope, key), bucket in self.buckets.items()
+                    if bucket.tokens + (now - bucket.updated) * self.rules[scope][0] >= self.rules[scope][1]]
+            for item in full:
+                del self.buckets[item]
+            if len(full) > 0:
+                logging.debug(f"[RATE LIMIT] EVICTED / {len(full)} buckets")
+
+    def stats(self):
+        """
+        요청 제한 현황을 반환합니다.
+
+        Returns:
+            dict: 기준 별 rate와 burst, 기준 별 bucket 수, 지금까지 허용하고 거절한 요청 수
+        """
+        buckets = {scope: 0 for scope in self.rules}
+        for scope, _ in self.buckets:
+            buckets[scope] += 1
+        return {
+            "rules": {scope: {"rate": rate, "burst": burst} for scope, (rate, burst) in self.rules.items()},
+            "buckets": buckets,
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
@@ -0,0 +1,175 @@
+import os, json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+import pathlib
+import aiofiles
+from asyncio import Lock
+from collections import OrderedDict
+
+class ResultCache:
+    def __init__(self, cache_dir:str, max_size:int=1024**3, ttl:int=86400):
+        """
+        동일한 prompt의 결과물을 로컬 디스크에 보관하는 LRU 캐시를 초기화합니다.
+
+        Args:
+            cache_dir (str): 결과물과 index를 저장할 폴더 경로
+            max_size (int, optional): 캐시가 사용할 최대 디스크 용량(byte). 기본값은 1GB입니다.
+            ttl (int, optional): 결과물을 보관할 시간(초). 기본값은 하루입니다.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.ttl = ttl
+        self.index_fn = os.path.join(cache_dir, "index.json")
+
+        self.entries: OrderedDict[str, dict] = OrderedDict()    # 오래 사용되지 않은 순서로 정렬된 캐시 항목
+        self.pending = set()    # 현재 디스크에 쓰고 있는 캐시 키
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(prompt:dict):
+        """
+        ComfyUI prompt를 정규화한 JSON의 SHA-256 해시를 캐시 키로 반환합니다.
+
+        Args:
+            prompt (dict): 입력 값이 채워진 ComfyUI prompt
+
+        Returns:
+            str: 캐시 키 (16진수 문자열)
+        """
+        canonical = json.dumps(prompt, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    async def get(self, key:str):
+        """
+        캐시 키에 해당하는 결과물을 가져옵니다. 만료된 항목은 삭제합니다.
+
+        Args:
+            key (str): 캐시 키
+
+        Returns:
+            list or None: (파일 이름, 파일 내용, MIME 타입) 튜플 목록. 캐시에 없다면 None
+        """
+        async with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None and self._is_expired(entry):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+
+        files = []
+        try:
+            for cur in entry["files"]:
+                async with aiofiles.open(os.path.join(self.cache_dir, key, cur["path"]), mode="rb") as f:
+                    files.append((cur["file_name"], await f.read(), cur["content_type"]))
+        except OSError as e:
+            logging.warning(f"[CACHE] BROKEN ENTRY / {e} / {key}")
+            async with self.lock:
+                if key in self.entries:
+                    self._remove(key)
+                self.misses += 1
+            return None
+
+        self.hits += 1
+        return files
+
+    async def put(self, key:str, files:list):
+        """
+        결과물을 캐시에 저장하고, 용량을 넘으면 오래 사용되지 않은 항목부터 삭제합니다.
+
+        Args:
+            key (str): 캐시 키
+            files (list): (파일 이름, 파일 내용, MIME 타입) 튜플 목록. 파일 내용이 로컬 경로(pathlib.Path)라면 파일을 복사합니다.
+        """
+        size = sum(os.path.getsize(file_content) if isinstance(file_content, pathlib.Path) else len(file_content) for _, file_content, _ in files)
+        async with self.lock:
+            if len(files) == 0 or size > self.max_size or key in self.entries or key in self.pending:
+                return
+            self.pending.add(key)
+
+        try:
+            entry_dir = os.path.join(self.cache_dir, key)
+            os.makedirs(entry_dir, exist_ok=True)
+            entry_files = []
+            for idx, (file_name, file_content, content_type) in enumerate(files):
+                if isinstance(file_content, pathlib.Path):
+                    await asyncio.to_thread(shutil.copyfile, file_content, os.path.join(entry_dir, str(idx)))
+                else:
+                    async with aiofiles.open(os.path.join(entry_dir, str(idx)), mode="wb") as f:
+                        await f.write(file_content)
+                entry_files.append({"file_name": file_name, "content_type": content_type, "path": str(idx)})
+        except OSError as e:
+            logging.warning(f"[CACHE] PUT FAILED / {e} / {key}")
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            async with self.lock:
+                self.pending.discard(key)
+            return
+
+        async with self.lock:
+            self.pending.discard(key)
+            self.entries[key] = {"created": time.time(), "size": size, "files": entry_files}
+            self.total_size += size
+
+            # 만료된 항목과 용량을 넘는 항목을 삭제
+            for cur_key in [cur_key for cur_key, cur in self.entries.items() if self._is_expired(cur)]:
+                self._remove(cur_key)
+            while self.total_size > self.max_size:
+                self._remove(next(iter(self.entries)))
+
+            async with aiofiles.open(self.index_fn, mode="w") as f:
+                await f.write(json.dumps(list(self.entries.items())))
+
+    def stats(self):
+        """
+        캐시 사용 현황을 반환합니다.
+
+        Returns:
+            dict: hit, miss 횟수와 저장된 항목 수, 사용 용량
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total > 0 else 0.0,
+            "entries": len(self.entries),
+            "size": self.total_size,
+            "max_size": self.max_size,
+        }
+
+    def _is_expired(self, entry:dict):
+        return time.time() - entry["created"] > self.ttl
+
+    def _remove(self, key:str):
+        entry = self.entries.pop(key)
+        self.total_size -= entry["size"]
+        shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+
+    def _load_index(self):
+        # 이전에 저장한 index를 불러오고, 파일이 없거나 만료된 항목은 버림
+        try:
+            with open(self.index_fn, mode="r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = []
+
+        for key, entry in entries:
+            entry_dir = os.path.join(self.cache_dir, key)
+            if self._is_expired(entry) or not all(os.path.exists(os.path.join(entry_dir, cur["path"])) for cur in entry["files"]):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            self.entries[key] = entry
+            self.total_size += entry["size"]
+
+        while self.total_size > self.max_size:
+            self._remove(next(iter(self.entries)))
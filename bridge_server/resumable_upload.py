@@ -0,0 +1,234 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import tempfile
+import aiofiles
+from security import FileValidator
+from upload_store import UploadStore
+
+class UploadOffsetError(Exception):
+    def __init__(self, offset:int):
+        """
+        client가 보낸 offset이 서버에 저장된 offset과 다를 때 발생하는 예외입니다.
+
+        Args:
+            offset (int): 서버에 저장된 offset. client는 이 위치부터 다시 보내야 합니다.
+        """
+        super().__init__(f"upload offset mismatch, current offset is {offset}")
+        self.offset = offset
+
+class UploadSession:
+    def __init__(self, sid:str, name:str, file_name:str, size:int, part_path:str):
+        self.upload_id = uuid.uuid4().hex
+        self.sid = sid
+        self.name = name    # client가 결과를 구분할 파일 식별자
+        self.file_name = file_name  # 원본 파일 이름. 확장자 검사에 사용
+        self.size = size
+        self.part_path = part_path
+        self.offset = 0
+        self.header = b''   # MIME 타입 검사에 사용할 파일 앞부분
+        self.mime_type = None
+        self.tail = b''     # 청크 경계에 걸친 패턴 검사에 사용할 앞 청크의 끝
+        self.updated = time.time()
+        self.lock = asyncio.Lock()
+
+class ResumableUploadManager:
+    HEADER_SIZE = 2048  # MIME 타입을 판별할 파일 앞부분의 크기
+
+    def __init__(self, validator:FileValidator, store:UploadStore, max_size:int, chunk_max_size:int=8*1024**2, expire_seconds:int=3600, interval:int=60):
+        """
+        offset 기반으로 이어받을 수 있는 업로드를 관리합니다.
+        청크를 받을 때마다 MIME 타입, 확장자, 의심스러운 패턴을 검사하고, 완료되면 업로드 저장소로 옮깁니다.
+
+        Args:
+            validator (FileValidator): 파일 검사에 사용할 validator
+            store (UploadStore): 받는 중인 파일을 두고, 완료된 파일을 보관할 업로드 저장소
+            max_size (int): 파일 하나의 최대 크기(byte)
+            chunk_max_size (int, optional): 요청 하나로 보낼 수 있는 최대 청크 크기(byte). 기본값은 8MB입니다.
+            expire_seconds (int, optional): 마지막 청크 이후 업로드를 보관할 시간(초). 기본값은 3600초입니다.
+            interval (int, optional): 만료된 업로드를 확인하는 간격(초). 기본값은 60초입니다.
+        """
+        self.validator = validator
+        self.store = store
+        self.max_size = max_size
+        self.chunk_max_size = chunk_max_size
+        self.expire_seconds = expire_seconds
+
+        self.sessions: dict[str, UploadSession] = {}
+        self.check_task = asyncio.create_task(self.check_expired(interval=interval))
+
+    def create(self, sid:str, name:str, file_name:str, size:int):
+        """
+        새 업로드를 만듭니다.
+
+        Args:
+            sid (str): 소켓 ID
+            name (str): 파일 식별자
+            file_name (str): 원본 파일 이름
+            size (int): 파일 크기(byte)
+
+        Returns:
+            UploadSession: 생성된 업로드
+
+        Raises:
+            ValueError: 파일 이름이나 크기가 올바르지 않을 때 발생
+            UploadQuotaError: 업로드 저장소의 용량이 부족할 때 발생
+        """
+        file_name = os.path.basename(file_name)
+        if not self.validator.is_safe_filename(file_name):
+            raise ValueError(f"Invalid filename / {file_name}")
+        extension = os.path.splitext(file_name)[1].lower()
+        if extension not in self.validator.mime_extension_map.values():
+            raise ValueError(f"{extension} is not allowed extension / {file_name}")
+        if size <= 0 or size > self.max_size:
+            raise ValueError(f"size is must be in 1~{self.max_size} but got {size}")
+
+        # 받을 크기만큼 저장소의 용량을 미리 예약합니다.
+        self.store.reserve(size)
+        # 완료 전의 파일은 generate에서 사용할 수 없도록 다른 prefix로 저장합니다.
+        fd, part_path = tempfile.mkstemp(prefix="bridge_server_upload_", dir=self.store.store_dir)
+        os.close(fd)
+        session = UploadSession(sid, name, file_name, size, part_path)
+        self.sessions[session.upload_id] = session
+        logging.debug(f"[UPLOAD] CREATE / {file_name} / {size} / {session.upload_id}")
+        return session
+
+    def get(self, upload_id:str):
+        """
+        업로드를 가져옵니다.
+
+        Args:
+            upload_id (str): 업로드 ID
+
+        Returns:
+            UploadSession: 업로드
+
+        Raises:
+            KeyError: 업로드가 없거나 만료되었을 때 발생
+        """
+        session = self.sessions.get(upload_id, None)
+        if session is None:
+            raise KeyError(f"upload is not found or expired / {upload_id}")
+        return session
+
+    async def write(self, upload_id:str, offset:int, stream):
+        """
+        offset 위치부터 청크를 이어 씁니다. 연결이 끊기면 받은 곳까지 offset을 남깁니다.
+
+        Args:
+            upload_id (str): 업로드 ID
+            offset (int): client가 보낸 청크의 시작 위치
+            stream (aiohttp.StreamReader): 요청 body
+
+        Returns:
+            int: 청크를 쓴 뒤의 offset
+
+        Raises:
+            KeyError: 업로드가 없을 때 발생
+            UploadOffsetError: offset이 다르거나 다른 요청이 쓰는 중일 때 발생
+            ValueError: 청크가 너무 크거나 검사에 실패했을 때 발생. 업로드는 삭제됩니다.
+        """
+        session = self.get(upload_id)
+        if session.lock.locked() or offset != session.offset:
+            raise UploadOffsetError(session.offset)
+
+        async with session.lock:
+            written = 0
+            try:
+                async with aiofiles.open(session.part_path, mode="r+b") as f:
+                    await f.seek(session.offset)
+                    async for chunk in stream.iter_chunked(64*1024):
+                        written += len(chunk)
+                        if written > self.chunk_max_size:
+                            raise ValueError(f"chunk is larger than {self.chunk_max_size}")
+                        if session.offset + len(chunk) > session.size:
+                            raise ValueError(f"upload is larger than declared size {session.size}")
+                        self._validate_chunk(session, chunk)
+                        await f.write(chunk)
+                        session.offset += len(chunk)
+                        session.updated = time.time()
+                if session.offset == session.size and session.mime_type is None:
+                    # HEADER_SIZE보다 작은 파일은 마지막 청크에서 검사합니다.
+                    self._validate_header(session)
+            except ValueError:
+                self.remove(upload_id)
+                raise
+            finally:
+                session.updated = time.time()
+        return session.offset
+
+    def finalize(self, upload_id:str):
+        """
+        업로드를 완료합니다. 받은 파일과 예약한 용량은 UploadStore.adopt로 넘깁니다.
+
+        Args:
+            upload_id (str): 업로드 ID
+
+        Returns:
+            UploadSession: 완료된 업로드
+
+        Raises:
+            KeyError: 업로드가 없을 때 발생
+            UploadOffsetError: 아직 모든 청크를 받지 않았을 때 발생
+        """
+        session = self.get(upload_id)
+        if session.lock.locked() or session.offset != session.size:
+            raise UploadOffsetError(session.offset)
+
+        del self.sessions[upload_id]
+        logging.debug(f"[UPLOAD] FINALIZE / {session.file_name} / {session.mime_type} / {upload_id}")
+        return session
+
+    def remove(self, upload_id:str):
+        """
+        업로드와 임시 파일을 삭제합니다.
+
+        Args:
+            upload_id (str): 업로드 ID
+        """
+        session = self.sessions.pop(upload_id, None)
+        if session is None:
+            return
+        self.store.release(session.size)
+        if os.path.exists(session.part_path):
+            os.remove(session.part_path)
+
+    async def check_expired(self, interval:int):
+        """
+        주기적으로 만료된 업로드를 삭제합니다.
+
+        Args:
+            interval (int): 확인 간격(초)
+        """
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            for upload_id, session in list(self.sessions.items()):
+                if not session.lock.locked() and now - session.updated > self.expire_seconds:
+                    logging.debug(f"[UPLOAD] EXPIRED / {session.file_name} / {upload_id}")
+                    self.remove(upload_id)
+
+    def _validate_chunk(self, session:UploadSession, chunk:bytes):
+        if session.mime_type is None:
+            session.header = (session.header + chunk)[:self.HEADER_SIZE]
+            if len(session.header) >= self.HEADER_SIZE:
+                self._validate_header(session)
+
+        content = session.tail + chunk
+        for pattern in FileValidator.SUSPICIOUS_PATTERNS:
+            if pattern in content:
+                raise ValueError(f"File is detected as suspicious / {session.file_name}")
+        session.tail = content[-(max(len(pattern) for pattern in FileValidator.SUSPICIOUS_PATTERNS) - 1):]
+
+    def _validate_header(self, session:UploadSession):
+        mime_type = FileValidator.get_mime_type_from_binary(session.header)
+        if mime_type not in self.validator.ALLOWED_MIME_TYPES:
+            raise ValueError(f"Unsupported MIME type: {mime_type} / {session.file_name}")
+        if not self.validator.is_valid_extension(session.file_name, mime_type):
+            raise ValueError(f"File extension does not match MIME type / {session.file_name}")
+        if "image" not in mime_type and "video" not in mime_type:
+            # /upload와 같이 이미지와 비디오만 허락합니다.
+            raise ValueError(f"{mime_type} is not allowed type / {session.file_name}")
+        session.mime_type = mime_type
@@ -0,0 +1,490 @@
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after:int):
+        """
+        bridge server의 대기열이 가득 찼을 때 발생하는 예외입니다.
+
+        Args:
+            retry_after (int): client가 다시 요청하기까지 기다려야 할 시간(초)
+        """
+        super().__init__(f"bridge queue is full. retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class Job:
+    def __init__(self, sid:str, server_address:str, prompt:dict, owner:str, priority:str, workflow:str=None, notify:bool=True):
+        """
+        bridge server의 대기열에서 관리하는 작업입니다.
+
+        Args:
+            sid (str): ComfyUI에 전달할 client ID
+            server_address (str): 작업을 실행할 ComfyUI 서버 주소
+            prompt (dict): ComfyUI에서 실행 가능한 prompt
+            owner (str): 공정 분배의 기준이 되는 요청자 (ex: client IP)
+            priority (str): 작업의 우선순위 등급
+            workflow (str, optional): 워크플로우 alias. 실행 시간 예측에 사용합니다.
+            notify (bool, optional): 대기 순번을 소켓 ID로 전달할지 여부. 기본값은 True입니다.
+        """
+        self.sid = sid
+        self.server_address = server_address
+        self.prompt = prompt
+        self.owner = owner
+        self.priority = priority
+        self.workflow = workflow
+        self.notify = notify
+        self.prompt_id = None   # ComfyUI가 할당한 prompt_id
+        self.error = None   # ComfyUI에 등록하지 못한 이유
+        self.enqueued_at = time.time()
+        self.dispatched_at = None
+        self.started_at = None  # ComfyUI에서 실행이 시작된 시간
+        self.retries = 0    # 다른 ComfyUI 서버로 다시 할당된 횟수
+        self.attempt = 0    # 등록 시도마다 증가. 이전 시도의 결과를 무시하는 데 사용
+        self.dispatched = asyncio.get_running_loop().create_future()    # ComfyUI에 등록되면 완료
+
+class JobScheduler:
+    def __init__(self,
+                 server_address:list,
+                 submit_fn,
+                 notify_fn,
+                 max_inflight:int=2,
+                 max_queue_size:int=200,
+                 priority_classes:list=None,
+                 interval:int=1,
+                 available_fn=None):
+        """
+        ComfyUI 서버마다 대기열을 두고, 요청자 간 공정하게 작업을 분배하는 스케줄러를 초기화합니다.
+        각 ComfyUI 서버에는 최대 max_inflight개의 작업만 등록하고, 자리가 비는 즉시 다음 작업을 등록합니다.
+
+        Args:
+            server_address (list): ComfyUI 서버 주소 목록
+            submit_fn (Callable): Job을 ComfyUI에 등록하고 prompt_id를 반환하는 코루틴 함수
+            notify_fn (Callable): (소켓 ID, 대기 순번)을 받아 client에게 알리는 코루틴 함수. 순번 0은 ComfyUI에 등록된 작업입니다.
+            max_inflight (int, optional): ComfyUI 서버 하나에 동시에 등록할 최대 작업 수. 기본값은 2입니다.
+            max_queue_size (int, optional): bridge server가 대기시킬 최대 작업 수. 기본값은 200입니다.
+            priority_classes (list, optional): 우선순위가 높은 순서의 등급 목록. 기본값은 ["high", "normal", "low"]입니다.
+            interval (int, optional): 대기 순번을 알리는 간격(초). 기본값은 1초입니다.
+            available_fn (Callable, optional): 서버 주소를 받아 작업을 등록할 수 있는지 반환하는 함수. 사용할 수 없는 서버에는 작업을 등록하지 않습니다.
+        """
+        self.server_address = server_address
+        self.submit_fn = submit_fn
+        self.notify_fn = notify_fn
+        self.max_inflight = max_inflight
+        self.max_queue_size = max_queue_size
+        self.priority_classes = priority_classes or ["high", "normal", "low"]
+        self.available_fn = available_fn
+
+        # 서버 -> 우선순위 -> 요청자 -> 작업 목록. 요청자는 작업을 할당받으면 맨 뒤로 이동합니다.
+        self.queues: dict[str, dict[str, OrderedDict[str, deque]]] = {}
+        self.inflight: dict[str, dict[str, Job]] = {}
+        self.jobs: dict[str, Job] = {}  # 대기 중인 작업
+        self.avg_duration = 30.0    # 작업 하나가 등록되고 끝날 때까지의 평균 시간(초)
+
+        self.notify_task = asyncio.create_task(self.notify_positions(interval=interval))
+
+    def check_admission(self, count:int=1):
+        """
+        작업을 더 대기시킬 수 있는지 확인합니다.
+
+        Args:
+            count (int, optional): 추가할 작업의 수. 기본값은 1입니다.
+
+        Raises:
+            QueueFullError: 대기열이 가득 찬 경우 발생
+        """
+        if len(self.jobs) + count > self.max_queue_size:
+            raise QueueFullError(self.retry_after())
+
+    def retry_after(self):
+        """
+        현재 대기열이 처리될 때까지의 예상 시간을 계산합니다.
+
+        Returns:
+            int: 예상 대기 시간(초)
+        """
+        slots = self.max_inflight * max(len(self.server_address), 1)
+        return max(1, math.ceil(math.ceil((len(self.jobs) + 1) / slots) * self.avg_duration))
+
+    def submit(self, job:Job):
+        """
+        작업을 대기열에 추가하고, ComfyUI 서버에 자리가 있다면 바로 등록합니다.
+
+        Args:
+            job (Job): 추가할 작업
+
+        Returns:
+            int: 작업의 대기 순번. ComfyUI에 바로 등록되었다면 0입니다.
+
+        Raises:
+            ValueError: 알 수 없는 우선순위이거나 이미 대기 중인 소켓 ID인 경우 발생
+        """
+        if job.priority not in self.priority_classes:
+            raise ValueError(f"priority must be one of {self.priority_classes} but got '{job.priority}'")
+        if self.has_job(job.sid):
+            raise ValueError(f"'{job.sid}' is already queued")
+
+        self._get_queue(job.server_address)[job.priority].setdefault(job.owner, deque()).append(job)
+        self.jobs[job.sid] = job
+        self._dispatch(job.server_address)
+        return self.position(job.sid)
+
+    def adopt(self, job:Job):
+        """
+        대기열을 거치지 않고 이미 ComfyUI 서버에 등록된 작업을 등록된 작업으로 추가합니다. (ex: 다시 시작하기 전에 등록한 prompt)
+        자리가 가득 찼더라도 추가하며, 작업이 끝날 때까지 그만큼 새로운 작업을 등록하지 않습니다.
+
+        Args:
+            job (Job): ComfyUI가 할당한 prompt_id가 있는 작업
+
+        Raises:
+            ValueError: 이미 대기 중인 소켓 ID인 경우 발생
+        """
+        if self.has_job(job.sid):
+            raise ValueError(f"'{job.sid}' is already queued")
+
+        self._get_queue(job.server_address)
+        self.inflight[job.server_address][job.sid] = job
+        job.dispatched_at = time.time()
+        if not job.dispatched.done():
+            job.dispatched.set_result(job.prompt_id)
+
+    def complete(self, sid:str, success:bool=True):
+        """
+        ComfyUI 서버에서 작업이 끝났음을 알리고, 비어있는 자리에 다음 작업을 등록합니다.
+
+        Args:
+            sid (str): 끝난 작업의 소켓 ID
+            success (bool, optional): 작업이 정상 종료되었는지 여부. 정상 종료된 작업만 평균 시간에 반영합니다.
+
+        Returns:
+            Job or None: 끝난 작업. 등록된 작업이 없다면 None
+        """
+        for server_address, inflight in self.inflight.items():
+            job = inflight.pop(sid, None)
+            if job is None:
+                continue
+            if success == True and job.dispatched_at is not None:
+                self.avg_duration = 0.8*self.avg_duration + 0.2*(time.time() - job.dispatched_at)
+            self._dispatch(server_address)
+            return job
+        return None
+
+    def reassign(self, job:Job, server_address:str, prompt:dict):
+        """
+        작업을 다른 ComfyUI 서버로 옮깁니다. 대기 중이거나 등록된 작업이라면 기존 자리에서 제거하고,
+        새로운 서버 대기열의 맨 앞에 추가합니다.
+
+        Args:
+            job (Job): 옮길 작업
+            server_address (str): 새로운 ComfyUI 서버 주소
+            prompt (dict): 새로운 서버에 맞게 다시 파싱한 prompt
+
+        Returns:
+            int: 새로운 서버에서의 대기 순번. ComfyUI에 바로 등록되었다면 0입니다.
+        """
+        if job.sid in self.jobs:
+            self._remove_queued(self.jobs.pop(job.sid))
+        else:
+            for old_server_address, inflight in self.inflight.items():
+                if inflight.get(job.sid, None) is job:
+                    del inflight[job.sid]
+                    self._dispatch(old_server_address)
+                    break
+
+        if not job.dispatched.done():
+            job.dispatched.cancel()
+        job.server_address = server_address
+        job.prompt = prompt
+        job.prompt_id = None
+        job.error = None
+        job.dispatched_at = None
+        job.started_at = None
+        job.retries += 1
+        job.attempt += 1
+        job.dispatched = asyncio.get_running_loop().create_future()
+
+        # 장애로 밀려난 작업이므로 같은 우선순위에서 가장 먼저 실행합니다.
+        owners = self._get_queue(server_address)[job.priority]
+        owners.setdefault(job.owner, deque()).appendleft(job)
+        owners.move_to_end(job.owner, last=False)
+        self.jobs[job.sid] = job
+        self._dispatch(server_address)
+        return self.position(job.sid)
+
+    def transfer(self, sid:str, new_sid:str):
+        """
+        작업을 다른 소켓 ID로 넘깁니다. 대기 순번이나 ComfyUI 서버에 등록된 자리는 그대로 유지합니다.
+
+        Args:
+            sid (str): 작업의 소켓 ID
+            new_sid (str): 작업을 넘겨받을 소켓 ID
+
+        Returns:
+            Job or None: 넘긴 작업. 작업이 없다면 None
+        """
+        job = self.jobs.pop(sid, None)
+        if job is not None:
+            self.jobs[new_sid] = job
+        else:
+            for inflight in self.inflight.values():
+                if sid in inflight:
+                    job = inflight.pop(sid)
+                    inflight[new_sid] = job
+                    break
+        if job is not None:
+            job.sid = new_sid
+        return job
+
+    def resume(self, server_address:str):
+        """
+        다시 사용할 수 있게 된 ComfyUI 서버에 대기 중인 작업을 등록합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+        """
+        self._dispatch(server_address)
+
+    def mark_started(self, sid:str):
+        """
+        등록된 작업이 ComfyUI에서 실행되기 시작했음을 기록합니다.
+
+        Args:
+            sid (str): 소켓 ID
+        """
+        for inflight in self.inflight.values():
+            if sid in inflight and inflight[sid].started_at is None:
+                inflight[sid].started_at = time.time()
+
+    def cancel(self, sid:str):
+        """
+        작업을 취소합니다. 대기 중이라면 대기열에서 제거하고, 등록된 작업이라면 자리를 반환합니다.
+
+        Args:
+            sid (str): 취소할 작업의 소켓 ID
+        """
+        job = self.jobs.pop(sid, None)
+        if job is None:
+            self.complete(sid, success=False)
+            return
+
+        self._remove_queued(job)
+        if not job.dispatched.done():
+            job.dispatched.cancel()
+
+    def position(self, sid:str):
+        """
+        작업의 대기 순번을 반환합니다.
+
+        Args:
+            sid (str): 소켓 ID
+
+        Returns:
+            int or None: 1부터 시작하는 대기 순번. ComfyUI에 등록되었다면 0, 작업이 없다면 None
+        """
+        job = self.jobs.get(sid, None)
+        if job is None:
+            return 0 if any(sid in cur for cur in self.inflight.values()) else None
+        return self._ordered_jobs(job.server_address).index(job) + 1
+
+    def queued_count(self, server_address:str):
+        """
+        ComfyUI 서버에 등록되기를 기다리는 작업의 수를 반환합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+
+        Returns:
+            int: 대기 중인 작업 수
+        """
+        return sum(job.server_address == server_address for job in self.jobs.values())
+
+    def expected_backlog(self, server_address:str, expected_fn):
+        """
+        ComfyUI 서버에 등록되었거나 대기 중인 작업이 모두 끝날 때까지의 예상 시간을 계산합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            expected_fn (Callable): (서버 주소, 워크플로우)를 받아 예상 실행 시간(초)을 반환하는 함수
+
+        Returns:
+            float: 예상 시간(초)
+        """
+        now = time.time()
+        backlog = 0.0
+        for job in self.inflight.get(server_address, {}).values():
+            elapsed = now - job.started_at if job.started_at is not None else 0.0
+            backlog += max(expected_fn(server_address, job.workflow) - elapsed, 0.0)
+        for job in self.jobs.values():
+            if job.server_address == server_address:
+                backlog += expected_fn(server_address, job.workflow)
+        return backlog
+
+    def expected_wait(self, sid:str, expected_fn):
+        """
+        대기 중인 작업이 ComfyUI에서 실행되기 시작할 때까지의 예상 시간을 계산합니다.
+
+        Args:
+            sid (str): 소켓 ID
+            expected_fn (Callable): (서버 주소, 워크플로우)를 받아 예상 실행 시간(초)을 반환하는 함수
+
+        Returns:
+            float or None: 예상 대기 시간(초). 대기 중인 작업이 아니라면 None
+        """
+        job = self.jobs.get(sid, None)
+        if job is None:
+            return None
+        now = time.time()
+        wait = 0.0
+        for cur in self.inflight.get(job.server_address, {}).values():
+            elapsed = now - cur.started_at if cur.started_at is not None else 0.0
+            wait += max(expected_fn(job.server_address, cur.workflow) - elapsed, 0.0)
+        for cur in self._ordered_jobs(job.server_address):
+            if cur is job:
+                break
+            wait += expected_fn(job.server_address, cur.workflow)
+        return wait
+
+    def inflight_count(self, server_address:str):
+        """
+        ComfyUI 서버에 등록된 작업의 수를 반환합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+
+        Returns:
+            int: 등록된 작업 수
+        """
+        return len(self.inflight.get(server_address, {}))
+
+    def has_job(self, sid:str):
+        """
+        소켓 ID의 작업이 대기 중이거나 등록되어 있는지 확인합니다.
+
+        Args:
+            sid (str): 소켓 ID
+
+        Returns:
+            bool: 작업 존재 여부
+        """
+        return sid in self.jobs or any(sid in cur for cur in self.inflight.values())
+
+    def active_jobs(self):
+        """
+        대기 중이거나 ComfyUI 서버에 등록된 모든 작업을 반환합니다.
+
+        Returns:
+            list: 작업 목록
+        """
+        return list(self.jobs.values()) + [job for cur in self.inflight.values() for job in cur.values()]
+
+    def stats(self):
+        """
+        대기열 현황을 반환합니다.
+
+        Returns:
+            dict: 서버 별 대기 작업 수와 등록된 작업 수
+        """
+        server_addresses = set(self.queues.keys()) | set(self.server_address)
+        return {
+            "queued": len(self.jobs),
+            "max_queue_size": self.max_queue_size,
+            "max_inflight": self.max_inflight,
+            "avg_duration": round(self.avg_duration, 2),
+            "servers": {
+                server_address: {
+                    "queued": self.queued_count(server_address),
+                    "inflight": len(self.inflight.get(server_address, {})),
+                } for server_address in server_addresses
+            },
+        }
+
+    async def notify_positions(self, interval:int):
+        """
+        주기적으로 대기 중인 작업에 대기 순번을 알립니다.
+        ComfyUI에 등록된 작업에는 순번 0을 알려 생명 주기가 끝나지 않도록 합니다.
+
+        Args:
+            interval (int): 알림 간격(초)
+        """
+        while True:
+            await asyncio.sleep(interval)
+
+            positions = []
+            for server_address in list(self.queues.keys()):
+                positions.extend((job, idx+1) for idx, job in enumerate(self._ordered_jobs(server_address)))
+                positions.extend((job, 0) for job in self.inflight[server_address].values())
+
+            for job, position in positions:
+                if job.notify == False:
+                    continue
+                try:
+                    await self.notify_fn(job.sid, position)
+                except Exception as e:
+                    logging.debug(f"[SCHEDULER] NOTIFY FAILED / {e} / {job.sid}")
+
+    def _get_queue(self, server_address:str):
+        if server_address not in self.queues:
+            self.queues[server_address] = {priority: OrderedDict() for priority in self.priority_classes}
+            self.inflight[server_address] = {}
+        return self.queues[server_address]
+
+    def _ordered_jobs(self, server_address:str):
+        # 우선순위가 높은 등급부터, 같은 등급에서는 요청자를 번갈아 가며 실행될 순서대로 나열
+        ordered = []
+        for owners in self._get_queue(server_address).values():
+            columns = [list(jobs) for jobs in owners.values()]
+            for idx in range(max((len(cur) for cur in columns), default=0)):
+                ordered.extend(cur[idx] for cur in columns if idx < len(cur))
+        return ordered
+
+    def _remove_queued(self, job:Job):
+        owners = self._get_queue(job.server_address)[job.priority]
+        owners[job.owner].remove(job)
+        if len(owners[job.owner]) == 0:
+            del owners[job.owner]
+
+    def _pop_next(self, server_address:str):
+        for owners in self._get_queue(server_address).values():
+            if len(owners) == 0:
+                continue
+            owner, jobs = next(iter(owners.items()))
+            job = jobs.popleft()
+            if len(jobs) > 0:
+                owners.move_to_end(owner)
+            else:
+                del owners[owner]
+            return job
+        return None
+
+    def _dispatch(self, server_address:str):
+        self._get_queue(server_address)
+        if self.available_fn is not None and not self.available_fn(server_address):
+            # 장애로 제외된 서버에는 등록하지 않고 복구되거나 다른 서버로 옮겨질 때까지 기다립니다.
+            return
+        while len(self.inflight[server_address]) < self.max_inflight:
+            job = self._pop_next(server_address)
+            if job is None:
+                break
+            del self.jobs[job.sid]
+            self.inflight[server_address][job.sid] = job
+            job.dispatched_at = time.time()
+            asyncio.create_task(self._send(job, job.attempt))
+
+    async def _send(self, job:Job, attempt:int):
+        try:
+            prompt_id = await self.submit_fn(job)
+            if job.attempt == attempt:
+                job.prompt_id = prompt_id
+            logging.debug(f"[SCHEDULER] DISPATCHED / {job.server_address} / {job.sid}")
+        except Exception as e:
+            logging.error(f"[SCHEDULER] DISPATCH FAILED / {e} / {job.sid}")
+            if job.attempt == attempt:
+                # 등록하는 동안 다른 서버로 옮겨진 작업의 자리는 반환하지 않습니다.
+                job.error = e
+                self.complete(job.sid, success=False)
+        finally:
+            if job.attempt == attempt and not job.dispatched.done():
+                job.dispatched.set_result(job.prompt_id)
@@ -1,17 +1,49 @@
 import os
 import magic
+import asyncio
 import tempfile
 import hashlib
+import threading
 import mimetypes
+from collections import OrderedDict
+
+# libmagic의 Magic 객체는 스레드 간에 공유할 수 없으므로 스레드 별로 하나씩 만들어 재사용합니다.
+_magic_local = threading.local()
+
+def get_magic():
+    """
+    현재 스레드의 Magic 객체를 반환합니다.
+
+    Returns:
+        magic.Magic: MIME 타입을 반환하는 Magic 객체
+    """
+    mime = getattr(_magic_local, "mime", None)
+    if mime is None:
+        mime = magic.Magic(mime=True)
+        _magic_local.mime = mime
+    return mime
 
 class FileValidator:
-    def __init__(self, allowed_mime_extension_map):
+    SUSPICIOUS_PATTERNS = [
+        b'<script', b'<?php', b'import ',
+        b'eval(', b'exec(', b'system(',
+    ]
+
+    def __init__(self, allowed_mime_extension_map, executor=None, verdict_cache_size=1024):
         """
         파일 유효성 검사 클래스를 초기화합니다.
         
         Args:
             allowed_mime_extension_map (dict): 허용된 MIME 타입 및 확장자 매핑이 담긴 사전
+            executor (Executor, optional): 파일 검사를 실행할 executor. None이면 asyncio 기본 executor를 사용합니다.
+            verdict_cache_size (int, optional): 메모리 검사 결과를 보관할 최대 항목 수 (기본값: 1024)
         """
+        self.executor = executor
+        self.verdict_cache_size = verdict_cache_size
+        self.verdicts = OrderedDict()   # (내용 해시, 확장자, MIME 타입만 검사했는지) -> 검사 결과
+        self.verdict_lock = threading.Lock()
+        self.verdict_hits = 0
+        self.verdict_misses = 0
         self.mime_extension_map = allowed_mime_extension_map
         self.ALLOWED_MIME_TYPES = list(allowed_mime_extension_map.keys())
 
@@ -26,8 +58,7 @@ class FileValidator:
         Returns:
             str: 추정된 MIME 타입 문자열 또는 'application/octet-stream'
         """
-        mime = magic.Magic(mime=True)
-        mime_type = mime.from_file(file_path)
+        mime_type = get_magic().from_file(file_path)
         return mime_type or 'application/octet-stream'
 
     @staticmethod
@@ -55,8 +86,10 @@ class FileValidator:
         Returns:
             str: 추정된 MIME 타입 문자열 또는 'application/octet-stream'
         """
-        mime = magic.Magic(mime=True)
-        mime_type = mime.from_buffer(binary_data)
+        if not isinstance(binary_data, bytes):
+            # libmagic은 bytes만 받으므로 multipart에서 읽은 bytearray 등은 변환합니다.
+            binary_data = bytes(binary_data)
+        mime_type = get_magic().from_buffer(binary_data)
         return mime_type or 'application/octet-stream'
 
     def is_safe_filename(self, filename):
@@ -96,20 +129,36 @@ class FileValidator:
         Returns:
             bool: 의심스러운 파일 여부
         """
-        suspicious_patterns = [
-            b'<script', b'<?php', b'import ',
-            b'eval(', b'exec(', b'system(',
-        ]
-        
+        suspicious_patterns = FileValidator.SUSPICIOUS_PATTERNS
+
+        # 큰 파일을 메모리에 올리지 않도록 나눠서 읽고, 경계에 걸친 패턴을 위해 앞 청크의 끝을 이어 붙입니다.
+        overlap = max(len(pattern) for pattern in suspicious_patterns) - 1
+        tail = b''
         with open(file_path, 'rb') as f:
-            content = f.read()
-        
-        for pattern in suspicious_patterns:
-            if pattern in content:
-                return True
+            while True:
+                chunk = f.read(1024**2)
+                if not chunk:
+                    break
+                content = tail + chunk
+                for pattern in suspicious_patterns:
+                    if pattern in content:
+                        return True
+                tail = content[-overlap:]
 
         return False
 
+    def contains_suspicious_pattern(self, file_data):
+        """
+        메모리에 있는 파일 데이터가 의심스러운 패턴을 포함하고 있는지 검사합니다.
+        
+        Args:
+            file_data (bytes): 파일 데이터
+        
+        Returns:
+            bool: 의심스러운 파일 여부
+        """
+        return any(pattern in file_data for pattern in FileValidator.SUSPICIOUS_PATTERNS)
+
     def get_file_hash(self, file_data):
         """
         파일 데이터의 SHA-256 해시 값을 계산합니다.
@@ -123,6 +172,22 @@ class FileValidator:
         file_hash = hashlib.sha256(file_data).hexdigest()
         return file_hash
 
+    def get_file_hash_from_path(self, file_path):
+        """
+        파일을 나눠 읽으며 SHA-256 해시 값을 계산합니다.
+        
+        Args:
+            file_path (str): 파일 경로
+        
+        Returns:
+            str: SHA-256 해시 값 (16진수 문자열)
+        """
+        file_hash = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024**2), b''):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
     async def validate_and_sanitize_file(self, file_data, filename, return_tmp_path=False):
         """
         파일을 검증하고, 필요 시 임시 파일로 저장합니다.
@@ -138,6 +203,10 @@ class FileValidator:
                 - str: 오류 메시지 또는 추가 정보
                 - str or None: 임시 파일 경로 (return_tmp_path=True 일 때 반환)
         """
+        # 임시 파일 쓰기와 MIME 타입, 패턴 검사는 이벤트 루프를 막지 않도록 executor에서 실행합니다.
+        return await self._run(self._validate_and_sanitize_file, file_data, filename, return_tmp_path)
+
+    def _validate_and_sanitize_file(self, file_data, filename, return_tmp_path):
         if not self.is_safe_filename(filename):
             return False, "Invalid filename", None
 
@@ -167,3 +236,110 @@ class FileValidator:
             # 에러 발생시 임시 파일 삭제
             os.remove(tmp_file_path)
             return False, str(e), None
+
+    async def validate_buffer(self, file_data, filename, mime_only=False):
+        """
+        메모리에 있는 파일을 임시 파일로 저장하지 않고 검증합니다.
+        같은 내용과 확장자의 검사 결과는 내용 해시로 캐시하여 다시 검사하지 않습니다.
+        
+        Args:
+            file_data (bytes): 파일 데이터
+            filename (str): 파일 이름
+            mime_only (bool, optional): MIME 타입과 확장자만 검사하고 패턴 검사를 건너뛸지 여부 (기본값: False)
+        
+        Returns:
+            tuple: 검증 결과 (성공 여부, 추가 정보)
+                - True/False: 파일이 유효한지 여부
+                - str: 오류 메시지 또는 MIME 타입
+        """
+        return await self._run(self._validate_buffer, file_data, filename, mime_only)
+
+    def _validate_buffer(self, file_data, filename, mime_only):
+        if not self.is_safe_filename(filename):
+            return False, "Invalid filename"
+
+        key = (self.get_file_hash(file_data), os.path.splitext(filename)[1].lower(), mime_only)
+        with self.verdict_lock:
+            verdict = self.verdicts.get(key, None)
+            if verdict is not None:
+                self.verdict_hits += 1
+                self.verdicts.move_to_end(key)
+                return verdict
+            self.verdict_misses += 1
+
+        try:
+            mime_type = FileValidator.get_mime_type_from_binary(file_data)
+            if mime_type not in self.ALLOWED_MIME_TYPES:
+                verdict = (False, f"Unsupported MIME type: {mime_type}")
+            elif not self.is_valid_extension(filename, mime_type):
+                verdict = (False, "File extension does not match MIME type")
+            elif not mime_only and self.contains_suspicious_pattern(file_data):
+                verdict = (False, "File is detected as suspicious")
+            else:
+                verdict = (True, mime_type)
+        except Exception as e:
+            # 검사 중 오류는 캐시하지 않습니다.
+            return False, str(e)
+
+        with self.verdict_lock:
+            self.verdicts[key] = verdict
+            while len(self.verdicts) > self.verdict_cache_size:
+                self.verdicts.popitem(last=False)
+        return verdict
+
+    def verdict_stats(self):
+        """
+        메모리 검사 결과 캐시의 사용 현황을 반환합니다.
+        
+        Returns:
+            dict: hit, miss 횟수와 저장된 항목 수
+        """
+        total = self.verdict_hits + self.verdict_misses
+        return {
+            "hits": self.verdict_hits,
+            "misses": self.verdict_misses,
+            "hit_ratio": self.verdict_hits / total if total > 0 else 0.0,
+            "entries": len(self.verdicts),
+            "max_entries": self.verdict_cache_size,
+        }
+
+    async def validate_local_file(self, file_path, filename, mime_only=False):
+        """
+        로컬 파일을 임시 파일로 복사하지 않고 그 자리에서 검증합니다.
+        
+        Args:
+            file_path (str): 파일 경로
+            filename (str): 파일 이름
+            mime_only (bool, optional): MIME 타입과 확장자만 검사하고 패턴 검사를 건너뛸지 여부 (기본값: False)
+        
+        Returns:
+            tuple: 검증 결과 (성공 여부, 추가 정보)
+                - True/False: 파일이 유효한지 여부
+                - str: 오류 메시지 또는 MIME 타입
+        """
+        return await self._run(self._validate_local_file, file_path, filename, mime_only)
+
+    def _validate_local_file(self, file_path, filename, mime_only):
+        if not self.is_safe_filename(filename):
+            return False, "Invalid filename"
+
+        try:
+            mime_type = FileValidator.get_mime_type_from_file(file_path)
+            if mime_type not in self.ALLOWED_MIME_TYPES:
+                return False, f"Unsupported MIME type: {mime_type}"
+
+            if not self.is_valid_extension(filename, mime_type):
+                return False, "File extension does not match MIME type"
+
+            if not mime_only and self.is_suspicious_file(file_path):
+                return False, "File is detected as suspicious"
+
+            return True, mime_type
+
+        except Exception as e:
+            return False, str(e)
+
+    async def _run(self, fn, *args):
+        if self.executor is None:
+            return await asyncio.to_thread(fn, *args)
+        return await self.executor.run(fn, *args)
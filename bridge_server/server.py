@@ -1,25 +1,78 @@
 import json, os
+import math
+import time
+import uuid
 import tempfile
 import asyncio
 import aiohttp
 import base64
+import hashlib
 import logging
+import pathlib
 from aiohttp import web
 from security import FileValidator
 from socket_manager import SocketManager
+from result_cache import ResultCache
+from scheduler import JobScheduler, Job, QueueFullError
+from execution_stats import ExecutionStats, ProgressTracker
+from health import HealthChecker, is_connection_error
+from warmup import WarmupManager
+from unload_policy import UnloadPolicy
+from transcoder import Transcoder
+from executor import Executor
+from resumable_upload import ResumableUploadManager, UploadOffsetError
+from upload_store import UploadStore, UploadQuotaError
+from workflow_assets import WorkflowAssets
+from batcher import DynamicBatcher, split_outputs
+from single_flight import SingleFlight
+from webhook import WebhookDispatcher, WebhookDelivery, WebhookQueueFullError
+from journal import SessionJournal
+from rate_limit import RateLimiter, RateLimitError
+from usage_ledger import UsageLedger
 from urls import setup_routes
 from assistant import (queue_prompt,
                     get_history,
+                    get_execution_seconds,
+                    delete_history,
+                    delete_queue,
                     get_queue_state,
+                    get_system_stats,
                     get_parsed_input_nodes,
                     upload_image,
+                    stage_input_file,
                     post_free_memory,
                     parse_workflow_prompt,
+                    expand_parameter_sets,
                     process_outputs,
+                    resolve_output_paths,
                     make_workflow_alias_list_and_map,
                     encode_byte_base64,
                     AsyncJsonWrapper)
 
+def get_client_ip(request, trusted_proxies=()):
+    """
+    요청한 client의 IP를 반환합니다. 연결한 주소가 trusted_proxies에 있을 때만 nginx가 전달한 'X-Real-IP', 'X-Forwarded-For' 헤더를 사용합니다.
+    X-Forwarded-For는 client가 보낸 값 뒤에 proxy가 주소를 덧붙이므로, 오른쪽부터 신뢰하는 proxy가 아닌 첫 번째 주소를 사용합니다.
+
+    Args:
+        request (web.Request): 웹 요청 객체입니다.
+        trusted_proxies (Iterable, optional): 헤더를 신뢰할 proxy의 IP 목록입니다. 비어 있으면 헤더를 사용하지 않습니다.
+
+    Returns:
+        str: client IP입니다.
+    """
+    if request.remote not in trusted_proxies:
+        return request.remote
+    real_ip = request.headers.get("X-Real-IP", None)
+    if real_ip:
+        return real_ip.strip()
+    forwarded_for = request.headers.get("X-Forwarded-For", None)
+    if forwarded_for:
+        for cur in reversed(forwarded_for.split(",")):
+            if cur.strip() and cur.strip() not in trusted_proxies:
+                return cur.strip()
+    return request.remote
+
 @web.middleware
 async def error_middleware(request, handler):
     """
@@ -54,7 +107,70 @@ class BridgeServer():
                  limit_timeout_count:int,
                  timeout_interval:int,
                  allowed_mime_type_extension_map:dict,
-                 upload_max_size:int=1024**2*100
+                 upload_max_size:int=1024**2*100,
+                 batch_max_size:int=64,
+                 result_cache_dir:str=None,
+                 result_cache_max_size:int=1024**3,
+                 result_cache_ttl:int=86400,
+                 max_inflight_per_server:int=2,
+                 queue_limit:int=200,
+                 priority_classes:list=None,
+                 ewma_alpha:float=0.3,
+                 default_execution_seconds:float=30.0,
+                 health_check_interval:int=5,
+                 health_check_timeout:int=3,
+                 failure_threshold:int=3,
+                 recovery_timeout:int=30,
+                 failover_max_retries:int=2,
+                 warmup_workflows:dict=None,
+                 warmup_timeout:int=300,
+                 cold_start_penalty:float=10.0,
+                 unload_idle_seconds:int=None,
+                 unload_window:int=3600,
+                 keep_hot_min_jobs:int=10,
+                 vram_required:dict=None,
+                 unload_check_interval:int=30,
+                 output_dirs:dict=None,
+                 input_dirs:dict=None,
+                 executor_thread_workers:int=4,
+                 executor_process_workers:int=2,
+                 transcode_cache_max_size:int=256*1024**2,
+                 upload_chunk_max_size:int=8*1024**2,
+                 upload_expire_seconds:int=3600,
+                 asset_cache_dir:str=None,
+                 asset_sizes:list=None,
+                 asset_default_size:int=None,
+                 output_trust:dict=None,
+                 default_output_trust:str="full",
+                 verdict_cache_size:int=1024,
+                 upload_store_dir:str=None,
+                 upload_store_max_size:int=10*1024**3,
+                 upload_store_ttl:int=3600,
+                 dynamic_batch_workflows:dict=None,
+                 dynamic_batch_max_size:int=4,
+                 dynamic_batch_max_wait:float=0.05,
+                 single_flight:bool=True,
+                 webhook:bool=False,
+                 webhook_secret:str=None,
+                 webhook_max_concurrency:int=4,
+                 webhook_max_retries:int=3,
+                 webhook_retry_backoff:float=1.0,
+                 webhook_timeout:float=30,
+                 webhook_max_pending:int=1000,
+                 webhook_allowed_hosts:list=None,
+                 webhook_allow_loopback:bool=False,
+                 trusted_proxies:list=None,
+                 drain_timeout:int=300,
+                 drain_allowed_ips:list=None,
+                 journal_fn:str=None,
+                 journal_ttl:int=3600,
+                 journal_compact_interval:int=60,
+                 rate_limit_rules:dict=None,
+                 rate_limit_paths:list=None,
+                 usage_fn:str=None,
+                 usage_bucket_seconds:int=3600,
+                 usage_retention_days:int=90,
+                 usage_allowed_ips:list=None
                  ) -> None:
         """
         생성자 입니다.
@@ -69,6 +185,69 @@ class BridgeServer():
             timeout_interval (int): 타임아웃 간격(초)입니다.
             allowed_mime_type_extension_map (dict): 허용된 MIME 타입 확장자 매핑입니다.
             upload_max_size (int, optional): 업로드 최대 크기입니다. 기본값은 100MB입니다.
+            batch_max_size (int, optional): 배치 요청 하나로 실행할 수 있는 최대 parameter set 수입니다. 기본값은 64입니다.
+            result_cache_dir (str, optional): 결과물 캐시 폴더 경로입니다. None이면 캐시를 사용하지 않습니다.
+            result_cache_max_size (int, optional): 결과물 캐시의 최대 용량입니다. 기본값은 1GB입니다.
+            result_cache_ttl (int, optional): 결과물 캐시의 보관 시간(초)입니다. 기본값은 하루입니다.
+            max_inflight_per_server (int, optional): ComfyUI 서버 하나에 동시에 등록할 최대 작업 수입니다. 기본값은 2입니다.
+            queue_limit (int, optional): bridge server가 대기시킬 최대 작업 수입니다. 넘으면 429 응답을 반환합니다. 기본값은 200입니다.
+            priority_classes (list, optional): 우선순위가 높은 순서의 등급 목록입니다. 기본값은 ["high", "normal", "low"]입니다.
+            ewma_alpha (float, optional): 실행 시간 EWMA에서 새로운 측정값의 가중치입니다. 기본값은 0.3입니다.
+            default_execution_seconds (float, optional): 실행 시간을 측정한 적이 없을 때 사용할 예상 실행 시간(초)입니다. 기본값은 30초입니다.
+            health_check_interval (int, optional): ComfyUI 서버의 상태를 확인하는 간격(초)입니다. 기본값은 5초입니다.
+            health_check_timeout (int, optional): 상태 확인 응답을 기다릴 시간(초)입니다. 기본값은 3초입니다.
+            failure_threshold (int, optional): ComfyUI 서버를 제외할 연속 실패 횟수입니다. 기본값은 3입니다.
+            recovery_timeout (int, optional): 제외된 ComfyUI 서버를 다시 확인하기까지 기다릴 시간(초)입니다. 기본값은 30초입니다.
+            failover_max_retries (int, optional): 장애가 발생한 작업을 다른 ComfyUI 서버로 다시 할당할 최대 횟수입니다. 기본값은 2입니다.
+            warmup_workflows (dict, optional): warmup할 워크플로우 alias -> {"inputs": custom input, "servers": 서버 목록}입니다. None이면 warmup하지 않습니다.
+            warmup_timeout (int, optional): warmup prompt 하나를 기다릴 최대 시간(초)입니다. 기본값은 300초입니다.
+            cold_start_penalty (float, optional): 워크플로우의 모델이 올라가 있지 않은 서버에 더할 예상 시간(초)입니다. 기본값은 10초입니다.
+            unload_idle_seconds (int, optional): 작업이 없는 ComfyUI 서버의 모델을 내리기까지 기다릴 시간(초)입니다. None이면 자동으로 모델을 내리지 않습니다.
+            unload_window (int, optional): 서버의 사용 빈도를 계산할 기간(초)입니다. 기본값은 3600초입니다.
+            keep_hot_min_jobs (int, optional): unload_window 동안 이 횟수 이상 실행된 서버는 모델을 유지합니다. 기본값은 10입니다.
+            vram_required (dict, optional): 워크플로우 alias -> 필요한 VRAM(byte)입니다. 부족하면 작업을 등록하기 전에 모델을 내립니다.
+            unload_check_interval (int, optional): 유휴 시간을 확인하는 간격(초)입니다. 기본값은 30초입니다.
+            output_dirs (dict, optional): ComfyUI 서버 주소 -> 로컬에서 접근 가능한 output 폴더 경로입니다. 등록된 서버의 결과물은 HTTP를 거치지 않고 파일에서 바로 반환합니다.
+            input_dirs (dict, optional): ComfyUI 서버 주소 -> 로컬에서 접근 가능한 input 폴더 경로입니다. 등록된 서버에는 HTTP 업로드 대신 input 폴더에 파일을 직접 둡니다.
+            executor_thread_workers (int, optional): 파일 검사, 해시 계산, base64 인코딩 등 이벤트 루프를 막는 작업을 실행할 thread 수입니다. 기본값은 4입니다.
+            executor_process_workers (int, optional): 이미지 변환 등 CPU 작업을 실행할 worker process 수입니다. 기본값은 2입니다.
+            transcode_cache_max_size (int, optional): 변환한 결과물 캐시의 최대 용량입니다. 기본값은 256MB입니다.
+            upload_chunk_max_size (int, optional): 이어받기 업로드에서 요청 하나로 보낼 수 있는 최대 청크 크기입니다. 기본값은 8MB입니다.
+            upload_expire_seconds (int, optional): 마지막 청크 이후 이어받기 업로드를 보관할 시간(초)입니다. 기본값은 3600초입니다.
+            asset_cache_dir (str, optional): thumbnail, desc image의 파생 이미지를 저장할 폴더 경로입니다. None이면 원본만 제공합니다.
+            asset_sizes (list, optional): 만들 파생 이미지의 긴 변 크기(px) 목록입니다. 기본값은 [128, 256, 512]입니다.
+            asset_default_size (int, optional): 워크플로우 목록과 정보에 담을 이미지 URL의 기본 크기입니다. None이면 원본 URL을 담습니다.
+            output_trust (dict, optional): ComfyUI 서버 주소 -> 결과물 검사 수준(full, mime)입니다. mime인 서버의 결과물은 MIME 타입과 확장자만 검사합니다.
+            default_output_trust (str, optional): output_trust에 없는 서버의 결과물 검사 수준입니다. 기본값은 full입니다.
+            verdict_cache_size (int, optional): 결과물 검사 결과를 내용 해시로 보관할 최대 항목 수입니다. 기본값은 1024입니다.
+            upload_store_dir (str, optional): 업로드한 파일을 보관할 폴더 경로입니다. None이면 임시 폴더의 bridge_server_uploads를 사용합니다.
+            upload_store_max_size (int, optional): 업로드한 파일이 사용할 최대 용량입니다. 기본값은 10GB입니다.
+            upload_store_ttl (int, optional): 업로드한 파일을 마지막으로 사용한 뒤 보관할 시간(초)입니다. 기본값은 3600초입니다.
+            dynamic_batch_workflows (dict, optional): 워크플로우 alias -> {"batch_size_input": prompt의 batch 크기 입력}입니다. custom input이 같은 요청만 묶습니다. None이면 요청을 묶지 않습니다.
+            dynamic_batch_max_size (int, optional): prompt 하나에 묶을 최대 요청 수입니다. 기본값은 4입니다.
+            dynamic_batch_max_wait (float, optional): 같은 워크플로우의 요청을 묶기 위해 기다릴 최대 시간(초)입니다. 기본값은 0.05초입니다.
+            single_flight (bool, optional): 같은 prompt가 실행 중이라면 다시 등록하지 않고 결과물을 함께 받을지 여부입니다. 기본값은 True입니다.
+            webhook (bool, optional): 작업이 끝나면 client가 지정한 callback URL로 결과를 보낼 수 있는지 여부입니다. 기본값은 False입니다.
+            webhook_secret (str, optional): webhook body를 HMAC-SHA256으로 서명할 비밀 키입니다. webhook을 사용한다면 비어 있을 수 없습니다.
+            webhook_max_concurrency (int, optional): 동시에 전송할 최대 webhook 수입니다. 기본값은 4입니다.
+            webhook_max_retries (int, optional): webhook 전송에 실패했을 때 재시도할 최대 횟수입니다. 기본값은 3입니다.
+            webhook_retry_backoff (float, optional): 첫 재시도까지 기다릴 시간(초)입니다. 재시도마다 두 배로 늘어납니다. 기본값은 1초입니다.
+            webhook_timeout (float, optional): webhook 전송 한 번의 최대 시간(초)입니다. 기본값은 30초입니다.
+            webhook_max_pending (int, optional): 전송 대기 중인 webhook의 최대 수입니다. 넘으면 callback을 지정한 요청에 429 응답을 반환합니다. 기본값은 1000입니다.
+            webhook_allowed_hosts (list, optional): callback URL로 허용할 호스트 목록입니다. webhook을 사용한다면 비어 있을 수 없습니다.
+            webhook_allow_loopback (bool, optional): loopback 주소로 callback을 보내는 것을 허용할지 여부입니다. 같은 호스트에서 수신하는 테스트용입니다. 기본값은 False입니다.
+            trusted_proxies (list, optional): 'X-Real-IP', 'X-Forwarded-For' 헤더를 신뢰할 proxy(nginx)의 IP 목록입니다. 다른 주소에서 온 요청은 연결한 주소를 client IP로 사용합니다. 기본값은 ["127.0.0.1", "::1"]입니다.
+            drain_timeout (int, optional): 종료를 요청받은 뒤 진행 중인 작업이 끝나기를 기다릴 최대 시간(초)입니다. 기본값은 300초입니다.
+            drain_allowed_ips (list, optional): /drain을 호출할 수 있는 client IP 목록입니다. 기본값은 ["127.0.0.1", "::1"]입니다.
+            journal_fn (str, optional): client id에 할당된 ComfyUI 서버와 prompt_id를 기록할 파일 경로입니다. 다시 시작할 때 기록을 재생하여 실행 중이던 prompt의 결과물을 가져옵니다. None이면 기록하지 않습니다.
+            journal_ttl (int, optional): 마지막으로 갱신한 뒤 기록을 보관할 시간(초)입니다. 기본값은 3600초입니다.
+            journal_compact_interval (int, optional): 기록 파일을 정리하는 간격(초)입니다. 기본값은 60초입니다.
+            rate_limit_rules (dict, optional): 요청 제한 기준(client, ip, workflow) -> (초당 채워지는 요청 수, 최대 요청 수)입니다. None이면 제한하지 않습니다.
+            rate_limit_paths (list, optional): 요청 수를 제한할 POST 경로 목록입니다. 기본값은 업로드와 생성 요청 경로입니다.
+            usage_fn (str, optional): 끝난 작업의 사용량(대기 시간, 실행 시간, input과 결과물 크기)을 기록할 파일 경로입니다. None이면 기록하지 않습니다.
+            usage_bucket_seconds (int, optional): 사용량을 집계할 시간 구간의 크기(초)입니다. 기본값은 3600초입니다.
+            usage_retention_days (int, optional): 사용량 집계를 보관할 기간(일)입니다. 기본값은 90일입니다.
+            usage_allowed_ips (list, optional): /usage를 호출할 수 있는 client IP 목록입니다. 기본값은 ["127.0.0.1", "::1"]입니다.
 
         Returns:
             None
@@ -79,10 +258,89 @@ class BridgeServer():
         self.limit_timeout_count = limit_timeout_count
         self.timeout_interval = timeout_interval
         self.upload_max_size = upload_max_size
+        self.batch_max_size = batch_max_size
+        self.max_inflight_per_server = max_inflight_per_server
+        self.queue_limit = queue_limit
+        self.priority_classes = priority_classes or ["high", "normal", "low"]
+        self.ewma_alpha = ewma_alpha
+        self.default_execution_seconds = default_execution_seconds
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failover_max_retries = failover_max_retries
+        self.warmup_timeout = warmup_timeout
+        self.cold_start_penalty = cold_start_penalty
+        self.unload_idle_seconds = unload_idle_seconds
+        self.unload_window = unload_window
+        self.keep_hot_min_jobs = keep_hot_min_jobs
+        self.vram_required = vram_required
+        self.unload_check_interval = unload_check_interval
+        self.output_dirs = output_dirs or {}
+        self.input_dirs = input_dirs or {}
+        self.upload_chunk_max_size = upload_chunk_max_size
+        self.upload_expire_seconds = upload_expire_seconds
+        self.asset_default_size = asset_default_size
+        self.upload_store_dir = upload_store_dir or os.path.join(tempfile.gettempdir(), "bridge_server_uploads")
+        self.upload_store_max_size = upload_store_max_size
+        self.upload_store_ttl = upload_store_ttl
+        self.output_trust = output_trust or {}
+        self.default_output_trust = default_output_trust
+        self.webhook = webhook
+        self.webhook_secret = webhook_secret
+        self.webhook_max_concurrency = webhook_max_concurrency
+        self.webhook_max_retries = webhook_max_retries
+        self.webhook_retry_backoff = webhook_retry_backoff
+        self.webhook_timeout = webhook_timeout
+        self.webhook_max_pending = webhook_max_pending
+        self.webhook_allowed_hosts = webhook_allowed_hosts
+        self.webhook_allow_loopback = webhook_allow_loopback
+        self.trusted_proxies = set(trusted_proxies if trusted_proxies is not None else ["127.0.0.1", "::1"])
+        self.drain_timeout = drain_timeout
+        self.drain_allowed_ips = set(drain_allowed_ips if drain_allowed_ips is not None else ["127.0.0.1", "::1"])
+        self.draining = False   # 새로운 작업을 받지 않고 진행 중인 작업이 끝나기를 기다리는 중인지 여부
+        self.drain_task = None
+        self.drain_started = None
+        self.drain_deadline = None
+        self.journal_fn = journal_fn
+        self.journal_ttl = journal_ttl
+        self.journal_compact_interval = journal_compact_interval
+        self.rate_limit_rules = rate_limit_rules
+        self.rate_limit_paths = set(rate_limit_paths if rate_limit_paths is not None else ["/upload", "/upload/resumable", "/generate-based-workflow", "/generate-batch"])
+        self.rate_limiter = None
+        self.usage_fn = usage_fn
+        self.usage_bucket_seconds = usage_bucket_seconds
+        self.usage_retention_days = usage_retention_days
+        self.usage_allowed_ips = set(usage_allowed_ips if usage_allowed_ips is not None else ["127.0.0.1", "::1"])
+        self.usage_pending: dict[str, dict] = {}    # client id -> 결과물을 가져가기 전이라 결과물 크기를 모르는 사용량
+        for trust in list(self.output_trust.values()) + [default_output_trust]:
+            if trust not in ("full", "mime"): raise ValueError(f"output trust must be one of ['full', 'mime'] but got '{trust}'")
 
         self.state_obj = AsyncJsonWrapper(state_fn)
-        self.validator = FileValidator(allowed_mime_type_extension_map)
+        self.executor = Executor(thread_workers=executor_thread_workers, process_workers=executor_process_workers)
+        self.validator = FileValidator(allowed_mime_type_extension_map, executor=self.executor, verdict_cache_size=verdict_cache_size)
         self.wf_alias_list_with_desc, self.wf_alias_map = make_workflow_alias_list_and_map(wf_dir, wf_alias_fn)
+        self.warmup_workflows = {}
+        for alias, cur in (warmup_workflows or {}).items():
+            if alias not in self.wf_alias_map:
+                logging.warning(f"[WARMUP] UNKNOWN WORKFLOW / {alias}")
+                continue
+            self.warmup_workflows[alias] = cur
+        batch_workflows = {}
+        for alias, cur in (dynamic_batch_workflows or {}).items():
+            if alias not in self.wf_alias_map:
+                logging.warning(f"[BATCHER] UNKNOWN WORKFLOW / {alias}")
+                continue
+            batch_workflows[alias] = cur
+        self.batcher = DynamicBatcher(workflows=batch_workflows,
+                                      submit_fn=self._submit_dynamic_batch,
+                                      max_batch_size=dynamic_batch_max_size,
+                                      max_wait=dynamic_batch_max_wait) if len(batch_workflows) > 0 else None
+        self.single_flight = SingleFlight() if single_flight == True else None
+        self.promoted_flights: dict[str, tuple[Job, dict]] = {}   # 작업을 이어받은 client id -> (작업, 임시 파일이 담긴 custom input)
+        self.result_cache = ResultCache(result_cache_dir, result_cache_max_size, result_cache_ttl) if result_cache_dir is not None else None
+        self.transcoder = Transcoder(self.executor, cache_max_size=transcode_cache_max_size)
+        self.workflow_assets = WorkflowAssets(wf_dir, self.executor, cache_dir=asset_cache_dir, sizes=asset_sizes)
 
     async def init_app(self):
         """
@@ -92,35 +350,116 @@ class BridgeServer():
             app (web.Application): 초기화된 웹 애플리케이션 객체입니다.
         """
         # app = web.Application(middlewares=[error_middleware], client_max_size=self.upload_max_size)
-        app = web.Application(client_max_size=self.upload_max_size)
+        app = web.Application(middlewares=[self.rate_limit_middleware], client_max_size=self.upload_max_size)
 
         # bridge_server.urls.py에 따라 초기화
         setup_routes(app, self)
 
         # socket manager와 state 객체 생성
-        self.socket_manager = SocketManager(loop=self.loop, interval=self.timeout_interval, life_seconds=self.limit_timeout_count*self.timeout_interval)
+        self.journal = SessionJournal(journal_fn=self.journal_fn,
+                                      ttl=self.journal_ttl,
+                                      interval=self.journal_compact_interval) if self.journal_fn is not None else None
+        self.usage = UsageLedger(ledger_fn=self.usage_fn,
+                                 bucket_seconds=self.usage_bucket_seconds,
+                                 retention_days=self.usage_retention_days) if self.usage_fn is not None else None
+        self.socket_manager = SocketManager(loop=self.loop,
+                                            interval=self.timeout_interval,
+                                            life_seconds=self.limit_timeout_count*self.timeout_interval,
+                                            on_delete=self._on_session_deleted)
+        self.health = HealthChecker(server_address=self.server_address,
+                                    check_fn=self._check_backend,
+                                    on_change=self._on_backend_state_change,
+                                    interval=self.health_check_interval,
+                                    failure_threshold=self.failure_threshold,
+                                    recovery_timeout=self.recovery_timeout)
+        self.scheduler = JobScheduler(server_address=self.server_address,
+                                      submit_fn=self._queue_job,
+                                      notify_fn=self._notify_queue_position,
+                                      max_inflight=self.max_inflight_per_server,
+                                      max_queue_size=self.queue_limit,
+                                      priority_classes=self.priority_classes,
+                                      interval=self.timeout_interval,
+                                      available_fn=self.health.is_available)
+        self.warmup = WarmupManager(workflows=self.warmup_workflows,
+                                    make_prompt_fn=self._make_warmup_prompt,
+                                    on_warm=self._on_warm,
+                                    interval=self.timeout_interval,
+                                    timeout=self.warmup_timeout)
+        for server_address in self.server_address:
+            self.warmup.schedule(server_address)
+        self.unload_policy = UnloadPolicy(server_address=self.server_address,
+                                          busy_fn=self._is_backend_busy,
+                                          is_hot_fn=self.warmup.is_hot,
+                                          on_unload=self.warmup.mark_cold,
+                                          idle_seconds=self.unload_idle_seconds,
+                                          window=self.unload_window,
+                                          keep_hot_min_jobs=self.keep_hot_min_jobs,
+                                          vram_required=self.vram_required,
+                                          interval=self.unload_check_interval) if self.unload_idle_seconds is not None else None
+        self.upload_store = UploadStore(store_dir=self.upload_store_dir,
+                                        max_size=self.upload_store_max_size,
+                                        ttl=self.upload_store_ttl,
+                                        interval=self.timeout_interval)
+        self.resumable_uploads = ResumableUploadManager(validator=self.validator,
+                                                        store=self.upload_store,
+                                                        max_size=self.upload_max_size,
+                                                        chunk_max_size=self.upload_chunk_max_size,
+                                                        expire_seconds=self.upload_expire_seconds)
+        self.webhooks = WebhookDispatcher(secret=self.webhook_secret,
+                                          max_concurrency=self.webhook_max_concurrency,
+                                          max_retries=self.webhook_max_retries,
+                                          retry_backoff=self.webhook_retry_backoff,
+                                          timeout=self.webhook_timeout,
+                                          max_pending=self.webhook_max_pending,
+                                          allowed_hosts=self.webhook_allowed_hosts,
+                                          blocked_addresses=self.server_address,
+                                          allow_loopback=self.webhook_allow_loopback) if self.webhook == True else None
+        self.rate_limiter = RateLimiter(rules=self.rate_limit_rules) if self.rate_limit_rules is not None else None
+        self.stopped = asyncio.Event()  # drain이 끝나 프로세스를 종료해도 되는지 여부
+        # 파생 이미지는 시작을 막지 않도록 뒤에서 만들고, 그동안에는 원본을 반환합니다.
+        self.asset_build_task = asyncio.create_task(self.workflow_assets.build())
         await self.state_obj.load()
+        # 서버 별, 워크플로우 별 실행 시간은 state 파일에 함께 저장합니다.
+        self.execution_stats = ExecutionStats(records=self.state_obj.contents.setdefault("execution_stats", {}),
+                                              node_records=self.state_obj.contents.setdefault("node_stats", {}),
+                                              alpha=self.ewma_alpha,
+                                              default_seconds=self.default_execution_seconds)
+        if self.journal is not None:
+            self._recover_sessions()
         
         return app
         
-    async def track_progress(self, sid):
+    async def track_progress(self, sid, started:bool=False):
         """
         할당된 ComfyUI 서버의 작업 진행 상태를 추적합니다.
+        진행률은 워크플로우의 노드 별 과거 실행 시간을 가중치로 계산하며, 남은 시간(eta)과 대기 순번(position)을 함께 전달합니다.
 
         Args:
             sid (str): 소켓 ID입니다.
+            started (bool, optional): 이미 실행 중일 수 있는 작업인지 여부입니다. True이면 execution_start를 기다리지 않고 추적합니다. (ex: 다시 연결한 작업)
 
         Returns:
             None
         """
-        total_progress = 0
-        cur_progress = 0
-        processed_node = []
+        tracker = None
+        if started:
+            tracker = ProgressTracker(self.execution_stats.node_weights(self.socket_manager[sid].wf_alias, self.socket_manager[sid].wf_info.keys()))
 
         logging.info(f"[WS REQ] TRACING START / {sid}")
         while True:
             # ComfyUI 서버와 연결된 request websocket으로 부터 메시지를 받음
             out = await self.socket_manager.async_receive(sid)
+            if (out is None or out.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR)) \
+                and self.socket_manager[sid].ws_connection_status not in ["closed", "error", None] \
+                and self.socket_manager[sid].job is not None:
+                # 작업 도중 ComfyUI 서버와 연결이 끊어짐. 다른 서버로 작업을 옮깁니다.
+                if await self._failover(sid):
+                    tracker = None
+                    continue
+                await self.socket_manager.async_send_json(sid, {"status":"error", "detail":"server connection error"})
+                break
+            if out is None:
+                break
             out = out.data
             if self.socket_manager[sid].ws_connection_status in ["closed", "error", None]:
                 # 메시지 상태가 closed, error 또는 None 일 때 추적 종료
@@ -131,16 +470,13 @@ class BridgeServer():
                 if message['type'] == 'execution_start':
                     # process가 시작됨
                     logging.info(f"[WS REQ] EXECUTION START / {sid}")
+                    self.scheduler.mark_started(sid)
 
-                    wf_info = self.socket_manager[sid].wf_info
-                    total_progress += len(wf_info)
-                    progress_message = {
-                        'status': 'progress',
-                        'detail': f'{cur_progress/total_progress*100:.2f}%'
-                    }
-                    await self.socket_manager.async_send_json(sid, progress_message)
+                    wf_alias = self.socket_manager[sid].wf_alias
+                    tracker = ProgressTracker(self.execution_stats.node_weights(wf_alias, self.socket_manager[sid].wf_info.keys()))
+                    await self.socket_manager.async_send_json(sid, self._make_progress_message(sid, tracker))
                 
-                if message['type'] in ('progress', 'executing'):
+                if message['type'] in ('progress', 'executing') and tracker is not None:
                     data = message['data']
 
                     if data['node'] is None:
@@ -150,43 +486,39 @@ class BridgeServer():
                             'detail': 'Execution is done'
                         }
                         self.socket_manager[sid].comfyui_prompt_id = data['prompt_id']
+                        tracker.finish()
+                        job = self.scheduler.complete(sid)
+                        if job is not None:
+                            self._mark_job_done(job)
+                        if job is not None and job.started_at is not None:
+                            self.execution_stats.record_nodes(job.workflow, tracker.timings)
+                            await self._record_execution_time(job.server_address, job.workflow, time.time() - job.started_at)
+                        if job is not None:
+                            # 결과물 크기는 client가 결과물을 가져갈 때 기록합니다.
+                            self._record_usage(sid, job, self.socket_manager[sid].wf_inputs,
+                                               time.time() - job.started_at if job.started_at is not None else None)
+                        # client가 history를 가져가며 지우기 전에, 같은 prompt를 기다리는 client id들에 결과물을 할당합니다.
+                        await self._land_flight(sid)
                         logging.debug(f"[WS REQ] EXECUTION DONE / {sid}")
                     else:
                         # process가 성공적으로 진행 중
                         cur_node = data.get("node", None)
                         step_value = data.get("value", None)
                         step_max = data.get("max", None)
-                        
-                        # 같은 노드를 다시 실행한다면, 진행 상황에 반영
-                        if cur_node in processed_node:
-                            cur_progress -= 1
-                            processed_node.remove(cur_node)
 
                         if step_value is not None and step_max is not None:
                             # sampling을 실행하는 노드일 경우
-                            cur_progress += 1/step_max
-                            if step_value == step_max:
-                                processed_node.append(cur_node)
+                            tracker.step(cur_node, step_value, step_max)
                         else:
-                            # 그 외 노드일 경우
-                            cur_progress += 1
-                            processed_node.append(cur_node)
-                        
-                        progress_message = {
-                            'status': 'progress',
-                            'detail': f'{cur_progress/total_progress*100:.2f}%'
-                        }
+                            # 그 외 노드일 경우, 이전 노드가 끝나고 새로운 노드가 시작됨
+                            tracker.executing(cur_node)
+                        progress_message = self._make_progress_message(sid, tracker)
                     await self.socket_manager.async_send_json(sid, progress_message)
                     
-                if message['type'] == 'execution_cached':
+                if message['type'] == 'execution_cached' and tracker is not None:
                     # process의 일부가 캐시되어 있음. 더 빠른 연산을 기대.
-                    cached_nodes = message['data']['nodes']
-                    cur_progress += len(cached_nodes)
-                    progress_message = {
-                        'status': 'progress',
-                        'detail': f'{cur_progress/total_progress*100:.2f}%'
-                    }
-                    await self.socket_manager.async_send_json(sid, progress_message)
+                    tracker.cached(message['data']['nodes'])
+                    await self.socket_manager.async_send_json(sid, self._make_progress_message(sid, tracker))
 
                 if message['type'] == "prompt_outputs_failed_validation":
                     # prompt가 ComfyUI에서 기대하는 형태가 아님. 에러 발생. 
@@ -194,11 +526,42 @@ class BridgeServer():
                             'status': 'error',
                             'detail': 'prompt is not validated'
                         }
+                    self.scheduler.complete(sid, success=False)
+                    await self.socket_manager.async_send_json(sid, progress_message)
+                    await self._abort_flight(sid, progress_message['detail'])
+
+                if message['type'] in ("execution_error", "execution_interrupted"):
+                    # 실행 중에 노드에서 에러가 발생하거나 작업이 중단됨.
+                    progress_message = {
+                            'status': 'error',
+                            'detail': 'execution is failed' if message['type'] == "execution_error" else 'execution is interrupted'
+                        }
+                    self.scheduler.complete(sid, success=False)
                     await self.socket_manager.async_send_json(sid, progress_message)
+                    await self._abort_flight(sid, progress_message['detail'])
             else:
                 continue
         logging.info(f"[WS REQ] TRACING DONE / {sid}")
 
+    def _make_progress_message(self, sid:str, tracker:ProgressTracker):
+        """
+        진행률과 남은 시간을 담은 progress 메시지를 만듭니다.
+
+        Args:
+            sid (str): 소켓 ID입니다.
+            tracker (ProgressTracker): 작업의 진행 상황입니다.
+
+        Returns:
+            dict: progress 메시지입니다. ComfyUI에서 실행 중인 작업의 대기 순번은 0입니다.
+        """
+        expected_seconds = self.execution_stats.expected(self.socket_manager[sid].linked_server, self.socket_manager[sid].wf_alias)
+        return {
+            'status': 'progress',
+            'detail': f'{tracker.progress*100:.2f}%',
+            'eta': round(tracker.eta(expected_seconds), 1),
+            'position': 0
+        }
+
     async def websocket_connection(self, request, mode):
         """
         웹소켓 통신을 관리하고 적절한 에러를 발생시킵니다.
@@ -212,11 +575,13 @@ class BridgeServer():
         """
         sid = request.rel_url.query.get('clientId', None)
         if not isinstance(sid, str): raise TypeError(f"clientId is required and must be and str, but got {type(sid).__str__()}")
+        if mode == "PROXY" and self.draining == True:
+            return self._draining_response()
         logging.info(f"[WS RES] RECEIVED / {sid}")
 
         session = None
         try:
-            session = await self._ws_req_connection(sid)
+            session = await self._ws_req_connection_with_retry(sid)
             if mode == "PROXY":
                 await self._ws_res_connection(request, sid)
             elif mode == "REST":
@@ -229,7 +594,13 @@ class BridgeServer():
             if mode == "PROXY":
                 # clinet와 통신 중단이 지속되면 timeout에러가 발생합니다.
                 timeout_count = 0
+                last_life = self.socket_manager[sid].history_life
                 while True:
+                    if self.socket_manager[sid].history_life != last_life:
+                        # 진행 상황이나 대기 순번이 갱신되었다면 timeout을 초기화합니다.
+                        last_life = self.socket_manager[sid].history_life
+                        timeout_count = 0
+
                     if self.socket_manager[sid].ws_connection_status in ["closed", "error", None]:
                         break
                     else:
@@ -260,6 +631,13 @@ class BridgeServer():
         finally:
             # 최종적으로 웹소켓을 닫고 웹소켓 관련 리소스를 release
             logging.info(f"[WS] CLOSING / {sid}")
+            # 같은 prompt를 기다리는 client id가 남아 있다면 작업을 넘기고, 없다면 취소합니다.
+            if not await self._handoff_flight(sid):
+                self.scheduler.cancel(sid)
+                # 결과물 없이 끝난 작업을 기다리던 client id들에 알립니다.
+                await self._abort_flight(sid, "execution is cancelled")
+            self.socket_manager[sid].job = None
+            self._remove_tmp_inputs(self.socket_manager[sid].wf_inputs)
             await self.socket_manager.async_send_json(sid, {"status":"closed", "detail":"connection will be closed"}, update_life=False)
             asyncio.create_task(self.socket_manager.async_release_sockets(sid))
      
@@ -295,6 +673,9 @@ class BridgeServer():
 
         Returns:
             aiohttp.ClientSession: 클라이언트 세션 객체입니다.
+
+        Raises:
+            aiohttp.ServerConnectionError: ComfyUI 서버와 연결하지 못한 경우 발생. 서버의 장애로 기록합니다.
         """
         # 이미 해당 sid에 할당된 서버가 있는지 확인
         if self.socket_manager[sid].linked_server is None:
@@ -309,51 +690,224 @@ class BridgeServer():
             ws_req = await session.ws_connect(f"ws://{server_address}/ws?clientId={sid}")
             logging.info(f"[WS REQ] HANDSHAKE / {sid}")
         except Exception as e:
-            raise aiohttp.ServerConnectionError
-        finally:
-            self.socket_manager[sid].sockets_req = ws_req
-            return session
+            await session.close()
+            self.health.record_failure(server_address, e)
+            raise aiohttp.ServerConnectionError(f"websocket connection failed / {server_address}") from e
+        self.socket_manager[sid].sockets_req = ws_req
+        return session
+
+    async def _ws_req_connection_with_retry(self, sid):
+        """
+        ComfyUI서버와 소켓 요청(WebSocket Request) 연결을 처리합니다.
+        작업을 등록하기 전이라면 연결에 실패한 서버를 제외하고 다른 서버에 다시 연결합니다.
+
+        Args:
+            sid (str): 소켓 ID입니다.
+
+        Returns:
+            aiohttp.ClientSession: 클라이언트 세션 객체입니다.
+
+        Raises:
+            aiohttp.ServerConnectionError: 작업이 이미 등록되었거나, 재시도 횟수를 넘었거나, 사용할 수 있는 서버가 없는 경우 발생
+        """
+        exclude = []
+        while True:
+            try:
+                return await self._ws_req_connection(sid)
+            except aiohttp.ServerConnectionError as e:
+                param_manager = self.socket_manager[sid]
+                if param_manager.job is not None or len(exclude) >= self.failover_max_retries:
+                    raise
+                exclude.append(param_manager.linked_server)
+                param_manager.linked_server = await self.get_not_busy_server_address(param_manager.wf_alias, exclude=exclude)
+                logging.warning(f"[WS REQ] RECONNECTING / {e} -> {param_manager.linked_server} / {sid}")
 
-    async def get_not_busy_server_address(self):
+    async def get_not_busy_server_address(self, workflow:str=None, exclude:list=None):
         """
-        가장 대기열이 적은 ComfyUI 서버의 주소를 가져옵니다.
+        예상 완료 시간이 가장 짧은 ComfyUI 서버의 주소를 가져옵니다.
+        예상 완료 시간은 서버에 남은 작업의 예상 실행 시간과 새로운 작업의 예상 실행 시간의 합입니다.
+
+        Args:
+            workflow (str, optional): 실행할 워크플로우 alias입니다. None이면 서버의 평균 실행 시간을 사용합니다.
+            exclude (list, optional): 할당하지 않을 ComfyUI 서버 주소 목록입니다.
 
         Returns:
             str: ComfyUI 서버 주소입니다.
         """
-        queue_lenghs = []
+        completion_times = await self._get_expected_completion_times(workflow, exclude)
+        if len(completion_times) == 0:
+            raise aiohttp.ServerConnectionError("There is no available ComfyUI server")
+        target_server_address = min(completion_times, key=completion_times.get)
+        logging.debug(f"[BALANCER] {target_server_address} / {completion_times}")
+        return target_server_address
+
+    async def _get_expected_completion_times(self, workflow:str=None, exclude:list=None):
+        """
+        ComfyUI 서버마다 새로운 작업이 끝날 때까지의 예상 시간을 계산합니다. 장애로 제외되었거나 응답이 없는 서버는 제외합니다.
+
+        Args:
+            workflow (str, optional): 실행할 워크플로우 alias입니다.
+            exclude (list, optional): 제외할 ComfyUI 서버 주소 목록입니다.
+
+        Returns:
+            dict: ComfyUI 서버 주소 -> 예상 완료 시간(초)
+        """
+        completion_times = {}
         for server_address in self.server_address:
+            if not self.health.is_available(server_address) or server_address in (exclude or []):
+                continue
             try:
-                queue_state = get_queue_state(server_address)
+                queue_state = await asyncio.to_thread(get_queue_state, server_address)
             except Exception as e:
                 logging.debug(f"[NO SIGNAL] {server_address} / {e}")
+                self.health.record_failure(server_address, e)
+                continue
 
-            queue_length = sum([len(cur) for cur in queue_state.values()])
-            queue_lenghs.append(queue_length)
-        
-        target_server_address = self.server_address[queue_lenghs.index(min(queue_lenghs))]
-        return target_server_address
+            # bridge server를 거치지 않고 ComfyUI에 등록된 작업은 어떤 워크플로우인지 알 수 없으므로 평균 실행 시간으로 계산합니다.
+            external_length = max(sum([len(cur) for cur in queue_state.values()]) - self.scheduler.inflight_count(server_address), 0)
+            completion_times[server_address] = (self.scheduler.expected_backlog(server_address, self.execution_stats.expected)
+                                                + external_length * self.execution_stats.expected(server_address)
+                                                + self.execution_stats.expected(server_address, workflow))
+            if workflow is not None and not self.warmup.is_hot(server_address, workflow):
+                # 모델을 새로 불러와야 하는 서버는 그만큼 늦게 끝납니다.
+                completion_times[server_address] += self.cold_start_penalty
+        return completion_times
+
+    async def _record_execution_time(self, server_address:str, workflow:str, seconds:float):
+        """
+        워크플로우의 실행 시간을 기록하고 state 파일에 저장합니다.
+
+        Args:
+            server_address (str): 작업을 실행한 ComfyUI 서버 주소입니다.
+            workflow (str): 워크플로우 alias입니다.
+            seconds (float): 실행 시간(초)입니다.
+        """
+        if workflow is None or seconds is None:
+            return
+        self.execution_stats.record(server_address, workflow, seconds)
+        logging.debug(f"[BALANCER] RECORDED / {workflow} / {seconds:.2f}s / {server_address}")
+        await self.state_obj.update()
     
     async def generate_based_workflow(self, request):
         """
         bridge server에 저장된 워크플로우와 client가 추가한 custom input을 기반으로 ComfyUI 서버에 작업을 요청합니다.
         
+        본문에 'callback' URL을 담으면 작업이 끝났을 때 결과를 그 URL로 보냅니다. 'callbackType'이 json이면 base64로 인코딩한 결과물을 담은 JSON을, multipart면 결과물 파일을 보냅니다.
+
         Args:
             request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로 받으며, JSON 형식의 custom input 양식 데이터를 본문으로 받습니다.
             
         Returns:
             web.Response: HTTP 응답 객체입니다. 작업이 성공적으로 큐에 추가되었음을 나타내는 JSON 응답을 반환합니다.
         """
+        if self.draining == True:
+            return self._draining_response()
         data = await request.json()
         sid = request.rel_url.query.get('clientId', None)
         if not isinstance(sid, str): raise TypeError(f"clientId is required and must be and str, but got {type(sid).__str__()}")
 
-        workflow = data.pop("workflow", None)
-        if not isinstance(workflow, str): raise TypeError(f"workflow is required and must be and str, but got {type(sid).__str__()}")
-        workflow = self.wf_alias_map[workflow]
+        workflow_alias = data.pop("workflow", None)
+        if not isinstance(workflow_alias, str): raise TypeError(f"workflow is required and must be and str, but got {type(sid).__str__()}")
+        workflow = self.wf_alias_map[workflow_alias]
+        priority = data.pop("priority", "normal")
+        if priority not in self.priority_classes: raise ValueError(f"priority must be one of {self.priority_classes} but got '{priority}'")
+        callback = data.pop("callback", None)
+        callback_type = data.pop("callbackType", "json")
+        if callback is not None:
+            if self.webhooks is None: raise ValueError("callback is not supported, webhook is disabled")
+            if callback_type not in ("json", "multipart"): raise ValueError(f"callbackType is must be [json, multipart] but got {callback_type}")
+            await self.webhooks.check_url(callback)
+            if self.webhooks.pending() >= self.webhooks.max_pending:
+                return self._webhook_queue_full_response(WebhookQueueFullError(self.webhooks.pending()))
+
+        response = await self._start_generation(request, sid, workflow, workflow_alias, priority, data)
+        if callback is not None and response.status == 200:
+            if self.journal is not None:
+                self.journal.record(sid, callback=callback, callback_type=callback_type)
+            # client가 연결을 유지하거나 polling하지 않아도 되도록, 작업이 끝나면 결과를 callback URL로 보냅니다.
+            asyncio.create_task(self._deliver_on_completion(sid, workflow_alias, callback, callback_type))
+        return response
+
+    async def _start_generation(self, request, sid:str, workflow:str, workflow_alias:str, priority:str, data:dict):
+        """
+        캐시된 결과물을 반환하거나, 실행 중인 같은 prompt에 묶거나, 대기열에 등록합니다.
+
+        Args:
+            request (Request): HTTP 요청 객체입니다.
+            sid (str): 소켓 ID입니다.
+            workflow (str): 워크플로우 파일 이름입니다.
+            workflow_alias (str): 워크플로우 alias입니다.
+            priority (str): 우선순위 등급입니다.
+            data (dict): client가 보낸 custom input입니다.
+
+        Returns:
+            web.Response: HTTP 응답 객체입니다.
+        """
+        cache_key = None
+        if self.result_cache is not None:
+            # 같은 prompt의 결과물이 캐시되어 있다면 ComfyUI 서버를 거치지 않습니다.
+            cache_key = await self._make_cache_key(workflow, data)
+            cached_files = await self.result_cache.get(cache_key)
+            if cached_files is not None:
+                return await self._serve_cached_result(sid, data, cached_files)
+            self.socket_manager[sid].cache_key = cache_key
+
+        if self.single_flight is not None:
+            # 같은 prompt가 실행 중이라면 대기열에 다시 등록하지 않고 실행 중인 작업의 결과물을 함께 받습니다.
+            # 연달아 들어온 요청도 묶이도록 서버를 할당하기 전에 이 client id가 등록하는 것으로 기록합니다.
+            leader_sid = self.single_flight.join(cache_key or await self._make_cache_key(workflow, data), sid)
+            if leader_sid is not None:
+                return await self._attach_to_flight(sid, leader_sid, data)
+
+        try:
+            response = await self._enqueue_generation(request, sid, workflow_alias, priority, data)
+        except Exception as e:
+            await self._abort_flight(sid, f"prompt is not queued / {e}")
+            raise
+        if response.status != 200:
+            await self._abort_flight(sid, "prompt is not queued")
+        return response
+
+    async def _enqueue_generation(self, request, sid:str, workflow_alias:str, priority:str, data:dict):
+        """
+        custom input으로 파싱한 prompt를 bridge server의 대기열에 등록합니다.
+
+        Args:
+            request (Request): HTTP 요청 객체입니다.
+            sid (str): 소켓 ID입니다.
+            workflow_alias (str): 워크플로우 alias입니다.
+            priority (str): 우선순위 등급입니다.
+            data (dict): client가 보낸 custom input입니다.
+
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 대기열이 가득 찼다면 429 응답입니다.
+        """
+        workflow = self.wf_alias_map[workflow_alias]
+        try:
+            # bridge server의 대기열이 가득 찼다면 요청을 받지 않습니다.
+            self.scheduler.check_admission()
+        except QueueFullError as e:
+            return self._queue_full_response(e)
+
+        if self.batcher is not None and self.batcher.is_batchable(workflow_alias):
+            # custom input이 같은 요청을 잠시 모아 하나의 prompt로 실행합니다. 혼자 남은 요청은 그대로 진행합니다.
+            try:
+                batched = await self._join_dynamic_batch(request, sid, workflow_alias, priority, data)
+            except QueueFullError as e:
+                return self._queue_full_response(e)
+            if batched is not None:
+                position, batch_size = batched
+                return web.Response(
+                    status=200,
+                    body=json.dumps({"detail":f"queued / {position}", "batch_size":batch_size}),
+                    headers={"Content-Type": "application/json"}
+                )
 
         if self.socket_manager[sid].sockets_res is None:
             # 소켓이 생성된 적이 없다면, REST 통신입니다. 여기서 소켓을 생성하여 ComfyUI와 통신합니다.
+            if self.socket_manager[sid].sockets_req is None:
+                # 아직 ComfyUI와 연결되지 않았으므로, 워크플로우의 예상 완료 시간이 가장 짧은 서버를 할당합니다.
+                self.socket_manager[sid].linked_server = await self.get_not_busy_server_address(workflow_alias)
             asyncio.create_task(self.websocket_connection(request, mode="REST"))
         
         # ComfyUI서버가 할당될 때까지 기다립니다. 지속될 경우 타임아웃에러를 발생합니다.
@@ -364,231 +918,2083 @@ class BridgeServer():
             if timeout_count >= self.limit_timeout_count:
                 raise TimeoutError(f"timeout count: {timeout_count}")
             timeout_count += 1
-        
-        kwargs = {}
-        for key, value in data.items():
-            # client가 보낸 custom input의 파일명을 /tmp/에서 탐색합니다.
-            if isinstance(value, str) and value.startswith("bridge_server_comfyui_"):
-                tmp_path = os.path.join(tempfile.gettempdir(), value)
-                mime_type = self.validator.get_mime_type_from_file(file_path=tmp_path)
-                extension = self.validator.mime_extension_map[mime_type]
-                
-                if os.path.exists(tmp_path):
-                    # 존재할 경우 할당된 ComfyUI서버에 업로드합니다.
-                    upload_result = upload_image(input_path=tmp_path,
-                                                file_name=os.path.basename(tmp_path)+extension,
-                                                server_address=self.socket_manager[sid].linked_server)
-                    kwargs[key] = os.path.join(upload_result["subfolder"], upload_result["name"])
-                    # 업로드 후 임시 파일을 삭제합니다.
-                    os.remove(tmp_path)
-                else:
-                    raise ValueError(f"'{value}' file is not exist in server.")
-            else:
-                kwargs[key] = value
 
-        # ComfyUI 서버의 prompt 양식에 맞게끔 파싱합니다.     
+        try:
+            # 기다리는 동안 대기열이 찼을 수 있으므로 등록 직전에 다시 확인합니다.
+            self.scheduler.check_admission()
+        except QueueFullError as e:
+            return self._queue_full_response(e)
+
+        # 장애 조치로 다른 서버에 다시 업로드할 수 있도록 임시 파일은 연결이 끝날 때 삭제합니다.
+        # 큰 파일을 복사하거나 업로드하는 동안 다른 세션을 막지 않도록 스레드에서 실행합니다.
+        kwargs = await asyncio.to_thread(self._upload_inputs, data, self.socket_manager[sid].linked_server, None, False)
+        self.socket_manager[sid].wf_inputs = data
+
+        # ComfyUI 서버의 prompt 양식에 맞게끔 파싱합니다.
         prompt = parse_workflow_prompt(os.path.join(self.wf_dir, workflow), 
                                        tracing_mime_types=self.validator.ALLOWED_MIME_TYPES, 
                                        **kwargs)
         self.socket_manager[sid].wf_info = prompt
-        # 할당된 ComfyUI 서버에 prompt를 등록합니다. 
-        prompt = queue_prompt(prompt, sid, self.socket_manager[sid].linked_server)
+        self.socket_manager[sid].wf_alias = workflow_alias
+        # bridge server의 대기열에 등록합니다. 할당된 ComfyUI 서버에 자리가 나면 prompt가 등록됩니다.
+        job = Job(sid=sid,
+                  server_address=self.socket_manager[sid].linked_server,
+                  prompt=prompt,
+                  owner=get_client_ip(request, self.trusted_proxies),
+                  priority=priority,
+                  workflow=workflow_alias)
+        self.socket_manager[sid].job = job
+        position = self.scheduler.submit(job)
+        if self.journal is not None:
+            self.journal.record(sid, server=job.server_address, prompt_id=None, workflow=workflow_alias, cache_key=self.socket_manager[sid].cache_key,
+                                owner=job.owner, priority=job.priority)
+        if not self.health.is_available(job.server_address):
+            # 연결된 뒤에 서버가 장애로 제외되었다면, 복구를 기다리지 않고 다른 서버로 옮깁니다.
+            asyncio.create_task(self._close_backend_socket(sid))
 
         # generation count 업데이트 
         self.state_obj.generation_count += 1
         await self.state_obj.update()
 
-        # 할당된 ComfyUI 서버의 현재 대기열을 반환합니다.
-        queue_state = get_queue_state(self.socket_manager[sid].linked_server)
-        queue_length = sum([len(cur) for cur in queue_state.values()])
-        
+        # bridge server 대기열에서의 순번을 반환합니다. 0은 ComfyUI 서버에 바로 등록되었음을 의미합니다.
         return web.Response(
             status=200,
-            body=json.dumps({"detail":f"queued / {queue_length}"}),
+            body=json.dumps({"detail":f"queued / {position}"}),
             headers={"Content-Type": "application/json"}
         )
-    
-    async def upload(self, request):
+
+    async def _queue_job(self, job:Job):
         """
-        파일을 bridge server의 /temp/경로에 임시로 업로드합니다.
-        임시 저장된 파일은 안전성 검사를 거칩니다.
-        
+        스케줄러가 꺼낸 작업을 할당된 ComfyUI 서버에 등록합니다.
+
         Args:
-            request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로 받습니다.
-            
+            job (Job): 등록할 작업입니다.
+
         Returns:
-            web.Response: HTTP 응답 객체입니다. 업로드된 파일의 이름을 포함하는 JSON 응답을 반환합니다.
+            str: ComfyUI가 할당한 prompt_id입니다.
         """
-        sid = request.rel_url.query.get('clientId', None)
-        if not isinstance(sid, str): raise TypeError(f"clientId is required and must be and str, but got {type(sid).__str__()}")
+        try:
+            if self.unload_policy is not None:
+                # 다른 워크플로우의 모델이 VRAM을 차지하고 있다면 먼저 내립니다.
+                await self.unload_policy.ensure_vram(job.server_address, job.workflow)
+            result = await asyncio.to_thread(queue_prompt, job.prompt, job.sid, job.server_address)
+        except Exception as e:
+            if job.notify == True and is_connection_error(e) and job.retries < self.failover_max_retries:
+                # ComfyUI 서버 장애. 웹소켓을 닫아 추적 중인 작업을 다른 서버로 옮깁니다.
+                self.health.record_failure(job.server_address, e)
+                asyncio.create_task(self._close_backend_socket(job.sid))
+            elif job.notify == True:
+                await self.socket_manager.async_send_json(job.sid, {"status":"error", "detail":f"prompt is not queued / {e}"})
+            raise
 
-        if self.socket_manager[sid].linked_server is None:
-            # sid가 제출된 적이 없다면, REST 통신. 여기서 ComfyUI 서버 할당
-            server_address = await self.get_not_busy_server_address()
-            self.socket_manager[sid].linked_server = server_address
-        
-        reader= await request.multipart()
-        logging.info(f"[POST] '{request.path}'")
+        param_manager = self.socket_manager.sid_param_map.get(job.sid, None)
+        if job.notify == True and param_manager is not None:
+            param_manager.comfyui_prompt_id = result["prompt_id"]
+            if self.journal is not None:
+                self.journal.record(job.sid, server=job.server_address, prompt_id=result["prompt_id"])
+        return result["prompt_id"]
 
-        fns={}
-        async for part in reader:
+    async def _failover(self, sid:str):
+        """
+        장애가 발생한 ComfyUI 서버의 작업을 다른 서버로 옮깁니다.
+        새로운 서버와 웹소켓을 연결하고, 입력 파일을 다시 업로드한 뒤 prompt를 다시 파싱하여 대기열의 맨 앞에 등록합니다.
 
-            try:
-                file_identifier = part.name
-                file_name = os.path.basename(part.filename)
-                file_data = await part.read()
+        Args:
+            sid (str): 소켓 ID입니다.
 
-                # 바이트 파일이 안전한지 검사
-                is_valid, detail_about, tmp_path = await self.validator.validate_and_sanitize_file(file_data, file_name, return_tmp_path=True)
+        Returns:
+            bool: 작업을 옮겼는지 여부입니다. 재시도 횟수를 넘었거나 사용할 수 있는 서버가 없다면 False입니다.
+        """
+        param_manager = self.socket_manager[sid]
+        job, failed_server_address = param_manager.job, param_manager.linked_server
+        self.health.record_failure(failed_server_address, ConnectionError("websocket is disconnected"))
+        if job.retries >= self.failover_max_retries:
+            logging.error(f"[FAILOVER] RETRY BUDGET EXHAUSTED / {failed_server_address} / {sid}")
+            return False
 
-                if is_valid == True:
-                    if "image" in detail_about:
-                        # 이미지 일 때 valid
-                        pass
-                    elif "video" in detail_about:
-                        # 비디오 일 때 valid
-                        pass
-                    # TODO: 더 많은 타입을 허락해야 함
-                    else:
-                        # 그 외 금지
-                        os.remove(tmp_path)
-                        raise TypeError(f"{detail_about} is not allowed type / {file_name}")
-                else:
-                    # 안전하지 않다면 삭제, 에러발생
-                    if tmp_path is not None:
-                        os.remove(tmp_path)
-                    raise TypeError(f"{detail_about} / {file_name}")
-                
-                fns[file_identifier] = os.path.basename(tmp_path)
-                logging.debug(f"[POST] '{request.path}' / {file_name} saved / {sid}")
-        
-            except Exception as e:
-                logging.error(f"[POST] '{request.path}' / {file_name} can't save / {e} / {sid}")
+        session = aiohttp.ClientSession()
+        try:
+            server_address = await self.get_not_busy_server_address(job.workflow, exclude=[failed_server_address])
+            ws_req = await session.ws_connect(f"ws://{server_address}/ws?clientId={sid}")
+            kwargs = await asyncio.to_thread(self._upload_inputs, param_manager.wf_inputs, server_address, None, False)
+            prompt = parse_workflow_prompt(os.path.join(self.wf_dir, self.wf_alias_map[job.workflow]),
+                                           tracing_mime_types=self.validator.ALLOWED_MIME_TYPES,
+                                           **kwargs)
+        except Exception as e:
+            logging.error(f"[FAILOVER] FAILED / {e} / {sid}")
+            await session.close()
+            return False
 
-                return web.Response(
-                    status=400,
-                    body=json.dumps({"detail":f"{file_name} can't save / {e}"}),
-                    headers={"Content-Type": "application/json"}
-                )
+        if param_manager.session_req is not None:
+            await param_manager.session_req.close()
+        param_manager.session_req = session
+        param_manager.sockets_req = ws_req
+        param_manager.linked_server = server_address
+        param_manager.wf_info = prompt
+        param_manager.comfyui_prompt_id = None
+        if self.journal is not None:
+            self.journal.record(sid, server=server_address, prompt_id=None)
+        position = self.scheduler.reassign(job, server_address, prompt)
+        logging.warning(f"[FAILOVER] {failed_server_address} -> {server_address} / retry {job.retries} / {sid}")
+        await self.socket_manager.async_send_json(sid, {"status":"queued", "detail":f"position / {position}", "position":position})
+        return True
 
-        return web.Response(
-            status=200,
-            body=json.dumps(fns),
-            headers={"Content-Type": "application/json"}
-        )
-        
-    async def get_history(self, request):
+    def _recover_sessions(self):
         """
-        client id에 할당된 ComfyUI 서버의 history를 가져옵니다.
-        ComfyUI가 보낸 파일을 안전성 검사합니다.
-        실행이 끝난 후, 해당 client id의 life cycle이 끝났다고 판단하여 모든 리소스를 해제합니다.
-        
+        기록을 재생하여 비정상 종료 전에 할당된 client id를 되살리고, ComfyUI에 등록되어 있던 prompt에 다시 연결합니다.
+        client는 종료 전과 같은 clientId로 진행 상황과 결과물을 가져올 수 있습니다.
+        """
+        sessions = self.journal.recovered()
+        for sid, session in sessions.items():
+            param_manager = self.socket_manager[sid]
+            param_manager.linked_server = session.get("server", None)
+            param_manager.comfyui_prompt_id = session.get("prompt_id", None)
+            param_manager.wf_alias = session.get("workflow", None)
+            param_manager.cache_key = session.get("cache_key", None)
+            asyncio.create_task(self._reattach_session(sid, session))
+        if len(sessions) > 0:
+            logging.warning(f"[JOURNAL] RECOVERING / {len(sessions)} sessions")
+
+    async def _reattach_session(self, sid:str, session:dict):
+        """
+        되살린 client id의 prompt에 ComfyUI 서버의 웹소켓을 다시 연결하고, 끝날 때까지 진행 상황을 추적합니다.
+        prompt는 끝날 때까지 스케줄러에 등록된 작업으로 두어 서버의 자리를 차지하게 합니다.
+        ComfyUI에 등록되기 전이었던 작업은 prompt가 남아 있지 않으므로 실패로 알립니다.
+
         Args:
-            request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로 받습니다.
-            
-        Returns:
-            web.Response: HTTP 응답 객체입니다. ComfyUI 서버의 히스토리를 포함하는 멀티파트 HTTP 응답을 반환합니다.
+            sid (str): client id
+            session (dict): 기록에서 재생한 항목
         """
-        
-        sid = request.rel_url.query.get('clientId', None)
-        res_type = request.rel_url.query.get('resType', "multipart")
-        if not isinstance(sid, str): raise TypeError(f"clientId is must be str, but got {type(sid).__str__()}")
-        
-        server_address = self.socket_manager[sid].linked_server
-        if server_address is None:
-            return web.Response(
-                status=204,
-                body=json.dumps({"detail":f"The client ID has not been submitted to the server before. It is not recognized. / {sid}"}),
-                headers={"Content-Type": "application/json"}
-            )
-        
-        prompt_id = self.socket_manager[sid].comfyui_prompt_id
-        history = get_history(prompt_id, server_address)
-        history = history.get(prompt_id, None)
-        logging.debug(f"[GET] '{request.path}' / GET HISTORY / {sid}")
-        
-        if history is not None:
-            output = history["outputs"]
-            if isinstance(output, tuple):
-                output = output[0]
+        callback = session.get("callback", None)
+        if callback is not None and self.webhooks is not None:
+            asyncio.create_task(self._deliver_on_completion(sid, session.get("workflow", None), callback, session.get("callback_type", "json")))
 
-            file_names, file_contents = process_outputs(output, server_address)
+        prompt_id, server_address = session.get("prompt_id", None), session.get("server", None)
+        if prompt_id is None or server_address is None:
+            logging.warning(f"[JOURNAL] LOST / prompt was not queued / {sid}")
+            await self.socket_manager.async_send_json(sid, {"status":"error", "detail":"job is lost by server restart"})
+            return
 
-            if res_type == "multipart":
-                data = aiohttp.FormData()
-            elif res_type == "base64":
-                encoded_files = []
-            else:
-                raise ValueError(f"resType is must be [multipart, base64] but got {res_type}")
-            
-            for idx, (file_name, file_content) in enumerate(zip(file_names, file_contents)):
-                # 바이트 파일이 안전한지 검사
-                is_valid, detail_about, _ = await self.validator.validate_and_sanitize_file(file_content, file_name)
-
-                if is_valid:
-                    if res_type == "multipart":
-                        data.add_field(
-                            f'result_{idx}',
-                            file_content,
-                            content_type=detail_about,
-                            filename=file_name,
-                        )
-                    elif res_type == "base64":
-                        encoded_file = encode_byte_base64(file_content)
-                        encoded_files.append({
-                            'file_name': file_name,
-                            'content_type': detail_about,
-                            'content': encoded_file,
-                        })
-                    else:
-                        raise ValueError(f"resType is must be [multipart, base64] but got {res_type}")
-                else:
-                    logging.debug(f"{detail_about} / {file_name} / {sid}")
-                    continue
+        param_manager = self.socket_manager[sid]
+        workflow_alias = session.get("workflow", None)
+        try:
+            # 진행률 계산에 사용할 노드 목록입니다. client의 input은 남아 있지 않으므로 기본값으로 파싱합니다.
+            param_manager.wf_info = parse_workflow_prompt(os.path.join(self.wf_dir, self.wf_alias_map[workflow_alias]),
+                                                          tracing_mime_types=self.validator.ALLOWED_MIME_TYPES)
+        except Exception as e:
+            logging.debug(f"[JOURNAL] WORKFLOW IS NOT PARSED / {e} / {sid}")
+            param_manager.wf_info = {}
+        job = Job(sid=sid,
+                  server_address=server_address,
+                  prompt=None,
+                  owner=session.get("owner", None),
+                  priority=session.get("priority", self.priority_classes[-1]),
+                  workflow=workflow_alias)
+        job.prompt_id = prompt_id
+        # 입력 파일이 남아 있지 않으므로 ComfyUI 서버에 장애가 발생해도 다른 서버로 옮기지 않습니다.
+        job.retries = self.failover_max_retries
 
-            # client id life cycle is over. release all resources
-            asyncio.create_task(self.socket_manager.async_delete(sid))
-            logging.debug(f"[GET] '{request.path}' / DELETE HISTORY / {sid}")
+        session_req = None
+        try:
+            await self.socket_manager.async_send_json(sid, {"status":"queued", "detail":"position / 0", "position":0})
+            # ComfyUI 서버에 잠시 연결할 수 없더라도 prompt는 실행 중일 수 있으므로, 상태 확인 간격마다 다시 연결합니다.
+            deadline = time.time() + self.limit_timeout_count * self.timeout_interval
+            while True:
+                try:
+                    session_req = await self._ws_req_connection(sid)
+                    # 다시 연결하기 전에 끝난 prompt의 메시지는 받을 수 없으므로 history와 대기열을 한 번 확인합니다.
+                    history = (await asyncio.to_thread(get_history, prompt_id, server_address)).get(prompt_id, None)
+                    lost = False
+                    if history is None:
+                        queue_state = await asyncio.to_thread(get_queue_state, server_address)
+                        if prompt_id not in [item[1] for cur in queue_state.values() for item in cur]:
+                            # 대기열 확인 사이에 실행이 끝났을 수 있으므로 history를 다시 확인합니다.
+                            history = (await asyncio.to_thread(get_history, prompt_id, server_address)).get(prompt_id, None)
+                            lost = history is None
+                    break
+                except Exception as e:
+                    if not isinstance(e, aiohttp.ServerConnectionError) and not is_connection_error(e):
+                        raise
+                    if session_req is not None:
+                        await session_req.close()
+                        session_req = None
+                    param_manager = self.socket_manager.sid_param_map.get(sid, None)
+                    if param_manager is None:
+                        return
+                    param_manager.sockets_req = None
+                    if time.time() >= deadline:
+                        raise aiohttp.ServerConnectionError(f"{e}") from e
+                    logging.warning(f"[JOURNAL] REATTACH RETRYING / {e} / {sid}")
+                    # 다시 연결하는 동안 생명 주기가 끝나지 않도록 합니다.
+                    param_manager.update_life()
+                    await asyncio.sleep(self.health_check_interval)
+                    if sid not in self.socket_manager.sid_param_map:
+                        return
+            if lost:
+                raise ConnectionError(f"prompt is lost in server / {prompt_id}")
+            self.scheduler.adopt(job)
+            param_manager.job = job
 
-            if res_type == "multipart":
-                multipart = data()
-                headers = {"Content-Type": multipart.content_type}
-                return web.Response(
-                    status=200,
-                    body=multipart,
-                    headers=headers
-                )
-            elif res_type == "base64":
-                headers = {"Content-Type": "application/json"}
-                return web.Response(
-                    status=200,
-                    body=json.dumps({'files': encoded_files}),
-                    headers=headers
-                )
+            if history is None:
+                logging.info(f"[JOURNAL] REATTACHED / {prompt_id} / {server_address} / {sid}")
+                await self.track_progress(sid, started=True)
+            elif history.get("status", {}).get("status_str", None) == "error":
+                self.scheduler.complete(sid, success=False)
+                await self.socket_manager.async_send_json(sid, {"status":"error", "detail":"execution is failed"})
             else:
-                raise ValueError(f"resType is must be [multipart, base64] but got {res_type}")
+                job = self.scheduler.complete(sid)
+                if job is not None:
+                    self._mark_job_done(job)
+                    await self._record_execution_time(job.server_address, job.workflow, get_execution_seconds(history))
+                    self._record_usage(sid, job, None, get_execution_seconds(history))
+                logging.info(f"[JOURNAL] REATTACHED / {prompt_id} / {server_address} / {sid}")
+                await self.socket_manager.async_send_json(sid, {"status":"closed", "detail":"Execution is done"})
+        except aiohttp.ServerConnectionError as e:
+            logging.warning(f"[JOURNAL] REATTACH FAILED / server connection error / {sid}")
+            await self.socket_manager.async_send_json(sid, {"status":"error", "detail":"server connection error"})
+        except Exception as e:
+            logging.warning(f"[JOURNAL] REATTACH FAILED / {e} / {sid}")
+            await self.socket_manager.async_send_json(sid, {"status":"error", "detail":"prompt is lost in server"})
+        finally:
+            self.scheduler.cancel(sid)
+            param_manager = self.socket_manager.sid_param_map.get(sid, None)
+            if param_manager is not None:
+                # 결과물은 history에서 가져가므로 prompt_id는 남기고 ComfyUI 서버의 웹소켓만 닫습니다.
+                param_manager.job = None
+                if param_manager.sockets_req is not None:
+                    await param_manager.sockets_req.close()
+                param_manager.sockets_req = None
+            if session_req is not None:
+                await session_req.close()
 
-    async def free_memory(self, request):
+    def _on_session_deleted(self, sid:str):
         """
-        ComfyUI서버의 RAM, GPU 메모리를 해제합니다.
-        
+        결과물을 가져갔거나 생명 주기가 끝나 삭제된 client id를 기록에서도 삭제합니다.
+
         Args:
-            request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로 받습니다. 
-            주어지지 않을 경우 모든 ComfyUI서버의 메모리를 해제합니다.
-            각 ComfyUI서버 동작에는 큰 영향은 없습니다.
-            
-        Returns:
-            web.Response: HTTP 응답 객체입니다. 서버 메모리 해제 완료 메시지를 반환합니다.
+            sid (str): client id
         """
-        sid = request.rel_url.query.get('clientId', None)
-        if sid is not None:
-            post_free_memory(self.socket_manager[sid].linked_server)
-        else:
-            for address in self.server_address:
-                try:
-                    post_free_memory(address)
-                except Exception as e:
+        if self.journal is not None:
+            self.journal.remove(sid)
+        # 결과물을 가져가지 않은 작업은 결과물 크기를 0으로 기록합니다.
+        self._flush_usage(sid, [])
+
+    def _record_usage(self, sid:str, job:Job, inputs:dict, execution_seconds:float, files:list=None, owner:str=None):
+        """
+        끝난 작업의 사용량을 기록합니다. 결과물이 주어지지 않았다면 client가 결과물을 가져갈 때까지 미뤄 둡니다.
+
+        Args:
+            sid (str): client id입니다.
+            job (Job): 끝난 작업입니다.
+            inputs (dict): client가 보낸 custom input입니다. 업로드한 파일의 크기를 계산하는 데 사용합니다.
+            execution_seconds (float): 실행 시간(초)입니다. None이면 대기열에 등록한 뒤 끝날 때까지를 대기 시간으로 기록합니다.
+            files (list, optional): (파일 이름, 파일 내용, MIME 타입) 튜플 목록입니다.
+            owner (str, optional): 요청자입니다. None이면 작업의 요청자입니다.
+        """
+        if self.usage is None:
+            return
+        now = time.time()
+        execution_seconds = execution_seconds if execution_seconds is not None else 0.0
+        input_bytes = 0
+        for value in (inputs or {}).values():
+            if UploadStore.is_handle(value):
+                try:
+                    input_bytes += self.upload_store.get(value).size
+                except KeyError:
+                    pass
+        self.usage_pending[sid] = {
+            "client_id": sid,
+            "client": owner if owner is not None else job.owner,
+            "workflow": job.workflow,
+            "server": job.server_address,
+            "wait_seconds": max(0.0, now - job.enqueued_at - execution_seconds),
+            "execution_seconds": execution_seconds,
+            "input_bytes": input_bytes,
+            "timestamp": now,
+        }
+        if files is not None:
+            self._flush_usage(sid, files)
+
+    def _flush_usage(self, sid:str, files:list):
+        """
+        미뤄 둔 사용량을 결과물 크기와 함께 기록합니다.
+
+        Args:
+            sid (str): client id입니다.
+            files (list): (파일 이름, 파일 내용, MIME 타입) 튜플 목록입니다.
+        """
+        entry = self.usage_pending.pop(sid, None)
+        if entry is None:
+            return
+        output_bytes = sum(file_content.stat().st_size if isinstance(file_content, pathlib.Path) else len(file_content)
+                           for _, file_content, _ in files)
+        try:
+            self.usage.record(**entry, output_bytes=output_bytes)
+        except OSError as e:
+            logging.error(f"[USAGE] RECORD FAILED / {e} / {sid}")
+
+    async def _close_backend_socket(self, sid:str):
+        """
+        ComfyUI 서버와 연결된 웹소켓을 닫아 진행 상황 추적이 장애 조치를 시작하도록 합니다.
+
+        Args:
+            sid (str): 소켓 ID입니다.
+        """
+        param_manager = self.socket_manager.sid_param_map.get(sid, None)
+        if param_manager is not None and param_manager.sockets_req is not None:
+            await param_manager.sockets_req.close()
+
+    def _check_backend(self, server_address:str):
+        """
+        ComfyUI 서버가 응답하는지 확인합니다. 응답하지 않으면 예외가 발생합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소입니다.
+        """
+        get_system_stats(server_address, timeout=self.health_check_timeout)
+
+    async def _on_backend_state_change(self, server_address:str, available:bool):
+        """
+        ComfyUI 서버가 제외되거나 복구되었을 때 호출됩니다.
+        복구된 서버에는 대기 중인 작업을 등록하고, 제외된 서버의 작업은 다른 서버로 옮깁니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소입니다.
+            available (bool): 사용 가능 여부입니다.
+        """
+        if available == True:
+            # 다시 연결된 서버는 재시작되었을 수 있으므로 모델을 다시 불러옵니다.
+            self.warmup.mark_cold(server_address)
+            self.warmup.schedule(server_address)
+            self.scheduler.resume(server_address)
+            return
+        self.warmup.mark_cold(server_address)
+        await asyncio.gather(*[self._close_backend_socket(sid)
+                               for sid, param_manager in list(self.socket_manager.sid_param_map.items())
+                               if param_manager.linked_server == server_address and param_manager.job is not None])
+
+    def _mark_job_done(self, job:Job):
+        """
+        작업이 끝난 ComfyUI 서버에 워크플로우의 모델이 올라가 있고, 서버가 사용 중임을 기록합니다.
+
+        Args:
+            job (Job): 끝난 작업입니다.
+        """
+        self.warmup.mark_hot(job.server_address, job.workflow)
+        if self.unload_policy is not None:
+            self.unload_policy.record_activity(job.server_address)
+
+    def _on_warm(self, server_address:str, workflow:str):
+        """
+        warmup이 끝난 ComfyUI 서버의 유휴 시간을 초기화합니다. 불러온 모델을 바로 내리지 않기 위함입니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소입니다.
+            workflow (str): warmup한 워크플로우 alias입니다.
+        """
+        if self.unload_policy is not None:
+            self.unload_policy.record_activity(server_address, count=False)
+
+    def _is_backend_busy(self, server_address:str):
+        """
+        ComfyUI 서버의 모델을 내리면 안 되는 상태인지 확인합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소입니다.
+
+        Returns:
+            bool: 작업이나 warmup이 진행 중이거나, 장애로 제외된 서버라면 True입니다.
+        """
+        warmup_task = self.warmup.tasks.get(server_address, None)
+        return (not self.health.is_available(server_address)
+                or self.scheduler.inflight_count(server_address) > 0
+                or self.scheduler.queued_count(server_address) > 0
+                or (warmup_task is not None and not warmup_task.done()))
+
+    def _make_warmup_prompt(self, workflow:str, inputs:dict):
+        """
+        warmup에 사용할 prompt를 만듭니다.
+
+        Args:
+            workflow (str): 워크플로우 alias입니다.
+            inputs (dict): warmup용 custom input입니다. (ex: 적은 step, 작은 해상도)
+
+        Returns:
+            dict: ComfyUI에서 실행 가능한 prompt입니다.
+        """
+        return parse_workflow_prompt(os.path.join(self.wf_dir, self.wf_alias_map[workflow]),
+                                     tracing_mime_types=self.validator.ALLOWED_MIME_TYPES,
+                                     **inputs)
+
+    def _remove_tmp_inputs(self, data:dict):
+        """
+        custom input 중 /upload로 임시 저장된 파일을 삭제합니다.
+
+        Args:
+            data (dict): client가 보낸 custom input입니다.
+        """
+        for value in (data or {}).values():
+            if UploadStore.is_handle(value):
+                self.upload_store.remove(value)
+
+    async def _notify_queue_position(self, sid:str, position:int):
+        """
+        대기 중인 client에게 대기 순번을 알립니다. ComfyUI에 등록된 작업은 생명 주기만 갱신합니다.
+
+        Args:
+            sid (str): 소켓 ID입니다.
+            position (int): 대기 순번입니다. 0은 ComfyUI 서버에 등록된 작업입니다.
+        """
+        param_manager = self.socket_manager.sid_param_map.get(sid, None)
+        if param_manager is None:
+            # 리소스가 해제된 client의 작업은 더 이상 실행하지 않습니다.
+            self.scheduler.cancel(sid)
+            return
+        if position > 0:
+            # 앞선 작업이 끝날 때까지의 시간과 이 작업의 예상 실행 시간을 더해 남은 시간을 알립니다.
+            eta = (self.scheduler.expected_wait(sid, self.execution_stats.expected) or 0.0) + self.execution_stats.expected(param_manager.linked_server, param_manager.wf_alias)
+            await self.socket_manager.async_send_json(sid, {"status":"queued", "detail":f"position / {position}", "eta":round(eta, 1), "position":position})
+        elif param_manager.sockets_req is None or param_manager.ws_connection_status == "error":
+            # 진행 상황을 추적하는 웹소켓이 없다면 작업이 끝난 것을 알 수 없으므로 자리를 반환합니다.
+            self.scheduler.complete(sid, success=False)
+            await self._abort_flight(sid, "server connection error")
+            return
+        else:
+            param_manager.update_life()
+        # 같은 prompt를 기다리는 client id들에는 마지막 대기 순번이나 진행 상황을 전달합니다.
+        await self._forward_to_followers(sid, param_manager.execution_info)
+
+    def _queue_full_response(self, error:QueueFullError):
+        """
+        대기열이 가득 찼을 때 client에게 다시 요청할 시간을 알리는 응답을 만듭니다.
+
+        Args:
+            error (QueueFullError): 스케줄러가 발생시킨 예외입니다.
+
+        Returns:
+            web.Response: 429 HTTP 응답 객체입니다.
+        """
+        logging.warning(f"[SCHEDULER] QUEUE FULL / retry after {error.retry_after}s")
+        return web.Response(
+            status=429,
+            body=json.dumps({"detail":f"{error}"}),
+            headers={"Content-Type": "application/json", "Retry-After": str(error.retry_after)}
+        )
+
+    def _webhook_queue_full_response(self, error:WebhookQueueFullError):
+        """
+        전송 대기 중인 webhook이 너무 많을 때 callback을 지정한 요청을 거절하는 응답을 만듭니다.
+
+        Args:
+            error (WebhookQueueFullError): webhook 전송 대기열이 발생시킨 예외입니다.
+
+        Returns:
+            web.Response: 429 HTTP 응답 객체입니다.
+        """
+        logging.warning(f"[WEBHOOK] QUEUE FULL / {error.pending}")
+        return web.Response(
+            status=429,
+            body=json.dumps({"detail":f"{error}"}),
+            headers={"Content-Type": "application/json", "Retry-After": str(self.timeout_interval)}
+        )
+
+    def _draining_response(self):
+        """
+        종료를 기다리는 중이라 새로운 작업을 받지 않는다는 응답을 만듭니다. 앞단의 proxy는 이 응답을 받으면 다른 bridge server로 요청을 보낼 수 있습니다.
+
+        Returns:
+            web.Response: 503 HTTP 응답 객체입니다.
+        """
+        return web.Response(
+            status=503,
+            body=json.dumps({"detail":"server is draining, new generations are not accepted"}),
+            headers={"Content-Type": "application/json", "Retry-After": str(self.timeout_interval)}
+        )
+
+    @web.middleware
+    async def rate_limit_middleware(self, request, handler):
+        """
+        업로드와 생성 요청을 client id, client IP, workflow 별로 제한하는 미들웨어 함수입니다.
+        한도를 넘은 요청은 파일을 검사하거나 대기열에 등록하기 전에 거절합니다.
+
+        Args:
+            request (web.Request): 웹 요청 객체입니다.
+            handler (Callable): 요청을 처리할 핸들러 함수입니다.
+
+        Returns:
+            response (web.Response): 요청 처리 결과를 포함한 HTTP 응답 객체입니다. 한도를 넘었다면 429 응답입니다.
+        """
+        if self.rate_limiter is None or request.method != "POST" or request.path not in self.rate_limit_paths:
+            return await handler(request)
+
+        workflow_alias = None
+        cost = 1
+        if request.content_type == "application/json":
+            # 읽은 본문은 request에 남아 있으므로 핸들러에서 다시 읽을 수 있습니다.
+            try:
+                data = await request.json()
+            except ValueError:
+                data = None
+            if isinstance(data, dict) and data.get("workflow", None) in self.wf_alias_map:
+                workflow_alias = data["workflow"]
+            if isinstance(data, dict) and request.path == "/generate-batch":
+                # batch 요청은 parameter set마다 작업을 등록하므로 parameter set 수만큼 꺼냅니다.
+                try:
+                    cost = min(max(len(expand_parameter_sets(base=data.get("base", None),
+                                                             inputs=data.get("inputs", None),
+                                                             sweep=data.get("sweep", None))), 1), self.batch_max_size)
+                except Exception:
+                    # 잘못된 요청은 핸들러에서 거절합니다.
+                    cost = 1
+
+        try:
+            self.rate_limiter.acquire({"client": request.rel_url.query.get('clientId', None),
+                                       "ip": get_client_ip(request, self.trusted_proxies),
+                                       "workflow": workflow_alias}, cost=cost)
+        except RateLimitError as e:
+            return self._rate_limit_response(e)
+        return await handler(request)
+
+    def _rate_limit_response(self, error:RateLimitError):
+        """
+        요청 한도를 넘었을 때 client에게 다시 요청할 시간을 알리는 응답을 만듭니다.
+
+        Args:
+            error (RateLimitError): 요청 제한이 발생시킨 예외입니다.
+
+        Returns:
+            web.Response: 429 HTTP 응답 객체입니다.
+        """
+        return web.Response(
+            status=429,
+            body=json.dumps({"detail":f"{error}", "scope":error.scope}),
+            headers={"Content-Type": "application/json", "Retry-After": str(error.retry_after)}
+        )
+
+    def _upload_quota_response(self, error:UploadQuotaError):
+        """
+        업로드 저장소의 용량이 부족할 때의 응답을 만듭니다.
+
+        Args:
+            error (UploadQuotaError): 업로드 저장소가 발생시킨 예외입니다.
+
+        Returns:
+            web.Response: 507 HTTP 응답 객체입니다.
+        """
+        logging.warning(f"[UPLOAD] STORE FULL / {error.used} of {error.max_size}")
+        return web.Response(
+            status=507,
+            body=json.dumps({"detail":f"{error}"}),
+            headers={"Content-Type": "application/json"}
+        )
+
+    async def _make_cache_key(self, workflow:str, data:dict):
+        """
+        client의 custom input으로 파싱한 prompt의 캐시 키를 만듭니다.
+        업로드된 파일은 임시 파일명 대신 파일 내용의 해시로 대체합니다.
+
+        Args:
+            workflow (str): 워크플로우 파일 이름입니다.
+            data (dict): client가 보낸 custom input입니다.
+
+        Returns:
+            str: 결과물 캐시 키입니다.
+        """
+        prompt = parse_workflow_prompt(os.path.join(self.wf_dir, workflow),
+                                       tracing_mime_types=self.validator.ALLOWED_MIME_TYPES,
+                                       **self._hash_upload_inputs(data))
+        return ResultCache.make_key(prompt)
+
+    def _hash_upload_inputs(self, data:dict):
+        """
+        custom input 중 업로드 저장소의 파일 이름을 업로드할 때 계산한 파일 내용의 해시로 바꿉니다.
+        같은 파일을 따로 업로드한 요청도 같은 input으로 비교하기 위함입니다.
+
+        Args:
+            data (dict): client가 보낸 custom input입니다.
+
+        Returns:
+            dict: 파일 이름을 'sha256:{해시}'로 바꾼 custom input입니다.
+        """
+        kwargs = {}
+        for key, value in data.items():
+            if UploadStore.is_handle(value):
+                try:
+                    kwargs[key] = f"sha256:{self.upload_store.get(value).sha256}"
+                except KeyError as e:
+                    raise ValueError(e.args[0])
+            else:
+                kwargs[key] = value
+        return kwargs
+
+    async def _serve_cached_result(self, sid:str, data:dict, files:list):
+        """
+        캐시된 결과물을 client id에 할당하고, ComfyUI 서버에 작업을 요청하지 않고 실행 완료를 알립니다.
+
+        Args:
+            sid (str): 소켓 ID입니다.
+            data (dict): client가 보낸 custom input입니다. 사용되지 않은 임시 파일을 삭제합니다.
+            files (list): 캐시된 (파일 이름, 파일 내용, MIME 타입) 튜플 목록입니다.
+
+        Returns:
+            web.Response: HTTP 응답 객체입니다.
+        """
+        self._remove_tmp_inputs(data)
+
+        self.socket_manager[sid].result_files = files
+        await self.socket_manager.async_send_json(sid, {'status': 'closed', 'detail': 'Execution is done'})
+        if self.socket_manager[sid].sockets_req is not None:
+            # ComfyUI 서버의 메시지를 기다리는 추적을 종료합니다.
+            await self.socket_manager[sid].sockets_req.close()
+
+        # generation count 업데이트
+        self.state_obj.generation_count += 1
+        await self.state_obj.update()
+        logging.info(f"[CACHE] HIT / {sid}")
+
+        return web.Response(
+            status=200,
+            body=json.dumps({"detail":"cached / 0"}),
+            headers={"Content-Type": "application/json"}
+        )
+
+    async def _attach_to_flight(self, sid:str, leader_sid:str, data:dict):
+        """
+        같은 prompt로 실행 중인 작업에 client id를 묶습니다. 대기열에는 등록하지 않고, 작업이 끝나면 같은 결과물을 할당받습니다.
+
+        Args:
+            sid (str): 소켓 ID입니다.
+            leader_sid (str): 실행 중인 작업을 등록한 소켓 ID입니다.
+            data (dict): client가 보낸 custom input입니다. 사용되지 않은 임시 파일을 삭제합니다.
+
+        Returns:
+            web.Response: HTTP 응답 객체입니다.
+        """
+        self._remove_tmp_inputs(data)
+
+        position = self.scheduler.position(leader_sid) or 0
+        leader = self.socket_manager.sid_param_map.get(leader_sid, None)
+        self.socket_manager[sid].wf_alias = leader.wf_alias if leader is not None else None
+        if leader is not None and leader.execution_info is not None:
+            await self.socket_manager.async_send_json(sid, leader.execution_info)
+        else:
+            await self.socket_manager.async_send_json(sid, {"status":"queued", "detail":f"position / {position}", "position":position})
+
+        # generation count 업데이트
+        self.state_obj.generation_count += 1
+        await self.state_obj.update()
+
+        return web.Response(
+            status=200,
+            body=json.dumps({"detail":f"coalesced / {position}"}),
+            headers={"Content-Type": "application/json"}
+        )
+
+    async def _land_flight(self, sid:str, files:list=None):
+        """
+        작업이 끝났음을 기록하고, 작업에 묶인 client id들에 같은 결과물을 할당합니다.
+
+        Args:
+            sid (str): 작업을 등록한 소켓 ID입니다.
+            files (list, optional): (파일 이름, 파일 내용, MIME 타입) 튜플 목록입니다. None이면 ComfyUI 서버의 history에서 가져옵니다.
+        """
+        if self.single_flight is None:
+            return
+        followers = self.single_flight.land(sid)
+        if len(followers) == 0:
+            return
+
+        if files is None:
+            param_manager = self.socket_manager[sid]
+            try:
+                prompt_id, server_address = param_manager.comfyui_prompt_id, param_manager.linked_server
+                history = (await asyncio.to_thread(get_history, prompt_id, server_address))[prompt_id]
+                output = history["outputs"]
+                if isinstance(output, tuple):
+                    output = output[0]
+                files = await self._collect_outputs(output, server_address)
+            except Exception as e:
+                logging.error(f"[SINGLE FLIGHT] COLLECT FAILED / {e} / {sid}")
+                await self._notify_followers(followers, {"status":"error", "detail":"execution is failed"})
+                return
+
+        for follower in followers:
+            param_manager = self.socket_manager.sid_param_map.get(follower, None)
+            if param_manager is None:
+                continue
+            param_manager.result_files = files
+            await self.socket_manager.async_send_json(follower, {'status': 'closed', 'detail': 'Execution is done'})
+            if param_manager.sockets_req is not None:
+                # ComfyUI 서버의 메시지를 기다리는 추적을 종료합니다.
+                await param_manager.sockets_req.close()
+        logging.info(f"[SINGLE FLIGHT] LANDED / {len(followers)} / {sid}")
+
+    async def _handoff_flight(self, sid:str):
+        """
+        작업을 등록한 client id가 떠났을 때, 같은 prompt를 기다리는 client id가 남아 있다면 그 중 하나에 작업을 넘깁니다.
+        ComfyUI의 메시지는 떠난 client id로 전달되므로, 넘겨받은 작업은 ComfyUI의 history로 끝나기를 확인합니다.
+
+        Args:
+            sid (str): 작업을 등록한 소켓 ID입니다.
+
+        Returns:
+            bool: 작업을 넘겼는지 여부입니다. False라면 작업을 취소해야 합니다.
+        """
+        if self.single_flight is None:
+            return False
+        param_manager = self.socket_manager.sid_param_map.get(sid, None)
+        promoted = self.promoted_flights.pop(sid, None)
+        if promoted is not None:
+            job, inputs = promoted
+        else:
+            job = next((cur for cur in self.scheduler.active_jobs() if cur.sid == sid and cur.notify == True), None)
+            inputs = param_manager.wf_inputs if param_manager is not None else None
+        new_sid = next((cur for cur in self.single_flight.followers(sid) if cur in self.socket_manager.sid_param_map), None)
+        if job is None or new_sid is None or not self.scheduler.has_job(sid):
+            return False
+
+        self.single_flight.promote(sid, new_sid)
+        self.scheduler.transfer(sid, new_sid)
+        self.promoted_flights[new_sid] = (job, inputs)
+        if param_manager is not None:
+            # 임시 파일은 장애 조치로 다시 업로드할 수 있도록 작업이 끝날 때 삭제합니다.
+            param_manager.job, param_manager.wf_inputs = None, None
+        if self.journal is not None:
+            self.journal.record(new_sid, server=job.server_address, prompt_id=job.prompt_id, workflow=job.workflow,
+                                cache_key=self.socket_manager[new_sid].cache_key, owner=job.owner, priority=job.priority)
+        if promoted is None:
+            # 대기 순번은 떠난 client id가 아닌 작업을 넘겨받은 client id에 직접 알립니다.
+            job.notify = False
+            asyncio.create_task(self._lead_promoted_flight(job, inputs))
+        return True
+
+    async def _lead_promoted_flight(self, job:Job, inputs:dict):
+        """
+        넘겨받은 작업이 끝나기를 ComfyUI의 history로 기다리고, 끝나면 작업을 넘겨받은 client id와 묶인 client id들에 결과물을 할당합니다.
+        기다리는 동안 작업을 넘겨받은 client id도 떠나면 다시 넘기거나 취소합니다.
+
+        Args:
+            job (Job): 넘겨받은 작업입니다. job.sid는 작업을 넘겨받은 소켓 ID입니다.
+            inputs (dict): 작업의 custom input입니다. 작업이 끝나면 임시 파일을 삭제합니다.
+        """
+        make_prompt = lambda kwargs: parse_workflow_prompt(os.path.join(self.wf_dir, self.wf_alias_map[job.workflow]),
+                                                           tracing_mime_types=self.validator.ALLOWED_MIME_TYPES,
+                                                           **kwargs)
+        wait_task = asyncio.create_task(self._wait_with_failover(job, inputs, {}, make_prompt))
+        try:
+            while True:
+                done, _ = await asyncio.wait({wait_task}, timeout=self.timeout_interval)
+                if len(done) > 0:
+                    break
+                sid = job.sid
+                if self.promoted_flights.get(sid, (None, None))[0] is not job:
+                    # 작업이 취소되었습니다.
+                    wait_task.cancel()
+                    return
+                param_manager = self.socket_manager.sid_param_map.get(sid, None)
+                if param_manager is None:
+                    if not await self._handoff_flight(sid):
+                        self.scheduler.cancel(sid)
+                        await self._abort_flight(sid, "execution is cancelled")
+                    continue
+                # 결과물을 기다리는 동안 생명 주기가 끝나지 않도록 하고, 묶인 client id들에 마지막 상태를 전달합니다.
+                param_manager.update_life()
+                await self._forward_to_followers(sid, param_manager.execution_info)
+
+            sid = job.sid
+            try:
+                history, server_address, prompt_id = wait_task.result()
+                output = history["outputs"]
+                if isinstance(output, tuple):
+                    output = output[0]
+                files = await self._collect_outputs(output, server_address)
+                await asyncio.to_thread(delete_history, prompt_id, server_address)
+            except Exception as e:
+                logging.error(f"[SINGLE FLIGHT] PROMOTED JOB FAILED / {e} / {sid}")
+                self.promoted_flights.pop(sid, None)
+                self.scheduler.complete(sid, success=False)
+                await self.socket_manager.async_send_json(sid, {"status":"error", "detail":"execution is failed"})
+                await self._abort_flight(sid, "execution is failed")
+                return
+
+            self.promoted_flights.pop(sid, None)
+            self.scheduler.complete(sid)
+            self._mark_job_done(job)
+            await self._record_execution_time(server_address, job.workflow, get_execution_seconds(history))
+            self._record_usage(sid, job, inputs, get_execution_seconds(history), files)
+
+            param_manager = self.socket_manager.sid_param_map.get(sid, None)
+            if param_manager is not None:
+                param_manager.result_files = files
+                if self.result_cache is not None and param_manager.cache_key is not None:
+                    await self.result_cache.put(param_manager.cache_key, files)
+                await self.socket_manager.async_send_json(sid, {'status': 'closed', 'detail': 'Execution is done'})
+                if param_manager.sockets_req is not None:
+                    # ComfyUI 서버의 메시지를 기다리는 추적을 종료합니다.
+                    await param_manager.sockets_req.close()
+            await self._land_flight(sid, files)
+            logging.info(f"[SINGLE FLIGHT] PROMOTED JOB DONE / {prompt_id} / {sid}")
+        finally:
+            self._remove_tmp_inputs(inputs)
+
+    async def _abort_flight(self, sid:str, detail:str):
+        """
+        작업이 결과물 없이 끝났음을 기록하고, 작업에 묶인 client id들에 에러를 알립니다.
+
+        Args:
+            sid (str): 작업을 등록한 소켓 ID입니다.
+            detail (str): 에러 설명입니다.
+        """
+        if self.single_flight is None:
+            return
+        followers = self.single_flight.land(sid)
+        if len(followers) > 0:
+            logging.warning(f"[SINGLE FLIGHT] ABORTED / {detail} / {len(followers)} / {sid}")
+            await self._notify_followers(followers, {"status":"error", "detail":detail})
+
+    async def _forward_to_followers(self, sid:str, message:dict):
+        """
+        작업을 등록한 client id에 보낸 메시지를 작업에 묶인 client id들에도 보냅니다.
+
+        Args:
+            sid (str): 작업을 등록한 소켓 ID입니다.
+            message (dict): 보낼 메시지입니다.
+        """
+        if self.single_flight is None or message is None:
+            return
+        await self._notify_followers(self.single_flight.followers(sid), message)
+
+    async def _notify_followers(self, followers:list, message:dict):
+        """
+        작업에 묶인 client id들에 메시지를 보냅니다. 리소스가 해제된 client id는 건너뜁니다.
+
+        Args:
+            followers (list): 소켓 ID 목록입니다.
+            message (dict): 보낼 메시지입니다.
+        """
+        for follower in followers:
+            if follower in self.socket_manager.sid_param_map:
+                await self.socket_manager.async_send_json(follower, message)
+
+    def _upload_inputs(self, data:dict, server_address:str, uploaded:dict=None, remove_tmp:bool=True):
+        """
+        client가 보낸 custom input 중 /upload로 임시 저장된 파일을 ComfyUI 서버에 업로드하고,
+        prompt 파싱에 사용할 custom input으로 변환합니다.
+        input 폴더가 등록된 서버라면 업로드 대신 input 폴더에 파일을 직접 둡니다.
+
+        Args:
+            data (dict): client가 보낸 custom input입니다.
+            server_address (str): 파일을 업로드할 ComfyUI 서버 주소입니다.
+            uploaded (dict, optional): (임시 파일명, 서버 주소)를 키로 업로드 결과 경로를 보관합니다. 같은 서버에 같은 파일을 중복 업로드하지 않습니다.
+            remove_tmp (bool, optional): 업로드 후 임시 파일을 삭제할지 여부입니다. 기본값은 True입니다.
+
+        Returns:
+            dict: parse_workflow_prompt에 전달할 custom input입니다.
+        """
+        if uploaded is None:
+            uploaded = {}
+
+        kwargs = {}
+        for key, value in data.items():
+            # client가 보낸 custom input의 파일명을 업로드 저장소에서 탐색합니다.
+            if UploadStore.is_handle(value):
+                if (value, server_address) in uploaded:
+                    kwargs[key] = uploaded[(value, server_address)]
+                    continue
+
+                try:
+                    entry = self.upload_store.get(value)
+                except KeyError as e:
+                    raise ValueError(e.args[0])
+                # MIME 타입은 업로드할 때 검사한 값을 사용합니다.
+                tmp_path = self.upload_store.path(value)
+                extension = entry.extension
+
+                input_dir = self.input_dirs.get(server_address, None)
+                if input_dir is not None:
+                    # 파일시스템을 공유하는 서버에는 파일을 직접 둡니다. 임시 파일이 더 필요 없다면 옮깁니다.
+                    upload_result, method = stage_input_file(input_path=tmp_path,
+                                                             file_name=os.path.basename(tmp_path)+extension,
+                                                             input_dir=input_dir,
+                                                             move=remove_tmp)
+                    logging.debug(f"[UPLOAD] STAGED / {method} / {upload_result['name']} / {server_address}")
+                else:
+                    # 존재할 경우 할당된 ComfyUI서버에 업로드합니다.
+                    upload_result = upload_image(input_path=tmp_path,
+                                                file_name=os.path.basename(tmp_path)+extension,
+                                                server_address=server_address)
+                kwargs[key] = os.path.join(upload_result["subfolder"], upload_result["name"])
+                uploaded[(value, server_address)] = kwargs[key]
+
+                if remove_tmp == True:
+                    # 업로드 후 임시 파일을 삭제합니다.
+                    self.upload_store.remove(value)
+            else:
+                kwargs[key] = value
+        return kwargs
+
+    async def generate_batch(self, request):
+        """
+        하나의 워크플로우를 여러 parameter set으로 실행하고, 결과물을 하나의 스트리밍 응답으로 반환합니다.
+        parameter set은 'inputs' 목록과 'sweep'의 cartesian product로 펼쳐지며, 대기열이 적은 ComfyUI 서버부터 분산되어 병렬로 실행됩니다.
+
+        Args:
+            request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로 받으며,
+                'workflow', 'base', 'inputs', 'sweep'을 포함한 JSON을 본문으로 받습니다.
+
+        Returns:
+            web.StreamResponse: HTTP 응답 객체입니다. parameter set이 완료될 때마다 결과물을 한 줄의 JSON(ndjson)으로 전송합니다.
+        """
+        if self.draining == True:
+            return self._draining_response()
+        data = await request.json()
+        sid = request.rel_url.query.get('clientId', None)
+        if not isinstance(sid, str): raise TypeError(f"clientId is required and must be and str, but got {type(sid).__str__()}")
+
+        workflow_alias = data.pop("workflow", None)
+        if not isinstance(workflow_alias, str): raise TypeError(f"workflow is required and must be and str, but got {type(workflow_alias).__str__()}")
+        workflow = self.wf_alias_map[workflow_alias]
+
+        parameter_sets = expand_parameter_sets(base=data.get("base", None),
+                                               inputs=data.get("inputs", None),
+                                               sweep=data.get("sweep", None))
+        if len(parameter_sets) > self.batch_max_size:
+            raise ValueError(f"batch size must be less than or equal to {self.batch_max_size} but got {len(parameter_sets)}")
+
+        # 스트리밍을 시작하기 전에 모든 parameter set의 타입을 검사합니다.
+        for parameter_set in parameter_sets:
+            parse_workflow_prompt(os.path.join(self.wf_dir, workflow),
+                                  tracing_mime_types=self.validator.ALLOWED_MIME_TYPES,
+                                  **parameter_set)
+
+        priority = data.get("priority", "normal")
+        if priority not in self.priority_classes: raise ValueError(f"priority must be one of {self.priority_classes} but got '{priority}'")
+        try:
+            self.scheduler.check_admission(len(parameter_sets))
+        except QueueFullError as e:
+            return self._queue_full_response(e)
+
+        server_addresses = await self._assign_batch_servers(len(parameter_sets), workflow_alias)
+        logging.info(f"[POST] '{request.path}' / {len(parameter_sets)} jobs / {sid}")
+
+        # 같은 파일은 서버마다 한 번만 업로드하고, 임시 파일은 배치가 끝난 뒤 삭제합니다.
+        uploaded = {}
+        jobs = []
+        try:
+            for idx, (parameter_set, server_address) in enumerate(zip(parameter_sets, server_addresses)):
+                kwargs = await asyncio.to_thread(self._upload_inputs, parameter_set, server_address, uploaded, False)
+                job = Job(sid=f"{sid}_{idx}",
+                          server_address=server_address,
+                          prompt=None,
+                          owner=get_client_ip(request, self.trusted_proxies),
+                          priority=priority,
+                          workflow=workflow_alias,
+                          notify=False)
+                jobs.append(asyncio.create_task(self._run_batch_job(job, idx, workflow, parameter_set, kwargs, uploaded)))
+
+            response = web.StreamResponse(status=200, headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            for job in asyncio.as_completed(jobs):
+                result = await job
+                await response.write((json.dumps(result)+"\n").encode('utf-8'))
+            await response.write((json.dumps({"status":"closed", "detail":f"batch is done / {len(jobs)}"})+"\n").encode('utf-8'))
+            await response.write_eof()
+        finally:
+            # client와 연결이 끊기면 남은 작업을 취소합니다.
+            for job in jobs:
+                job.cancel()
+            for tmp_name in set(value for value, _ in uploaded.keys()):
+                self.upload_store.remove(tmp_name)
+
+        return response
+
+    async def _run_batch_job(self, job:Job, idx, workflow, parameter_set, kwargs, uploaded):
+        """
+        배치의 parameter set 하나를 bridge server의 대기열을 거쳐 ComfyUI 서버에서 실행하고 결과물을 수집합니다.
+
+        Args:
+            job (Job): prompt를 제외한 작업 정보입니다. ComfyUI 서버가 할당되어 있어야 합니다.
+            idx (int): parameter set의 순번입니다.
+            workflow (str): 워크플로우 파일 이름입니다.
+            parameter_set (dict): client가 보낸 parameter set입니다. 결과물의 태그로 사용됩니다.
+            kwargs (dict): 파일 업로드가 반영된 custom input입니다.
+            uploaded (dict): 배치에서 공유하는 업로드 결과입니다. 장애 조치로 다른 서버에 다시 업로드할 때 사용합니다.
+
+        Returns:
+            dict: parameter set과 실행 상태, base64로 인코딩된 결과물을 담은 사전입니다.
+        """
+        result = {"index": idx, "params": parameter_set}
+        job_sid = job.sid
+        try:
+            make_prompt = lambda kwargs: parse_workflow_prompt(os.path.join(self.wf_dir, workflow),
+                                                               tracing_mime_types=self.validator.ALLOWED_MIME_TYPES,
+                                                               **kwargs)
+            job.prompt = make_prompt(kwargs)
+            self.scheduler.submit(job)
+            history, server_address, prompt_id = await self._wait_with_failover(job, parameter_set, uploaded, make_prompt)
+
+            # generation count 업데이트
+            self.state_obj.generation_count += 1
+            await self.state_obj.update()
+
+            self.scheduler.complete(job_sid)
+            self._mark_job_done(job)
+            await self._record_execution_time(server_address, job.workflow, get_execution_seconds(history))
+            output = history["outputs"]
+            if isinstance(output, tuple):
+                output = output[0]
+            files = await self._collect_outputs(output, server_address)
+            await asyncio.to_thread(delete_history, prompt_id, server_address)
+            self._record_usage(job_sid, job, parameter_set, get_execution_seconds(history), files)
+
+            result["status"] = "done"
+            result["files"] = [{
+                'file_name': file_name,
+                'content_type': content_type,
+                'content': await self.executor.run(encode_byte_base64, await self._read_file_content(file_content)),
+            } for file_name, file_content, content_type in files]
+        except asyncio.CancelledError:
+            self.scheduler.cancel(job_sid)
+            if job.prompt_id is not None:
+                # 실행되지 않은 prompt는 대기열에서 제거합니다. 다른 세션을 막지 않도록 스레드에서 실행하고, 취소되어도 끝까지 제거합니다.
+                try:
+                    await asyncio.shield(asyncio.to_thread(delete_queue, [job.prompt_id], job.server_address))
+                except Exception as e:
+                    logging.debug(f"[BATCH] DELETE QUEUE FAILED / {e} / {job_sid}")
+            raise
+        except Exception as e:
+            self.scheduler.complete(job_sid, success=False)
+            logging.error(f"[BATCH] JOB FAILED / {e} / {job_sid}")
+            result["status"] = "error"
+            result["detail"] = f"{e}"
+        return result
+
+    async def _join_dynamic_batch(self, request, sid:str, workflow_alias:str, priority:str, data:dict):
+        """
+        요청을 같은 워크플로우의 묶음에 추가하고, 묶음이 대기열에 등록될 때까지 기다립니다.
+        업로드한 파일은 파일 내용의 해시로 비교하므로, 같은 파일을 따로 업로드한 요청도 함께 묶입니다.
+
+        Args:
+            request (Request): HTTP 요청 객체입니다.
+            sid (str): 소켓 ID입니다.
+            workflow_alias (str): 워크플로우 alias입니다.
+            priority (str): 우선순위 등급입니다.
+            data (dict): client가 보낸 custom input입니다.
+
+        Returns:
+            tuple or None: (대기 순번, batch 크기)입니다. 함께 묶인 요청이 없다면 None입니다.
+        """
+        kwargs = self._hash_upload_inputs(data)
+        # 묶이기 전에 custom input의 타입을 검사합니다. 묶인 요청들의 custom input은 모두 같으므로 prompt는 첫 번째 요청으로 파싱됩니다.
+        parse_workflow_prompt(os.path.join(self.wf_dir, self.wf_alias_map[workflow_alias]),
+                              tracing_mime_types=self.validator.ALLOWED_MIME_TYPES,
+                              **kwargs)
+        self.socket_manager[sid].wf_alias = workflow_alias
+        return await self.batcher.add(self.batcher.make_key(workflow_alias, priority, kwargs), sid, data, get_client_ip(request, self.trusted_proxies))
+
+    async def _submit_dynamic_batch(self, workflow_alias:str, priority:str, members:list):
+        """
+        DynamicBatcher가 모은 요청들을 batch 크기를 요청 수로 바꾼 하나의 prompt로 만들어 대기열에 등록합니다.
+        묶인 요청들의 custom input은 모두 같으므로 prompt는 첫 번째 요청의 custom input으로 파싱합니다.
+
+        Args:
+            workflow_alias (str): 워크플로우 alias입니다.
+            priority (str): 우선순위 등급입니다.
+            members (list): 묶인 요청(BatchMember) 목록입니다.
+
+        Returns:
+            int: 대기 순번입니다.
+
+        Raises:
+            QueueFullError: 대기열이 가득 찬 경우 발생
+        """
+        self.scheduler.check_admission()
+        server_address = await self.get_not_busy_server_address(workflow_alias)
+
+        # 파일은 첫 번째 요청의 것만 업로드하고, 모든 요청의 임시 파일은 batch가 끝난 뒤 삭제합니다.
+        uploaded = {}
+        kwargs = await asyncio.to_thread(self._upload_inputs, members[0].data, server_address, uploaded, False)
+        job = Job(sid=f"batch_{uuid.uuid4().hex}",
+                  server_address=server_address,
+                  prompt=self._make_batch_prompt(workflow_alias, kwargs, len(members)),
+                  owner=members[0].owner,
+                  priority=priority,
+                  workflow=workflow_alias,
+                  notify=False)
+        position = self.scheduler.submit(job)
+        asyncio.create_task(self._run_dynamic_batch(job, members, uploaded))
+
+        # generation count 업데이트
+        self.state_obj.generation_count += len(members)
+        await self.state_obj.update()
+        return position
+
+    def _make_batch_prompt(self, workflow_alias:str, kwargs:dict, batch_size:int):
+        """
+        custom input으로 prompt를 파싱하고 batch 크기를 바꿉니다.
+
+        Args:
+            workflow_alias (str): 워크플로우 alias입니다.
+            kwargs (dict): 파일 업로드가 반영된 custom input입니다.
+            batch_size (int): batch 크기입니다.
+
+        Returns:
+            dict: ComfyUI에서 실행 가능한 prompt입니다.
+        """
+        prompt = parse_workflow_prompt(os.path.join(self.wf_dir, self.wf_alias_map[workflow_alias]),
+                                       tracing_mime_types=self.validator.ALLOWED_MIME_TYPES,
+                                       **kwargs)
+        node_id, input_key = self.batcher.batch_size_input(workflow_alias)
+        if node_id not in prompt:
+            raise ValueError(f"batch size input '{node_id}/{input_key}' is not in workflow '{workflow_alias}'")
+        prompt[node_id]["inputs"][input_key] = batch_size
+        return prompt
+
+    async def _run_dynamic_batch(self, job:Job, members:list, uploaded:dict):
+        """
+        묶인 요청들의 prompt가 끝날 때까지 기다린 뒤, 결과물을 요청 순서대로 나눠 각 client id에 할당합니다.
+        결과물은 캐시된 결과물과 같이 [GET] history로 가져갑니다.
+
+        Args:
+            job (Job): 대기열에 등록한 batch 작업입니다.
+            members (list): 묶인 요청(BatchMember) 목록입니다.
+            uploaded (dict): 첫 번째 요청의 업로드 결과입니다. 장애 조치로 다른 서버에 다시 업로드할 때 사용합니다.
+        """
+        notify_task = asyncio.create_task(self._notify_batch_members(job, members))
+        try:
+            make_prompt = lambda kwargs: self._make_batch_prompt(job.workflow, kwargs, len(members))
+            history, server_address, prompt_id = await self._wait_with_failover(job, members[0].data, uploaded, make_prompt)
+            # batch의 실행 시간은 요청 하나의 실행 시간과 다르므로 EWMA에 기록하지 않습니다.
+            self.scheduler.complete(job.sid)
+            self._mark_job_done(job)
+
+            output = history["outputs"]
+            if isinstance(output, tuple):
+                output = output[0]
+            execution_seconds = get_execution_seconds(history)
+            for member, member_output in zip(members, split_outputs(output, len(members))):
+                files = await self._collect_outputs(member_output, server_address)
+                # batch의 실행 시간은 묶인 요청들이 똑같이 나눠 사용한 것으로 기록합니다.
+                self._record_usage(member.sid, job, member.data,
+                                   execution_seconds / len(members) if execution_seconds is not None else None, files, owner=member.owner)
+                # 같은 prompt를 기다리는 client id들에도 같은 결과물을 할당합니다.
+                await self._land_flight(member.sid, files)
+                param_manager = self.socket_manager.sid_param_map.get(member.sid, None)
+                if param_manager is None:
+                    # 리소스가 해제된 client에는 할당하지 않습니다.
+                    continue
+                param_manager.result_files = files
+                await self.socket_manager.async_send_json(member.sid, {'status': 'closed', 'detail': 'Execution is done'})
+                if param_manager.sockets_req is not None:
+                    # ComfyUI 서버의 메시지를 기다리는 추적을 종료합니다.
+                    await param_manager.sockets_req.close()
+            await asyncio.to_thread(delete_history, prompt_id, server_address)
+            logging.info(f"[BATCHER] DONE / {job.workflow} / {len(members)} / {job.sid}")
+        except Exception as e:
+            self.scheduler.complete(job.sid, success=False)
+            logging.error(f"[BATCHER] JOB FAILED / {e} / {job.sid}")
+            for member in members:
+                await self._abort_flight(member.sid, "execution is failed")
+                if member.sid in self.socket_manager.sid_param_map:
+                    await self.socket_manager.async_send_json(member.sid, {"status":"error", "detail":f"execution is failed / {e}"})
+        finally:
+            notify_task.cancel()
+            for tmp_name in set(value for value, _ in uploaded.keys()):
+                self.upload_store.remove(tmp_name)
+            for member in members:
+                self._remove_tmp_inputs(member.data)
+
+    async def _notify_batch_members(self, job:Job, members:list):
+        """
+        batch로 묶인 client들에게 주기적으로 대기 순번과 남은 시간을 알립니다.
+        batch 작업의 소켓 ID는 client의 것이 아니므로 스케줄러가 대신 알리지 않습니다.
+
+        Args:
+            job (Job): 대기열에 등록한 batch 작업입니다.
+            members (list): 묶인 요청(BatchMember) 목록입니다.
+        """
+        while True:
+            position = self.scheduler.position(job.sid) or 0
+            expected_seconds = max(self.execution_stats.expected(job.server_address, job.workflow), 1.0)
+            if position > 0:
+                eta = (self.scheduler.expected_wait(job.sid, self.execution_stats.expected) or 0.0) + expected_seconds
+                message = {"status":"queued", "detail":f"position / {position}", "eta":round(eta, 1), "position":position}
+            else:
+                elapsed = time.time() - job.dispatched_at if job.dispatched_at is not None else 0.0
+                message = {"status":"progress", "detail":f"{min(elapsed/expected_seconds, 0.99)*100:.2f}%", "eta":round(max(expected_seconds - elapsed, 0.0), 1), "position":0}
+            for member in members:
+                if member.sid in self.socket_manager.sid_param_map:
+                    await self.socket_manager.async_send_json(member.sid, message)
+                await self._forward_to_followers(member.sid, message)
+            await asyncio.sleep(self.timeout_interval)
+
+    async def _wait_with_failover(self, job:Job, parameter_set:dict, uploaded:dict, make_prompt):
+        """
+        대기열에 등록한 작업이 ComfyUI 서버에서 끝날 때까지 기다립니다.
+        ComfyUI 서버에 장애가 발생하면 다른 서버에 입력 파일을 다시 업로드하고 prompt를 다시 파싱하여 작업을 옮깁니다.
+
+        Args:
+            job (Job): 대기열에 등록한 작업입니다.
+            parameter_set (dict): client가 보낸 custom input입니다.
+            uploaded (dict): 공유하는 업로드 결과입니다.
+            make_prompt (Callable): 파일 업로드가 반영된 custom input을 받아 prompt를 반환하는 함수입니다.
+
+        Returns:
+            tuple: (history, 작업을 실행한 ComfyUI 서버 주소, prompt_id)
+        """
+        while True:
+            server_address = job.server_address
+            try:
+                prompt_id = await self._wait_for_dispatch(job)
+                history = await self._wait_for_outputs(prompt_id, server_address)
+                return history, server_address, prompt_id
+            except Exception as e:
+                if not is_connection_error(e) or job.retries >= self.failover_max_retries:
+                    raise
+                # ComfyUI 서버 장애. 다른 서버로 작업을 옮깁니다.
+                self.health.record_failure(server_address, e)
+                new_server_address = await self.get_not_busy_server_address(job.workflow, exclude=[server_address])
+                kwargs = await asyncio.to_thread(self._upload_inputs, parameter_set, new_server_address, uploaded, False)
+                self.scheduler.reassign(job, new_server_address, make_prompt(kwargs))
+                logging.warning(f"[FAILOVER] {server_address} -> {new_server_address} / retry {job.retries} / {job.sid}")
+
+    async def _wait_for_dispatch(self, job:Job):
+        """
+        대기열의 작업이 ComfyUI 서버에 등록될 때까지 기다립니다.
+
+        Args:
+            job (Job): 기다릴 작업입니다.
+
+        Returns:
+            str: ComfyUI가 할당한 prompt_id입니다.
+
+        Raises:
+            ConnectionError: 할당된 ComfyUI 서버가 장애로 제외된 경우 발생
+        """
+        while True:
+            done, _ = await asyncio.wait([job.dispatched], timeout=self.timeout_interval)
+            if len(done) > 0:
+                prompt_id = job.dispatched.result()
+                if prompt_id is None:
+                    raise job.error
+                return prompt_id
+            if not self.health.is_available(job.server_address):
+                raise ConnectionError(f"server is ejected / {job.server_address}")
+
+    async def _wait_for_outputs(self, prompt_id, server_address):
+        """
+        ComfyUI 서버에서 prompt의 실행이 끝날 때까지 기다린 후 history를 반환합니다.
+        prompt가 실행되지 않은 채로(대기열에 머물러 있거나 서버가 응답하지 않는 채로) limit_timeout_count * timeout_interval초가 지나면 실패로 봅니다.
+
+        Args:
+            prompt_id (str): ComfyUI의 prompt_id입니다.
+            server_address (str): prompt가 등록된 ComfyUI 서버 주소입니다.
+
+        Returns:
+            dict: prompt_id의 history입니다.
+
+        Raises:
+            RuntimeError: prompt가 실패했거나 시간이 초과된 경우 발생
+            ConnectionError: prompt가 history와 대기열 어디에도 없는 경우 발생. ComfyUI 서버가 재시작된 것으로 봅니다.
+        """
+        limit_seconds = self.limit_timeout_count * self.timeout_interval
+        deadline = time.time() + limit_seconds
+        try:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError()
+                history = (await asyncio.wait_for(asyncio.to_thread(get_history, prompt_id, server_address), remaining)).get(prompt_id, None)
+                if history is None:
+                    queue_state = await asyncio.wait_for(asyncio.to_thread(get_queue_state, server_address), max(deadline - time.time(), 0.001))
+                    queued_ids = [item[1] for cur in queue_state.values() for item in cur]
+                    if prompt_id not in queued_ids:
+                        # 대기열 확인 사이에 실행이 끝났을 수 있으므로 history를 다시 확인합니다.
+                        history = (await asyncio.to_thread(get_history, prompt_id, server_address)).get(prompt_id, None)
+                        if history is None:
+                            raise ConnectionError(f"prompt is lost in server / {prompt_id}")
+                    elif prompt_id in [item[1] for item in queue_state.get("queue_running", [])]:
+                        # 실행 중인 prompt는 오래 걸려도 기다립니다.
+                        deadline = time.time() + limit_seconds
+
+                if history is not None:
+                    if history.get("status", {}).get("status_str", None) == "error":
+                        raise RuntimeError(f"prompt execution failed / {prompt_id}")
+                    return history
+
+                await asyncio.sleep(self.timeout_interval)
+        except TimeoutError:
+            # 다른 서버로 옮기지 않고 실패로 알립니다. 대기열에 남은 prompt는 삭제합니다.
+            logging.warning(f"[SCHEDULER] PROMPT TIMED OUT / {limit_seconds}s / {prompt_id} / {server_address}")
+            try:
+                await asyncio.wait_for(asyncio.to_thread(delete_queue, [prompt_id], server_address), self.timeout_interval)
+            except Exception as e:
+                logging.debug(f"[SCHEDULER] DELETE QUEUE FAILED / {e} / {prompt_id}")
+            raise RuntimeError(f"prompt is timed out after {limit_seconds}s without running / {prompt_id}")
+
+    async def _assign_batch_servers(self, count, workflow:str=None):
+        """
+        배치 작업들을 예상 완료 시간에 따라 ComfyUI 서버에 분배합니다.
+
+        Args:
+            count (int): 분배할 작업의 수입니다.
+            workflow (str, optional): 실행할 워크플로우 alias입니다.
+
+        Returns:
+            list: 작업 순서대로 할당된 ComfyUI 서버 주소 목록입니다.
+        """
+        completion_times = await self._get_expected_completion_times(workflow)
+        if len(completion_times) == 0:
+            raise aiohttp.ServerConnectionError("There is no available ComfyUI server")
+
+        server_addresses = []
+        for _ in range(count):
+            server_address = min(completion_times, key=completion_times.get)
+            server_addresses.append(server_address)
+            completion_times[server_address] += self.execution_stats.expected(server_address, workflow)
+        return server_addresses
+
+    async def _collect_outputs(self, outputs, server_address, nodes:list=None):
+        """
+        ComfyUI history의 outputs에서 결과물을 가져오고 안전성 검사를 통과한 파일만 반환합니다.
+
+        Args:
+            outputs (dict): history의 outputs입니다.
+            server_address (str): 결과물을 가져올 ComfyUI 서버 주소입니다.
+            nodes (list, optional): 결과물을 가져올 출력 노드 ID 목록입니다. None이면 모든 출력 노드입니다.
+
+        Returns:
+            list: (파일 이름, 파일 내용, MIME 타입) 튜플 목록입니다. output 폴더가 등록된 서버라면 파일 내용 대신 로컬 경로(pathlib.Path)를 담습니다.
+        """
+        # 신뢰하는 서버의 결과물은 MIME 타입과 확장자만 검사합니다.
+        mime_only = self.output_trust.get(server_address, self.default_output_trust) == "mime"
+        output_dir = self.output_dirs.get(server_address, None)
+        if output_dir is not None:
+            try:
+                file_names, file_paths = await asyncio.to_thread(resolve_output_paths, outputs, output_dir, nodes)
+            except FileNotFoundError as e:
+                # 공유 파일시스템에 아직 반영되지 않았다면 HTTP로 가져옵니다.
+                logging.warning(f"[OUTPUT] LOCAL FILE NOT FOUND / {e} / {server_address}")
+            else:
+                files = []
+                for file_name, file_path in zip(file_names, file_paths):
+                    is_valid, detail_about = await self.validator.validate_local_file(file_path, file_name, mime_only=mime_only)
+                    if is_valid:
+                        files.append((file_name, pathlib.Path(file_path), detail_about))
+                    else:
+                        logging.debug(f"{detail_about} / {file_name}")
+                return files
+
+        file_names, file_contents = await asyncio.to_thread(process_outputs, outputs, server_address, nodes)
+
+        files = []
+        for file_name, file_content in zip(file_names, file_contents):
+            # 바이트 파일이 안전한지 임시 파일 없이 메모리에서 검사
+            is_valid, detail_about = await self.validator.validate_buffer(file_content, file_name, mime_only=mime_only)
+            if is_valid:
+                files.append((file_name, file_content, detail_about))
+            else:
+                logging.debug(f"{detail_about} / {file_name}")
+        return files
+
+    async def _transcode_files(self, files:list, options:dict):
+        """
+        결과물을 요청한 포맷, 품질, 크기로 변환합니다.
+
+        Args:
+            files (list): (파일 이름, 파일 내용, MIME 타입) 튜플 목록입니다.
+            options (dict): Transcoder.parse_options로 검사한 변환 옵션입니다. None이면 변환하지 않습니다.
+
+        Returns:
+            list: 변환된 (파일 이름, 파일 내용, MIME 타입) 튜플 목록입니다.
+        """
+        if options is None:
+            return files
+        return list(await asyncio.gather(*[self.transcoder.transcode(file_name, file_content, content_type, **options)
+                                           for file_name, file_content, content_type in files]))
+
+    async def _read_file_content(self, file_content):
+        """
+        결과물의 파일 내용을 bytes로 반환합니다. 로컬 경로라면 파일을 읽습니다.
+
+        Args:
+            file_content (bytes or pathlib.Path): 파일 내용 또는 로컬 경로입니다.
+
+        Returns:
+            bytes: 파일 내용입니다.
+        """
+        if isinstance(file_content, pathlib.Path):
+            return await self.executor.run(file_content.read_bytes)
+        return file_content
+
+    async def upload(self, request):
+        """
+        파일을 bridge server의 /temp/경로에 임시로 업로드합니다.
+        임시 저장된 파일은 안전성 검사를 거칩니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로 받습니다.
+            
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 업로드된 파일의 이름을 포함하는 JSON 응답을 반환합니다.
+        """
+        sid = request.rel_url.query.get('clientId', None)
+        if not isinstance(sid, str): raise TypeError(f"clientId is required and must be and str, but got {type(sid).__str__()}")
+
+        if self.socket_manager[sid].linked_server is None:
+            # sid가 제출된 적이 없다면, REST 통신. 여기서 ComfyUI 서버 할당
+            server_address = await self.get_not_busy_server_address()
+            self.socket_manager[sid].linked_server = server_address
+        
+        reader= await request.multipart()
+        logging.info(f"[POST] '{request.path}'")
+
+        fns={}
+        async for part in reader:
+
+            try:
+                file_identifier = part.name
+                file_name = os.path.basename(part.filename)
+                file_data = await part.read()
+
+                # 바이트 파일이 안전한지 검사. 검사를 통과한 파일만 업로드 저장소에 씁니다.
+                is_valid, detail_about = await self.validator.validate_buffer(file_data, file_name)
+
+                if is_valid == True:
+                    if "image" in detail_about:
+                        # 이미지 일 때 valid
+                        pass
+                    elif "video" in detail_about:
+                        # 비디오 일 때 valid
+                        pass
+                    # TODO: 더 많은 타입을 허락해야 함
+                    else:
+                        # 그 외 금지
+                        raise TypeError(f"{detail_about} is not allowed type / {file_name}")
+                else:
+                    # 안전하지 않다면 에러발생
+                    raise TypeError(f"{detail_about} / {file_name}")
+                
+                entry = await self.executor.run(self.upload_store.put, file_data, file_name, detail_about, self.validator.mime_extension_map[detail_about], sid)
+                fns[file_identifier] = entry.handle
+                logging.debug(f"[POST] '{request.path}' / {file_name} saved / {sid}")
+
+            except UploadQuotaError as e:
+                logging.error(f"[POST] '{request.path}' / {file_name} can't save / {e} / {sid}")
+                self._remove_tmp_inputs(fns)
+                return self._upload_quota_response(e)
+
+            except Exception as e:
+                logging.error(f"[POST] '{request.path}' / {file_name} can't save / {e} / {sid}")
+
+                self._remove_tmp_inputs(fns)
+                return web.Response(
+                    status=400,
+                    body=json.dumps({"detail":f"{file_name} can't save / {e}"}),
+                    headers={"Content-Type": "application/json"}
+                )
+
+        return web.Response(
+            status=200,
+            body=json.dumps(fns),
+            headers={"Content-Type": "application/json"}
+        )
+        
+    async def create_resumable_upload(self, request):
+        """
+        이어받을 수 있는 업로드를 만듭니다. client는 발급받은 uploadId로 청크를 나눠 보냅니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로,
+                파일 식별자(name), 원본 파일 이름(fileName), 파일 크기(size)를 JSON body로 받습니다.
+            
+        Returns:
+            web.Response: HTTP 응답 객체입니다. uploadId와 청크 최대 크기를 포함하는 JSON 응답을 반환합니다.
+        """
+        sid = request.rel_url.query.get('clientId', None)
+        if not isinstance(sid, str): raise TypeError(f"clientId is required and must be and str, but got {type(sid).__str__()}")
+        data = await request.json()
+        logging.info(f"[POST] '{request.path}'")
+
+        try:
+            session = self.resumable_uploads.create(sid=sid,
+                                                    name=data.get("name", "file"),
+                                                    file_name=data["fileName"],
+                                                    size=int(data["size"]))
+        except UploadQuotaError as e:
+            logging.error(f"[POST] '{request.path}' / can't create upload / {e} / {sid}")
+            return self._upload_quota_response(e)
+        except (KeyError, ValueError) as e:
+            logging.error(f"[POST] '{request.path}' / can't create upload / {e} / {sid}")
+            return web.Response(
+                status=400,
+                body=json.dumps({"detail":f"can't create upload / {e}"}),
+                headers={"Content-Type": "application/json"}
+            )
+
+        return web.Response(
+            status=201,
+            body=json.dumps({"uploadId": session.upload_id, "offset": session.offset, "chunkMaxSize": self.upload_chunk_max_size}),
+            headers={"Content-Type": "application/json", "Upload-Offset": str(session.offset)}
+        )
+
+    async def get_resumable_upload(self, request):
+        """
+        이어받기 업로드의 현재 offset을 가져옵니다. 연결이 끊긴 client는 이 offset부터 다시 보냅니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 업로드 ID를 'uploadId' 쿼리 파라미터로 받습니다.
+            
+        Returns:
+            web.Response: HTTP 응답 객체입니다. offset과 파일 크기를 포함하는 JSON 응답을 반환합니다.
+        """
+        upload_id = request.rel_url.query.get('uploadId', None)
+        try:
+            session = self.resumable_uploads.get(upload_id)
+        except KeyError as e:
+            return web.Response(
+                status=404,
+                body=json.dumps({"detail":f"{e}"}),
+                headers={"Content-Type": "application/json"}
+            )
+
+        return web.Response(
+            status=200,
+            body=json.dumps({"uploadId": upload_id, "offset": session.offset, "size": session.size}),
+            headers={"Content-Type": "application/json", "Upload-Offset": str(session.offset)}
+        )
+
+    async def patch_resumable_upload(self, request):
+        """
+        이어받기 업로드에 청크를 씁니다. 청크는 'Upload-Offset' 헤더의 위치부터 이어 씁니다.
+        body는 메모리에 모으지 않고 받는 대로 파일에 쓰며, 받는 동안 파일을 검사합니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 업로드 ID를 'uploadId' 쿼리 파라미터로, 청크의 바이트를 body로 받습니다.
+            
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 청크를 쓴 뒤의 offset을 포함하는 JSON 응답을 반환합니다.
+        """
+        upload_id = request.rel_url.query.get('uploadId', None)
+        offset = int(request.headers.get('Upload-Offset', -1))
+
+        try:
+            offset = await self.resumable_uploads.write(upload_id, offset, request.content)
+        except KeyError as e:
+            return web.Response(
+                status=404,
+                body=json.dumps({"detail":f"{e}"}),
+                headers={"Content-Type": "application/json"}
+            )
+        except UploadOffsetError as e:
+            return web.Response(
+                status=409,
+                body=json.dumps({"detail":f"{e}", "offset": e.offset}),
+                headers={"Content-Type": "application/json", "Upload-Offset": str(e.offset)}
+            )
+        except ValueError as e:
+            logging.error(f"[PATCH] '{request.path}' / upload is rejected / {e} / {upload_id}")
+            return web.Response(
+                status=400,
+                body=json.dumps({"detail":f"upload is rejected / {e}"}),
+                headers={"Content-Type": "application/json"}
+            )
+        except (ConnectionResetError, aiohttp.ClientPayloadError) as e:
+            # 받은 곳까지 offset이 남아 있으므로 client는 다시 연결하여 이어 보냅니다.
+            logging.warning(f"[PATCH] '{request.path}' / connection lost at {self.resumable_uploads.get(upload_id).offset} / {e} / {upload_id}")
+            raise
+
+        return web.Response(
+            status=200,
+            body=json.dumps({"uploadId": upload_id, "offset": offset}),
+            headers={"Content-Type": "application/json", "Upload-Offset": str(offset)}
+        )
+
+    async def finalize_resumable_upload(self, request):
+        """
+        모든 청크를 받은 이어받기 업로드를 완료합니다. [POST] upload와 같은 형식의 응답을 반환하며,
+        발급된 파일 이름은 generate-based-workflow의 custom input으로 사용할 수 있습니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 업로드 ID를 'uploadId' 쿼리 파라미터로 받습니다.
+            
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 파일 식별자 -> 임시 파일 이름의 JSON 응답을 반환합니다.
+        """
+        upload_id = request.rel_url.query.get('uploadId', None)
+        try:
+            session = self.resumable_uploads.finalize(upload_id)
+        except KeyError as e:
+            return web.Response(
+                status=404,
+                body=json.dumps({"detail":f"{e}"}),
+                headers={"Content-Type": "application/json"}
+            )
+        except UploadOffsetError as e:
+            return web.Response(
+                status=409,
+                body=json.dumps({"detail":f"upload is not completed / {e}", "offset": e.offset}),
+                headers={"Content-Type": "application/json", "Upload-Offset": str(e.offset)}
+            )
+
+        # 받은 파일을 업로드 저장소로 옮깁니다. 예약한 용량은 발급한 파일이 그대로 사용합니다.
+        try:
+            entry = await self.executor.run(self.upload_store.adopt,
+                                            session.part_path,
+                                            session.file_name,
+                                            session.mime_type,
+                                            self.validator.mime_extension_map[session.mime_type],
+                                            session.sid,
+                                            reserved_size=session.size)
+        except OSError:
+            self.upload_store.release(session.size)
+            if os.path.exists(session.part_path):
+                os.remove(session.part_path)
+            raise
+
+        if self.socket_manager[session.sid].linked_server is None:
+            # sid가 제출된 적이 없다면, REST 통신. 여기서 ComfyUI 서버 할당
+            server_address = await self.get_not_busy_server_address()
+            self.socket_manager[session.sid].linked_server = server_address
+        logging.debug(f"[POST] '{request.path}' / {session.file_name} saved / {session.sid}")
+
+        return web.Response(
+            status=200,
+            body=json.dumps({session.name: entry.handle}),
+            headers={"Content-Type": "application/json"}
+        )
+
+    async def get_history(self, request):
+        """
+        client id에 할당된 ComfyUI 서버의 history를 가져옵니다.
+        ComfyUI가 보낸 파일을 안전성 검사합니다.
+        실행이 끝난 후, 해당 client id의 life cycle이 끝났다고 판단하여 모든 리소스를 해제합니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로 받습니다.
+                resType이 file이면 'index' 쿼리 파라미터로 받은 결과물 하나만 반환하고, 마지막 결과물을 반환한 뒤 리소스를 해제합니다.
+                'format', 'quality', 'maxSize' 쿼리 파라미터로 결과물 이미지를 변환하고, 'nodes' 쿼리 파라미터(쉼표로 구분)로 가져올 출력 노드를 고릅니다.
+                'wait' 쿼리 파라미터(초)를 받으면 결과물이 준비될 때까지 최대 그 시간만큼 기다린 뒤 응답합니다.
+            
+        Returns:
+            web.Response: HTTP 응답 객체입니다. ComfyUI 서버의 히스토리를 포함하는 멀티파트 HTTP 응답을 반환합니다.
+        """
+        
+        sid = request.rel_url.query.get('clientId', None)
+        res_type = request.rel_url.query.get('resType', "multipart")
+        index = int(request.rel_url.query.get('index', 0))
+        wait = float(request.rel_url.query.get('wait', 0))
+        if not isinstance(sid, str): raise TypeError(f"clientId is must be str, but got {type(sid).__str__()}")
+        if res_type not in ("multipart", "base64", "file"): raise ValueError(f"resType is must be [multipart, base64, file] but got {res_type}")
+        if wait < 0: raise ValueError(f"wait is must be positive, but got {wait}")
+        nodes = request.rel_url.query.get('nodes', None)
+        nodes = [node.strip() for node in nodes.split(",") if node.strip()] if nodes is not None else None
+        transcode_options = Transcoder.parse_options(image_format=request.rel_url.query.get('format', None),
+                                                     quality=request.rel_url.query.get('quality', None),
+                                                     max_size=request.rel_url.query.get('maxSize', None))
+
+        if wait > 0:
+            await self._wait_for_result(sid, min(wait, self.limit_timeout_count * self.timeout_interval))
+
+        param_manager = self.socket_manager[sid]
+        if param_manager.result_files is None and param_manager.linked_server is None:
+            return web.Response(
+                status=204,
+                body=json.dumps({"detail":f"The client ID has not been submitted to the server before. It is not recognized. / {sid}"}),
+                headers={"Content-Type": "application/json"}
+            )
+
+        files = await self._load_result_files(sid, nodes)
+        logging.debug(f"[GET] '{request.path}' / GET HISTORY / {sid}")
+        if files is None:
+            return web.Response(
+                status=204,
+                body=json.dumps({"detail":f"No contents with that client id / {sid}"}),
+                headers={"Content-Type": "application/json"}
+            )
+
+        if res_type == "file":
+            return await self._serve_result_file(sid, files, index, transcode_options)
+
+        files = await self._transcode_files(files, transcode_options)
+
+        if res_type == "multipart":
+            data = aiohttp.FormData()
+        elif res_type == "base64":
+            encoded_files = []
+
+        for idx, (file_name, file_content, content_type) in enumerate(files):
+            if res_type == "multipart":
+                # 로컬 파일은 메모리에 올리지 않고 응답에 그대로 흘려보냅니다.
+                data.add_field(
+                    f'result_{idx}',
+                    file_content.open(mode="rb") if isinstance(file_content, pathlib.Path) else file_content,
+                    content_type=content_type,
+                    filename=file_name,
+                )
+            elif res_type == "base64":
+                encoded_file = await self.executor.run(encode_byte_base64, await self._read_file_content(file_content))
+                encoded_files.append({
+                    'file_name': file_name,
+                    'content_type': content_type,
+                    'content': encoded_file,
+                })
+
+        # client id life cycle is over. release all resources
+        asyncio.create_task(self.socket_manager.async_delete(sid))
+        logging.debug(f"[GET] '{request.path}' / DELETE HISTORY / {sid}")
+
+        if res_type == "multipart":
+            multipart = data()
+            headers = {"Content-Type": multipart.content_type}
+            return web.Response(
+                status=200,
+                body=multipart,
+                headers=headers
+            )
+        else:
+            headers = {"Content-Type": "application/json"}
+            return web.Response(
+                status=200,
+                body=json.dumps({'files': encoded_files}),
+                headers=headers
+            )
+
+    async def _load_result_files(self, sid:str, nodes:list=None):
+        """
+        client id의 결과물을 가져옵니다. 캐시되었거나 함께 받은 결과물은 ComfyUI 서버를 거치지 않고, 그 외에는 history에서 가져와 검사한 뒤 결과물 캐시에 저장합니다.
+
+        Args:
+            sid (str): client id
+            nodes (list, optional): 결과물을 가져올 출력 노드 ID 목록입니다. None이면 모든 출력 노드입니다.
+
+        Returns:
+            list or None: (파일 이름, 파일 내용, MIME 타입) 튜플 목록. history가 없다면 None
+        """
+        param_manager = self.socket_manager[sid]
+        if param_manager.result_files is not None:
+            self._flush_usage(sid, param_manager.result_files)
+            return param_manager.result_files
+
+        server_address = param_manager.linked_server
+        prompt_id = param_manager.comfyui_prompt_id
+        history = await asyncio.to_thread(get_history, prompt_id, server_address)
+        history = history.get(prompt_id, None)
+        if history is None:
+            return None
+
+        output = history["outputs"]
+        if isinstance(output, tuple):
+            output = output[0]
+        files = await self._collect_outputs(output, server_address, nodes)
+
+        if self.result_cache is not None and param_manager.cache_key is not None and nodes is None:
+            # 일부 출력 노드만 가져온 결과물은 캐시하지 않습니다.
+            await self.result_cache.put(param_manager.cache_key, files)
+        self._flush_usage(sid, files)
+        return files
+
+    async def _deliver_on_completion(self, sid:str, workflow_alias:str, callback:str, callback_type:str):
+        """
+        client id의 작업이 끝나면 결과를 callback URL로 보낼 webhook을 전송 대기열에 추가하고 리소스를 해제합니다.
+        결과물을 가져오지 못했다면(실패, 만료 포함) 결과물 없이 실패를 알립니다.
+
+        Args:
+            sid (str): client id
+            workflow_alias (str): 워크플로우 alias
+            callback (str): callback URL
+            callback_type (str): json이면 base64로 인코딩한 결과물을 JSON에 담고, multipart면 결과물 파일을 함께 보냅니다.
+        """
+        queue = self.socket_manager.subscribe(sid)
+        message = None
+        try:
+            while True:
+                param_manager = self.socket_manager.sid_param_map.get(sid, None)
+                if param_manager is None:
+                    message = {"status":"error", "detail":"client id is expired"}
+                    break
+                if param_manager.result_files is not None:
+                    message = {"status":"closed", "detail":"Execution is done"}
+                    break
+                message = message or param_manager.execution_info or {}
+                if message.get("status", None) in ("closed", "error"):
+                    break
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=self.timeout_interval)
+                except asyncio.TimeoutError:
+                    message = None
+
+            files = None
+            if message.get("status", None) != "error":
+                try:
+                    files = await self._load_result_files(sid)
+                except Exception as e:
+                    logging.error(f"[WEBHOOK] COLLECT FAILED / {e} / {sid}")
+        finally:
+            self.socket_manager.unsubscribe(sid, queue)
+
+        payload = {
+            "event": "generation.completed" if files is not None else "generation.failed",
+            "clientId": sid,
+            "workflow": workflow_alias,
+            "status": "closed" if files is not None else "error",
+            "detail": "Execution is done" if files is not None else message.get("detail", "No contents with that client id"),
+            "files": [],
+        }
+        contents = []
+        for file_name, file_content, content_type in files or []:
+            content = await self._read_file_content(file_content)
+            contents.append((file_name, content, content_type))
+            file_info = {
+                "file_name": file_name,
+                "content_type": content_type,
+                "size": len(content),
+                "sha256": (await self.executor.run(hashlib.sha256, content)).hexdigest(),
+            }
+            if callback_type == "json":
+                file_info["content"] = await self.executor.run(encode_byte_base64, content)
+            payload["files"].append(file_info)
+
+        try:
+            self.webhooks.enqueue(WebhookDelivery(url=callback,
+                                                  payload=payload,
+                                                  files=contents if callback_type == "multipart" else None))
+        except WebhookQueueFullError as e:
+            logging.error(f"[WEBHOOK] DROPPED / {e} / {sid}")
+        # client가 history를 가져가지 않으므로 여기서 client id의 life cycle을 끝냅니다.
+        asyncio.create_task(self.socket_manager.async_delete(sid))
+
+    def _is_result_ready(self, sid:str):
+        # 결과물이 준비되었거나 작업이 끝났다면(실패 포함) 더 기다리지 않습니다. 등록한 작업이 없어도 기다리지 않습니다.
+        param_manager = self.socket_manager[sid]
+        execution_info = param_manager.execution_info
+        return param_manager.result_files is not None \
+            or execution_info is None \
+            or execution_info.get("status", None) in ("closed", "error")
+
+    async def _wait_for_result(self, sid:str, timeout:float):
+        """
+        client id의 작업이 끝나 결과물을 가져갈 수 있을 때까지 기다립니다. client에게 보내는 메시지를 구독하므로 polling하지 않습니다.
+
+        Args:
+            sid (str): client id
+            timeout (float): 최대 대기 시간(초)
+        """
+        queue = self.socket_manager.subscribe(sid)
+        deadline = time.time() + timeout
+        try:
+            while not self._is_result_ready(sid):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    logging.debug(f"[GET] HISTORY WAIT TIMEOUT / {timeout}s / {sid}")
+                    break
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
                     continue
+                if message.get("status", None) in ("closed", "error"):
+                    break
+        finally:
+            self.socket_manager.unsubscribe(sid, queue)
+
+    async def _serve_result_file(self, sid:str, files:list, index:int, transcode_options:dict=None):
+        """
+        결과물 하나를 반환합니다. 로컬 파일은 sendfile로 전송합니다.
+        나머지 결과물을 다시 가져오지 않도록 client id에 보관하고, 마지막 결과물을 반환한 뒤 리소스를 해제합니다.
+
+        Args:
+            sid (str): 소켓 ID입니다.
+            files (list): (파일 이름, 파일 내용, MIME 타입) 튜플 목록입니다.
+            index (int): 반환할 결과물의 순서입니다.
+            transcode_options (dict, optional): 결과물 변환 옵션입니다. None이면 변환하지 않습니다.
+
+        Returns:
+            web.StreamResponse: HTTP 응답 객체입니다.
+        """
+        if index < 0 or index >= len(files):
+            return web.Response(
+                status=404,
+                body=json.dumps({"detail":f"No result at index {index}, there are {len(files)} results / {sid}"}),
+                headers={"Content-Type": "application/json"}
+            )
+
+        self.socket_manager[sid].result_files = files
+        if index == len(files) - 1:
+            # client id life cycle is over. release all resources
+            asyncio.create_task(self.socket_manager.async_delete(sid))
+
+        file_name, file_content, content_type = (await self._transcode_files([files[index]], transcode_options))[0]
+        headers = {
+            "Content-Type": content_type,
+            "Content-Disposition": f'attachment; filename="{file_name}"',
+            "X-Result-Count": str(len(files)),
+        }
+        if isinstance(file_content, pathlib.Path):
+            return web.FileResponse(file_content, headers=headers)
+        return web.Response(status=200, body=file_content, headers=headers)
+
+    def drain(self, timeout:float=None):
+        """
+        새로운 작업을 받지 않고, 진행 중인 작업의 진행 상황과 결과물은 계속 제공하다가 모두 끝나면(또는 기한이 지나면) state 파일을 저장하고 stopped를 설정합니다.
+        이미 drain 중이라면 기한만 앞당깁니다.
+
+        Args:
+            timeout (float, optional): 진행 중인 작업을 기다릴 최대 시간(초). None이면 drain_timeout을 사용합니다.
+
+        Returns:
+            asyncio.Task: drain 작업
+        """
+        if self.drain_task is None:
+            self.draining = True
+            self.drain_started = time.time()
+            self.drain_deadline = self.drain_started + (self.drain_timeout if timeout is None else timeout)
+            self.drain_task = asyncio.create_task(self._drain())
+        elif timeout is not None:
+            self.drain_deadline = min(self.drain_deadline, time.time() + timeout)
+        return self.drain_task
+
+    def _drain_remaining(self):
+        # 끝나기를 기다려야 하는 작업 수. 결과물을 가져가지 않은 client id는 생명 주기가 끝나면 사라집니다.
+        return {
+            "jobs": len(self.scheduler.active_jobs()),
+            "batching": self.batcher.stats()["pending"] if self.batcher is not None else 0,
+            "clients": sum(param_manager.execution_info is not None for param_manager in self.socket_manager.sid_param_map.values()),
+            "webhooks": self.webhooks.pending() if self.webhooks is not None else 0,
+        }
+
+    async def _drain(self):
+        logging.warning(f"[DRAIN] START / deadline {round(self.drain_deadline - self.drain_started)}s / {self._drain_remaining()}")
+        try:
+            while True:
+                remaining = self._drain_remaining()
+                if sum(remaining.values()) == 0:
+                    logging.warning(f"[DRAIN] ALL WORK IS DONE / {round(time.time() - self.drain_started, 1)}s")
+                    break
+                if time.time() >= self.drain_deadline:
+                    logging.warning(f"[DRAIN] DEADLINE EXCEEDED / {remaining}")
+                    for job in self.scheduler.active_jobs():
+                        if job.notify == True:
+                            await self.socket_manager.async_send_json(job.sid, {"status":"error", "detail":"server is shutting down"})
+                    break
+                await asyncio.sleep(self.timeout_interval)
+            # 실행 시간 통계 등 메모리에만 있는 state를 저장합니다.
+            await self.state_obj.update()
+        except Exception as e:
+            logging.error(f"[DRAIN] FAILED / {e}")
+        finally:
+            self.stopped.set()
+
+    async def close(self):
+        """
+        drain이 끝난 뒤 bridge server가 사용하던 worker와 세션을 종료합니다.
+        """
+        if self.webhooks is not None:
+            await self.webhooks.close()
+        if self.usage is not None:
+            self.usage.close()
+        self.executor.shutdown()
+
+    def get_drain_info(self):
+        """
+        drain 진행 상황을 반환합니다.
+
+        Returns:
+            dict: drain 여부, 경과 시간, 남은 기한(초)과 끝나기를 기다리는 작업 수
+        """
+        if self.draining == False:
+            return {"draining": False}
+        return {
+            "draining": True,
+            "elapsed": round(time.time() - self.drain_started, 1),
+            "deadline": max(0, math.ceil(self.drain_deadline - time.time())),
+            "remaining": self._drain_remaining(),
+            "stopped": self.stopped.is_set(),
+        }
+
+    async def start_drain(self, request):
+        """
+        bridge server를 종료하기 위해 drain을 시작하는 메서드입니다. SIGTERM을 받은 것과 같습니다.
+        drain_allowed_ips에 있는 client만 호출할 수 있습니다.
+
+        Args:
+            request (Request): HTTP 요청 객체입니다. 기다릴 최대 시간(초)을 'timeout' 쿼리 파라미터로 받습니다.
+
+        Returns:
+            web.Response: HTTP 응답 객체입니다. drain 진행 상황을 나타내는 JSON 응답을 반환합니다.
+        """
+        if get_client_ip(request, self.trusted_proxies) not in self.drain_allowed_ips:
+            return web.Response(status=403, body=json.dumps({"detail":"drain is not allowed from this address"}), content_type="application/json")
+        timeout = request.rel_url.query.get('timeout', None)
+        timeout = float(timeout) if timeout is not None else None
+        if timeout is not None and timeout < 0: raise ValueError(f"timeout is must be positive, but got {timeout}")
+        self.drain(timeout)
+        return web.Response(status=202, body=json.dumps(self.get_drain_info()), content_type="application/json")
+
+    async def get_drain(self, request):
+        """
+        drain 진행 상황을 가져오는 메서드입니다.
+
+        Args:
+            request (Request): HTTP 요청 객체입니다.
+
+        Returns:
+            web.Response: HTTP 응답 객체입니다. drain 진행 상황을 나타내는 JSON 응답을 반환합니다.
+        """
+        if get_client_ip(request, self.trusted_proxies) not in self.drain_allowed_ips:
+            return web.Response(status=403, body=json.dumps({"detail":"drain is not allowed from this address"}), content_type="application/json")
+        return web.Response(status=200, body=json.dumps(self.get_drain_info()), content_type="application/json")
+
+    async def get_usage(self, request):
+        """
+        끝난 작업의 사용량을 시간 구간과 workflow, ComfyUI 서버, client 별로 집계하여 가져오는 메서드입니다.
+        usage_allowed_ips에 있는 client만 호출할 수 있습니다.
+
+        Args:
+            request (Request): HTTP 요청 객체입니다. 'from', 'to'(unix time), 'bucket'(초), 'groupBy'(쉼표로 구분) 쿼리 파라미터를 받습니다.
+
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 집계 결과를 나타내는 JSON 응답을 반환합니다.
+        """
+        if get_client_ip(request, self.trusted_proxies) not in self.usage_allowed_ips:
+            return web.Response(status=403, body=json.dumps({"detail":"usage is not allowed from this address"}), content_type="application/json")
+        if self.usage is None:
+            return web.Response(status=404, body=json.dumps({"detail":"usage ledger is disabled"}), content_type="application/json")
+
+        query = request.rel_url.query
+        start = float(query["from"]) if "from" in query else None
+        end = float(query["to"]) if "to" in query else None
+        bucket_seconds = int(query["bucket"]) if "bucket" in query else None
+        group_by = [cur.strip() for cur in query["groupBy"].split(",") if cur.strip()] if "groupBy" in query else None
+        usage = self.usage.query(start=start, end=end, bucket_seconds=bucket_seconds, group_by=group_by)
+        return web.Response(status=200, body=json.dumps(usage), content_type="application/json")
+
+    async def free_memory(self, request):
+        """
+        ComfyUI서버의 RAM, GPU 메모리를 해제합니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로 받습니다. 
+            주어지지 않을 경우 모든 ComfyUI서버의 메모리를 해제합니다.
+            각 ComfyUI서버 동작에는 큰 영향은 없습니다.
+            
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 서버 메모리 해제 완료 메시지를 반환합니다.
+        """
+        sid = request.rel_url.query.get('clientId', None)
+        if sid is not None:
+            param_manager = self.socket_manager.sid_param_map.get(sid, None)
+            if param_manager is None or param_manager.linked_server is None:
+                return web.Response(status=400, body=json.dumps({"detail":f"ComfyUI server is not allocated to the client ID / {sid}"}), content_type="application/json")
+            await asyncio.to_thread(post_free_memory, param_manager.linked_server)
+            freed_server_address = [param_manager.linked_server]
+        else:
+            # 서버마다 요청을 보내는 동안 다른 세션을 막지 않도록 스레드에서 동시에 실행합니다.
+            results = await asyncio.gather(*[asyncio.to_thread(post_free_memory, address) for address in self.server_address], return_exceptions=True)
+            freed_server_address = [address for address, result in zip(self.server_address, results) if not isinstance(result, Exception)]
+        for address in freed_server_address:
+            # 모델이 내려갔으므로 warmup 대상 워크플로우를 다시 불러옵니다.
+            self.warmup.mark_cold(address)
+            self.warmup.schedule(address)
         return web.Response(status=200, body=json.dumps({"detail":f"server memory free now / {sid if sid else "ALL"}"}), content_type="application/json")
     
     async def interrupt_generation(self, request):
@@ -604,6 +3010,13 @@ class BridgeServer():
         sid = request.rel_url.query.get('clientId', None)
         if not isinstance(sid, str): raise TypeError(f"clientId is required and must be str, but got {type(sid).__str__()}")
 
+        # 같은 prompt를 기다리는 client id가 남아 있다면 작업을 넘기고, 없다면 취소합니다.
+        if not await self._handoff_flight(sid):
+            self.scheduler.cancel(sid)
+            await self._abort_flight(sid, "execution is cancelled")
+        if sid in self.socket_manager.sid_param_map:
+            # 웹소켓을 닫을 때 장애로 보고 다른 서버로 옮기지 않도록 합니다.
+            self.socket_manager[sid].job = None
         await self.socket_manager.async_delete(sid)
         return web.Response(status=200, body=json.dumps({"detail":f"interrupted that clientId will be ignored. / {sid}"}), content_type="application/json")
 
@@ -620,6 +3033,97 @@ class BridgeServer():
         generation_count = self.state_obj.generation_count
         return web.Response(status=200, body=json.dumps(generation_count), content_type="application/json")
     
+    async def get_estimate(self, request):
+        """
+        작업을 요청하기 전에 워크플로우가 끝날 때까지의 예상 시간을 가져오는 메서드입니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 워크플로우 alias를 'workflow' 쿼리 파라미터로 받습니다.
+        
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 대기 시간, 실행 시간, 전체 예상 시간(초)을 나타내는 JSON 응답을 반환합니다.
+        """
+        workflow_alias = request.rel_url.query.get('workflow', None)
+        if not isinstance(workflow_alias, str): raise TypeError(f"workflow is required and must be and str, but got {type(workflow_alias).__str__()}")
+        if workflow_alias not in self.wf_alias_map: raise KeyError(f"workflow '{workflow_alias}' is not found")
+
+        completion_times = await self._get_expected_completion_times(workflow_alias)
+        if len(completion_times) == 0:
+            raise aiohttp.ServerConnectionError("There is no available ComfyUI server")
+        server_address = min(completion_times, key=completion_times.get)
+        execution = self.execution_stats.expected(server_address, workflow_alias)
+        estimate = {
+            "workflow": workflow_alias,
+            "wait": round(completion_times[server_address] - execution, 1),
+            "execution": round(execution, 1),
+            "eta": round(completion_times[server_address], 1),
+            "samples": self.execution_stats.count(server_address, workflow_alias),
+        }
+        return web.Response(status=200, body=json.dumps(estimate), content_type="application/json")
+
+    async def get_queue_info(self, _):
+        """
+        bridge server 대기열의 현황을 가져오는 메서드입니다.
+        
+        Args:
+            _ (Any): 인자를 받지 않습니다.
+        
+        Returns:
+            web.Response: HTTP 응답 객체입니다. ComfyUI 서버 별 대기 작업 수, 등록된 작업 수, 남은 작업의 예상 시간과 워크플로우 별 실행 시간, executor 사용 현황, 동적 batch, single flight와 webhook 전송 현황, 기록 현황, 요청 제한 현황, 사용량 기록 현황, drain 여부를 나타내는 JSON 응답을 반환합니다.
+        """
+        queue_info = self.scheduler.stats()
+        health = self.health.stats()
+        for server_address, cur in queue_info["servers"].items():
+            cur["health"] = health.get(server_address, {}).get("state", None)
+            cur["hot"] = sorted(self.warmup.hot.get(server_address, {}).keys())
+            if self.unload_policy is not None:
+                cur["unload"] = self.unload_policy.stats().get(server_address, None)
+            cur["expected_backlog"] = round(self.scheduler.expected_backlog(server_address, self.execution_stats.expected), 2)
+        queue_info["execution_stats"] = self.execution_stats.records
+        queue_info["executor"] = self.executor.stats()
+        queue_info["batcher"] = self.batcher.stats() if self.batcher is not None else None
+        queue_info["single_flight"] = self.single_flight.stats() if self.single_flight is not None else None
+        queue_info["webhook"] = self.webhooks.stats() if self.webhooks is not None else None
+        queue_info["journal"] = self.journal.stats() if self.journal is not None else None
+        queue_info["rate_limit"] = self.rate_limiter.stats() if self.rate_limiter is not None else None
+        queue_info["usage"] = self.usage.stats() if self.usage is not None else None
+        queue_info["draining"] = self.draining
+        return web.Response(status=200, body=json.dumps(queue_info), content_type="application/json")
+
+    async def get_cache_info(self, request):
+        """
+        결과물 캐시의 hit, miss 횟수와 사용 용량을 가져오는 메서드입니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 'type' 쿼리 파라미터로 캐시 종류(result, transcode, verdict)를 받습니다. 기본값은 result입니다.
+        
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 캐시 사용 현황을 나타내는 JSON 응답을 반환합니다. 캐시를 사용하지 않으면 null을 반환합니다.
+        """
+        cache_type = request.rel_url.query.get('type', "result")
+        if cache_type not in ("result", "transcode", "verdict"): raise ValueError(f"type is must be [result, transcode, verdict] but got {cache_type}")
+        if cache_type == "transcode":
+            cache_info = self.transcoder.stats()
+        elif cache_type == "verdict":
+            cache_info = self.validator.verdict_stats()
+        else:
+            cache_info = self.result_cache.stats() if self.result_cache is not None else None
+        return web.Response(status=200, body=json.dumps(cache_info), content_type="application/json")
+
+    async def get_upload_info(self, _):
+        """
+        업로드 저장소의 사용 현황을 가져오는 메서드입니다.
+        
+        Args:
+            _ (Any): 인자를 받지 않습니다.
+        
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 저장된 파일 수, 사용 중인 용량, 예약된 용량, 만료되거나 거절된 업로드 수를 나타내는 JSON 응답을 반환합니다.
+        """
+        upload_info = self.upload_store.stats()
+        upload_info["resumable"] = len(self.resumable_uploads.sessions)
+        return web.Response(status=200, body=json.dumps(upload_info), content_type="application/json")
+
     async def get_execution_info(self, request):
         """
         client id에 해당하는 작업의 실행 정보를 가져오는 메서드입니다.
@@ -635,18 +3139,82 @@ class BridgeServer():
         execution_info = self.socket_manager[sid].execution_info
         return web.Response(status=200, body=json.dumps(execution_info), content_type="application/json")
 
-    async def get_workflow_list(self, _):
+    async def stream_events(self, request):
+        """
+        client id에 해당하는 작업의 실행 정보를 Server-Sent Events로 전달하는 메서드입니다.
+        웹소켓을 사용하지 않는 REST client가 /execution-info를 polling하지 않고 웹소켓과 같은 메시지를 받을 수 있습니다.
+        현재 실행 정보를 먼저 보내고, 이후 메시지를 'data: {json}' 형태로 보내며, 상태가 closed나 error가 되면 스트림을 닫습니다.
+
+        Args:
+            request (Request): HTTP 요청 객체입니다. 소켓 ID를 'clientId' 쿼리 파라미터로 받습니다.
+
+        Returns:
+            web.StreamResponse: text/event-stream 스트리밍 응답입니다.
+        """
+        sid = request.rel_url.query.get('clientId', None)
+        if not isinstance(sid, str): raise TypeError(f"clientId is required and must be and str, but got {type(sid).__str__()}")
+
+        queue = self.socket_manager.subscribe(sid)
+        response = web.StreamResponse(status=200, headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # reverse proxy가 스트림을 버퍼링하지 않도록 함
+        })
+        await response.prepare(request)
+        logging.info(f"[SSE] OPEN / {sid}")
+
+        try:
+            message = self.socket_manager[sid].execution_info
+            while True:
+                if message is not None:
+                    await response.write(f"data: {json.dumps(message)}\n\n".encode('utf-8'))
+                    if message.get("status", None) in ("closed", "error"):
+                        break
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=self.timeout_interval)
+                except asyncio.TimeoutError:
+                    if sid not in self.socket_manager.sid_param_map:
+                        # 생명 주기가 끝나 리소스가 해제된 client id
+                        break
+                    # 연결 유지를 위한 주석. 생명 주기는 갱신하지 않습니다.
+                    await response.write(b": keep-alive\n\n")
+                    message = None
+        except ConnectionResetError:
+            logging.info(f"[SSE] CLIENT DISCONNECTED / {sid}")
+        finally:
+            self.socket_manager.unsubscribe(sid, queue)
+            logging.info(f"[SSE] CLOSE / {sid}")
+
+        return response
+
+    async def get_workflow_list(self, request):
         """
         bridge_server/workflows의 목록을 가져오는 메서드입니다.
         workflow alias를 반환합니다. alias가 지정되지 않았을 경우, workflow file name을 반환합니다.
         
         Args:
-            _ (Any): 인자를 받지 않습니다.
+            request (Request): HTTP 요청 객체입니다. 'resType' 쿼리 파라미터로 thumbnail 형식(url, base64)을, 'size' 쿼리 파라미터로 thumbnail 크기를 받습니다.
         
         Returns:
             web.Response: HTTP 응답 객체입니다. 워크플로우 목록을 나타내는 JSON 응답을 반환합니다.
         """
-        wf_alias_list_with_desc = self.wf_alias_list_with_desc
+        res_type = request.rel_url.query.get('resType', "url")
+        if res_type not in ("url", "base64"): raise ValueError(f"resType is must be [url, base64] but got {res_type}")
+        size = self.workflow_assets.parse_size(request.rel_url.query.get('size', self.asset_default_size))
+
+        if res_type == "url":
+            # 해시를 계산하기 위해 원본을 읽을 수 있으므로 목록의 URL을 한 번에 executor에서 만듭니다.
+            thumbnail_urls = await self.executor.run(lambda: [self.workflow_assets.url("thumbnail", cur.get("thumbnail", None), size=size)
+                                                              for cur in self.wf_alias_list_with_desc])
+        wf_alias_list_with_desc = []
+        for idx, cur in enumerate(self.wf_alias_list_with_desc):
+            cur = dict(cur)
+            if res_type == "url":
+                cur["thumbnail"] = thumbnail_urls[idx]
+            else:
+                entry = await self.workflow_assets.get("thumbnail", cur.get("thumbnail", None), size=size)
+                cur["thumbnail"] = await self.executor.run(encode_byte_base64, entry["content"]) if entry is not None else None
+            wf_alias_list_with_desc.append(cur)
         return web.Response(status=200, body=json.dumps(wf_alias_list_with_desc), content_type="application/json")
     
     async def get_workflow_info(self, request):
@@ -654,19 +3222,59 @@ class BridgeServer():
         워크플로우의 custom input 정보를 가져오는 메서드입니다.
         
         Args:
-            request (Request): HTTP 요청 객체입니다. 'workflow' 쿼리 파라미터로 워크플로우의 이름을 받습니다.
+            request (Request): HTTP 요청 객체입니다. 'workflow' 쿼리 파라미터로 워크플로우의 이름을, 'resType' 쿼리 파라미터로 desc image 형식(url, base64)을, 'size' 쿼리 파라미터로 desc image URL의 크기를 받습니다.
         
         Returns:
             web.Response: HTTP 응답 객체입니다. 워크플로우의 custom input 정보를 나타내는 JSON 응답을 반환합니다.
         """
         workflow = request.rel_url.query.get('workflow', '')
+        res_type = request.rel_url.query.get('resType', "url")
         if not isinstance(workflow, str): raise TypeError(f"workflow is required and must be and str, but got {type(workflow).__str__()}")
+        if res_type not in ("url", "base64"): raise ValueError(f"resType is must be [url, base64] but got {res_type}")
+        size = self.workflow_assets.parse_size(request.rel_url.query.get('size', self.asset_default_size))
         workflow = self.wf_alias_map[workflow]
-        node_info = get_parsed_input_nodes(workflow_json=os.path.join(self.wf_dir, workflow),
+        node_info = await self.executor.run(get_parsed_input_nodes,
+                                           workflow_json=os.path.join(self.wf_dir, workflow),
                                            wf_dir=self.wf_dir,
                                            include_descimage=True,
-                                           tracing_mime_types=self.validator.ALLOWED_MIME_TYPES)
+                                           tracing_mime_types=self.validator.ALLOWED_MIME_TYPES,
+                                           descimage_url_fn=(lambda name: self.workflow_assets.url("descimage", name, size=size)) if res_type == "url" else None)
         return web.Response(status=200, body=json.dumps(node_info), content_type="application/json")
+
+    async def get_workflow_image(self, request, kind:str):
+        """
+        워크플로우의 thumbnail, desc image를 반환하는 메서드입니다.
+        내용 해시를 ETag로 사용하고, If-None-Match가 같다면 304를 반환합니다.
+        
+        Args:
+            request (Request): HTTP 요청 객체입니다. 경로로 파일 이름을, 'size' 쿼리 파라미터로 파생 이미지의 크기를 받습니다.
+            kind (str): 이미지 종류 (thumbnail, descimage)
+        
+        Returns:
+            web.Response: HTTP 응답 객체입니다. 이미지를 반환합니다.
+        """
+        size = self.workflow_assets.parse_size(request.rel_url.query.get('size', None))
+        entry = await self.workflow_assets.get(kind, request.match_info["name"], size=size)
+        if entry is None:
+            return web.Response(
+                status=404,
+                body=json.dumps({"detail":f"{request.match_info['name']} is not found"}),
+                headers={"Content-Type": "application/json"}
+            )
+
+        etag = f'"{entry["etag"]}"'
+        if request.rel_url.query.get('v', None) == entry["etag"][:16] and (size is None or entry["is_variant"] == True):
+            # 내용 해시가 URL에 담겨 있으므로 URL이 같은 동안에는 내용도 같습니다.
+            # 파생 이미지를 만드는 중에 대신 반환한 원본은 오래 캐시되지 않도록 합니다.
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            cache_control = "no-cache"
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+
+        if_none_match = request.headers.get('If-None-Match', "")
+        if etag in [cur.strip() for cur in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return web.Response(status=304, headers=headers)
+        return web.Response(status=200, body=entry["content"], content_type=entry["content_type"], headers=headers)
     
     async def main_page(self, _):
         """
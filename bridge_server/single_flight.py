@@ -0,0 +1,109 @@
+import time
+import logging
+
+class Flight:
+    def __init__(self, key:str, leader:str):
+        """
+        같은 prompt로 실행 중인 작업 하나입니다.
+
+        Args:
+            key (str): prompt 해시
+            leader (str): 작업을 대기열에 등록한 client id
+        """
+        self.key = key
+        self.leader = leader
+        self.followers: list[str] = []  # 같은 prompt를 요청하여 결과물을 함께 받을 client id 목록
+        self.created = time.time()
+
+class SingleFlight:
+    def __init__(self):
+        """
+        같은 prompt를 실행 중인 작업이 있다면 다시 등록하지 않고 결과물을 함께 받도록 client id를 묶어 관리합니다.
+        prompt 해시는 ResultCache.make_key와 같이 업로드한 파일을 파일 내용의 해시로 바꿔 계산합니다.
+        """
+        self.flights: dict[str, Flight] = {}    # prompt 해시 -> 실행 중인 작업
+        self.leaders: dict[str, str] = {}   # 작업을 등록한 client id -> prompt 해시
+        self.coalesced = 0  # 실행 중인 작업에 묶인 요청 수
+        self.promoted = 0   # 작업을 등록한 client id가 떠나 묶인 client id가 이어받은 횟수
+
+    def join(self, key:str, sid:str):
+        """
+        같은 prompt로 실행 중인 작업이 있다면 client id를 묶고, 없다면 client id가 작업을 등록하는 것으로 기록합니다.
+
+        Args:
+            key (str): prompt 해시
+            sid (str): client id
+
+        Returns:
+            str or None: 실행 중인 작업을 등록한 client id. 새로 등록해야 한다면 None
+        """
+        flight = self.flights.get(key, None)
+        if flight is None:
+            self.flights[key] = Flight(key, sid)
+            self.leaders[sid] = key
+            return None
+        if sid != flight.leader and sid not in flight.followers:
+            flight.followers.append(sid)
+            self.coalesced += 1
+            logging.info(f"[SINGLE FLIGHT] COALESCED / {len(flight.followers)} / {sid}")
+        return flight.leader
+
+    def followers(self, sid:str):
+        """
+        client id가 등록한 작업에 묶인 client id 목록을 반환합니다.
+
+        Args:
+            sid (str): 작업을 등록한 client id
+
+        Returns:
+            list: 묶인 client id 목록
+        """
+        key = self.leaders.get(sid, None)
+        if key is None:
+            return []
+        return list(self.flights[key].followers)
+
+    def promote(self, sid:str, new_sid:str):
+        """
+        작업을 등록한 client id가 떠났을 때, 묶인 client id 하나가 작업을 이어받은 것으로 기록합니다.
+
+        Args:
+            sid (str): 작업을 등록한 client id
+            new_sid (str): 작업을 이어받을 묶인 client id
+        """
+        key = self.leaders.pop(sid)
+        flight = self.flights[key]
+        flight.followers.remove(new_sid)
+        flight.leader = new_sid
+        self.leaders[new_sid] = key
+        self.promoted += 1
+        logging.info(f"[SINGLE FLIGHT] PROMOTED / {sid} -> {new_sid}")
+
+    def land(self, sid:str):
+        """
+        client id가 등록한 작업이 끝났음을 기록하고 묶인 client id 목록을 반환합니다. 이후 같은 prompt는 새로 등록됩니다.
+
+        Args:
+            sid (str): 작업을 등록한 client id
+
+        Returns:
+            list: 묶인 client id 목록
+        """
+        key = self.leaders.pop(sid, None)
+        if key is None:
+            return []
+        return self.flights.pop(key).followers
+
+    def stats(self):
+        """
+        실행 중인 작업과 묶인 요청 수를 반환합니다.
+
+        Returns:
+            dict: 실행 중인 작업 수, 현재 묶여 있는 요청 수, 지금까지 묶인 요청 수, 작업을 이어받은 횟수
+        """
+        return {
+            "inflight": len(self.flights),
+            "followers": sum(len(flight.followers) for flight in self.flights.values()),
+            "coalesced": self.coalesced,
+            "promoted": self.promoted,
+        }
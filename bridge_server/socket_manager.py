@@ -4,7 +4,7 @@ import datetime
 from assistant import delete_history
 
 class SocketManager: 
-    def __init__(self, loop:asyncio.AbstractEventLoop, interval=3, life_seconds=10):
+    def __init__(self, loop:asyncio.AbstractEventLoop, interval=3, life_seconds=10, on_delete=None):
         """
         SocketManager 클래스를 초기화합니다.
 
@@ -12,9 +12,12 @@ class SocketManager:
             loop (asyncio.AbstractEventLoop): asyncio 이벤트 루프
             interval (int, optional): 삭제 확인 간격(초). 기본값은 3초입니다.
             life_seconds (int, optional): 인스턴스 생존 시간(초). 기본값은 10초입니다.
+            on_delete (Callable, optional): 인스턴스를 삭제한 뒤 소켓 ID를 받아 호출할 함수
         """
         self.loop = loop
+        self.on_delete = on_delete
         self.sid_param_map: dict[str, ParamManager] = {}
+        self.listeners: dict[str, set[asyncio.Queue]] = {}  # 소켓 ID -> 메시지를 받을 대기열 (SSE, history 대기)
         self.delete_task = asyncio.create_task(self.check_delete(interval=interval, life_seconds=life_seconds))
 
     def create_one(self, sid):
@@ -57,6 +60,9 @@ class SocketManager:
             message (dict): 전송할 JSON 메시지
             update_life (bool, optional): ParamManager의 생명 주기를 업데이트할지 여부. 기본값은 True입니다.
         """
+        for queue in self.listeners.get(sid, ()):
+            queue.put_nowait(message)
+
         param_manager = self.sid_param_map.get(sid, None)
 
         if isinstance(param_manager, ParamManager):
@@ -74,6 +80,33 @@ class SocketManager:
         else:
             logging.error(f"[WS RES] SEND FAILED / Wrong type({type(param_manager)}) to execute in sid of SocketManager / {message} / {sid}")
 
+    def subscribe(self, sid):
+        """
+        소켓 ID로 보내는 메시지를 받을 대기열을 등록합니다. 웹소켓이 없는 REST client에도 메시지를 전달하기 위함입니다.
+
+        Args:
+            sid (str): 소켓 ID
+
+        Returns:
+            asyncio.Queue: 메시지를 받을 대기열
+        """
+        queue = asyncio.Queue()
+        self.listeners.setdefault(sid, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, sid, queue):
+        """
+        등록한 대기열을 해제합니다.
+
+        Args:
+            sid (str): 소켓 ID
+            queue (asyncio.Queue): subscribe로 받은 대기열
+        """
+        queues = self.listeners.get(sid, set())
+        queues.discard(queue)
+        if len(queues) == 0:
+            self.listeners.pop(sid, None)
+
     async def async_release_sockets(self, sid):
         """
         소켓 리소스를 비동기적으로 해제합니다.
@@ -92,9 +125,16 @@ class SocketManager:
             sid (str): 소켓 ID
         """
         if sid in self.sid_param_map:
-            delete_history(self.sid_param_map[sid].comfyui_prompt_id, self.sid_param_map[sid].linked_server)
+            param_manager = self.sid_param_map[sid]
+            if param_manager.comfyui_prompt_id is not None and param_manager.linked_server is not None:
+                try:
+                    delete_history(param_manager.comfyui_prompt_id, param_manager.linked_server)
+                except Exception as err:
+                    logging.debug(f"[WS REQ] DELETE HISTORY FAILED / {err} / {sid}")
             await self.sid_param_map[sid].release()
             del self.sid_param_map[sid]
+            if self.on_delete is not None:
+                self.on_delete(sid)
 
     async def check_delete(self, interval, life_seconds):
         """
@@ -144,11 +184,17 @@ class ParamManager:
     def __init__(self):
         self._sockets_res = None    # client와 통신하는 웹소켓
         self._sockets_req = None    # ComfyUI 서버와 통신하는 웹소켓
+        self._session_req = None    # 장애 조치로 다시 연결한 ComfyUI 웹소켓의 세션
         self._linked_server = None  # 할당된 ComfyUI 주소
         self._wf_info = None    # 할당된 workflow 정보
+        self._wf_alias = None   # 할당된 workflow alias
+        self._wf_inputs = None  # client가 보낸 custom input. 장애 조치 시 다시 업로드하는 데 사용
+        self._job = None    # bridge server 대기열에 등록한 작업
         self._ws_connection_status = None   # 현재 웹소켓 연결 상태
         self._execution_info = None # 현재 작업 진행 상황
         self._comfyui_prompt_id = None  # ComfyUI에서 내부적으로 할당한 prompt_id
+        self._cache_key = None  # 결과물 캐시에 사용할 prompt 해시
+        self._result_files = None   # ComfyUI를 거치지 않고 반환할 결과물 목록
         self._history_life = datetime.datetime.now()    # history를 얼마나 보존할지에 대한 생명 주기
 
     async def release_sockets(self):
@@ -159,10 +205,16 @@ class ParamManager:
             await self.sockets_res.close()
         if self.sockets_req is not None:
             await self.sockets_req.close()
+        if self._session_req is not None:
+            await self._session_req.close()
         self.sockets_res = None
         self.sockets_req = None
+        self.session_req = None
         self.ws_connection_status = None
         self.wf_info = None
+        self.wf_alias = None
+        self.wf_inputs = None
+        self.job = None
         self.comfyui_prompt_id = None
 
     async def release(self):
@@ -171,6 +223,8 @@ class ParamManager:
         """
         await self.release_sockets()
         self.execution_info = None
+        self.cache_key = None
+        self.result_files = None
         self._life = None
     
     def update_life(self):
@@ -186,12 +240,24 @@ class ParamManager:
     def sockets_req(self):
         return self._sockets_req
     @property
+    def session_req(self):
+        return self._session_req
+    @property
     def linked_server(self):
         return self._linked_server
     @property
     def wf_info(self):
         return self._wf_info
     @property
+    def wf_alias(self):
+        return self._wf_alias
+    @property
+    def wf_inputs(self):
+        return self._wf_inputs
+    @property
+    def job(self):
+        return self._job
+    @property
     def ws_connection_status(self):
         return self._ws_connection_status
     @property
@@ -201,6 +267,12 @@ class ParamManager:
     def comfyui_prompt_id(self):
         return self._comfyui_prompt_id
     @property
+    def cache_key(self):
+        return self._cache_key
+    @property
+    def result_files(self):
+        return self._result_files
+    @property
     def history_life(self):
         return self._history_life
     
@@ -210,12 +282,24 @@ class ParamManager:
     @sockets_req.setter
     def sockets_req(self, value):
         self._sockets_req = value
+    @session_req.setter
+    def session_req(self, value):
+        self._session_req = value
     @linked_server.setter
     def linked_server(self, value):
         self._linked_server = value
     @wf_info.setter
     def wf_info(self, value):
         self._wf_info = value
+    @wf_alias.setter
+    def wf_alias(self, value):
+        self._wf_alias = value
+    @wf_inputs.setter
+    def wf_inputs(self, value):
+        self._wf_inputs = value
+    @job.setter
+    def job(self, value):
+        self._job = value
     @ws_connection_status.setter
     def ws_connection_status(self, value):
         # connection status 업데이트시 생명주기 업데이트
@@ -229,3 +313,9 @@ class ParamManager:
     @comfyui_prompt_id.setter
     def comfyui_prompt_id(self, value):
         self._comfyui_prompt_id = value
+    @cache_key.setter
+    def cache_key(self, value):
+        self._cache_key = value
+    @result_files.setter
+    def result_files(self, value):
+        self._result_files = value
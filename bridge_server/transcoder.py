@@ -0,0 +1,187 @@
+import io, os
+import asyncio
+import hashlib
+import logging
+import pathlib
+from collections import OrderedDict
+from PIL import Image
+from executor import Executor
+
+# format 쿼리 -> (Pillow format, MIME 타입, 확장자)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "png": ("PNG", "image/png", ".png"),
+}
+
+def transcode_image(source, image_format:str, quality:int=None, max_size:int=None):
+    """
+    이미지를 다른 포맷으로 변환하고, 필요하면 긴 변이 max_size를 넘지 않도록 줄입니다.
+    worker process에서 실행되므로 모듈 최상위 함수로 둡니다.
+
+    Args:
+        source (bytes or str): 이미지 데이터 또는 로컬 파일 경로
+        image_format (str): Pillow format (WEBP, JPEG, PNG)
+        quality (int, optional): 손실 압축 품질(1~100)
+        max_size (int, optional): 긴 변의 최대 크기(px)
+
+    Returns:
+        bytes: 변환된 이미지 데이터
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+        img.load()
+        if max_size is not None:
+            img.thumbnail((max_size, max_size))
+        if image_format == "JPEG" and img.mode != "RGB":
+            img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA")
+
+        save_kwargs = {}
+        if quality is not None and image_format != "PNG":
+            save_kwargs["quality"] = quality
+        buffer = io.BytesIO()
+        img.save(buffer, format=image_format, **save_kwargs)
+        return buffer.getvalue()
+
+class Transcoder:
+    def __init__(self, executor:Executor, cache_max_size:int=256*1024**2):
+        """
+        결과물 이미지를 worker process에서 변환하고, 변환된 결과물을 메모리에 보관하는 LRU 캐시를 초기화합니다.
+
+        Args:
+            executor (Executor): 변환과 해시 계산에 사용할 executor
+            cache_max_size (int, optional): 변환 결과물 캐시의 최대 용량(byte). 기본값은 256MB입니다.
+        """
+        self.executor = executor
+        self.cache_max_size = cache_max_size
+
+        self.cache: OrderedDict[str, bytes] = OrderedDict()    # 오래 사용되지 않은 순서로 정렬된 변환 결과물
+        self.pending: dict[str, asyncio.Future] = {}    # 현재 변환 중인 캐시 키
+        self.cache_size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def parse_options(image_format:str=None, quality:str=None, max_size:str=None):
+        """
+        /history 쿼리로 받은 변환 옵션을 검사합니다.
+
+        Args:
+            image_format (str, optional): 변환할 포맷 (webp, jpeg, png)
+            quality (str, optional): 손실 압축 품질(1~100)
+            max_size (str, optional): 긴 변의 최대 크기(px)
+
+        Returns:
+            dict or None: transcode에 전달할 옵션. 변환하지 않는다면 None
+
+        Raises:
+            ValueError: 옵션이 올바르지 않을 때 발생
+        """
+        if image_format is None and quality is None and max_size is None:
+            return None
+        if image_format is not None and image_format not in FORMATS:
+            raise ValueError(f"format is must be [{', '.join(FORMATS.keys())}] but got {image_format}")
+        if quality is not None:
+            quality = int(quality)
+            if not 1 <= quality <= 100:
+                raise ValueError(f"quality is must be in 1~100 but got {quality}")
+        if max_size is not None:
+            max_size = int(max_size)
+            if max_size <= 0:
+                raise ValueError(f"maxSize is must be positive but got {max_size}")
+        return {"image_format": image_format, "quality": quality, "max_size": max_size}
+
+    async def transcode(self, file_name:str, file_content, content_type:str, image_format:str=None, quality:int=None, max_size:int=None):
+        """
+        결과물 하나를 변환합니다. 이미지가 아니거나 변환할 수 없는 결과물은 그대로 반환합니다.
+
+        Args:
+            file_name (str): 파일 이름
+            file_content (bytes or pathlib.Path): 파일 내용 또는 로컬 경로
+            content_type (str): MIME 타입
+            image_format (str, optional): 변환할 포맷. None이면 원래 포맷을 유지합니다.
+            quality (int, optional): 손실 압축 품질(1~100)
+            max_size (int, optional): 긴 변의 최대 크기(px)
+
+        Returns:
+            tuple: (파일 이름, 파일 내용, MIME 타입)
+        """
+        source_format = next((key for key, (_, mime_type, _) in FORMATS.items() if mime_type == content_type), None)
+        if source_format is None:
+            # 움직이는 이미지나 동영상 등은 변환하지 않습니다.
+            return file_name, file_content, content_type
+        image_format = image_format or source_format
+        pil_format, mime_type, extension = FORMATS[image_format]
+        new_file_name = os.path.splitext(file_name)[0] + extension
+
+        key = await self._make_key(file_content, image_format, quality, max_size)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return new_file_name, self.cache[key], mime_type
+
+        future = self.pending.get(key, None)
+        if future is not None:
+            # 같은 결과물을 변환 중이라면 그 결과를 기다립니다.
+            self.hits += 1
+            return new_file_name, await asyncio.shield(future), mime_type
+
+        self.misses += 1
+        source = str(file_content) if isinstance(file_content, pathlib.Path) else file_content
+        future = asyncio.ensure_future(self.executor.run_process(transcode_image, source, pil_format, quality, max_size))
+        self.pending[key] = future
+        try:
+            data = await asyncio.shield(future)
+        except Exception as e:
+            logging.warning(f"[TRANSCODE] FAILED / {e} / {file_name}")
+            return file_name, file_content, content_type
+        finally:
+            self.pending.pop(key, None)
+
+        self._put(key, data)
+        return new_file_name, data, mime_type
+
+    def stats(self):
+        """
+        변환 결과물 캐시 사용 현황을 반환합니다.
+
+        Returns:
+            dict: hit, miss 횟수와 저장된 항목 수, 사용 용량
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total > 0 else 0.0,
+            "entries": len(self.cache),
+            "size": self.cache_size,
+            "max_size": self.cache_max_size,
+        }
+
+    async def _make_key(self, file_content, image_format:str, quality:int, max_size:int):
+        # 로컬 파일과 결과물 캐시에서 가져온 같은 결과물이 같은 키를 갖도록 내용의 해시를 사용합니다.
+        if isinstance(file_content, pathlib.Path):
+            source_key = await self.executor.run(self._hash_file, file_content)
+        else:
+            source_key = await self.executor.run(self._hash_bytes, file_content)
+        return f"{source_key}/{image_format}/{quality}/{max_size}"
+
+    def _hash_bytes(self, file_content:bytes):
+        return hashlib.sha256(file_content).hexdigest()
+
+    def _hash_file(self, file_path:pathlib.Path):
+        file_hash = hashlib.sha256()
+        with open(file_path, mode="rb") as f:
+            for chunk in iter(lambda: f.read(1024**2), b''):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    def _put(self, key:str, data:bytes):
+        if len(data) > self.cache_max_size or key in self.cache:
+            return
+        self.cache[key] = data
+        self.cache_size += len(data)
+        while self.cache_size > self.cache_max_size:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_size -= len(evicted)
@@ -0,0 +1,159 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from assistant import post_free_memory, get_system_stats
+
+class UnloadPolicy:
+    def __init__(self,
+                 server_address:list,
+                 busy_fn,
+                 is_hot_fn,
+                 on_unload=None,
+                 idle_seconds:int=600,
+                 window:int=3600,
+                 keep_hot_min_jobs:int=10,
+                 vram_required:dict=None,
+                 interval:int=30):
+        """
+        ComfyUI 서버의 유휴 시간과 최근 실행 기록에 따라 모델을 VRAM에서 내리는 정책을 관리합니다.
+        최근 window초 동안 keep_hot_min_jobs번 이상 실행된 서버는 모델을 유지하고, 그렇지 않은 서버는 idle_seconds 동안 작업이 없으면 모델을 내립니다.
+        또한 실행할 워크플로우에 필요한 VRAM이 부족하면 작업을 등록하기 전에 모델을 내립니다.
+
+        Args:
+            server_address (list): ComfyUI 서버 주소 목록
+            busy_fn (Callable): 서버 주소를 받아 실행 중이거나 대기 중인 작업이 있는지 반환하는 함수
+            is_hot_fn (Callable): (서버 주소, 워크플로우)를 받아 모델이 올라가 있는지 반환하는 함수
+            on_unload (Callable, optional): 서버 주소를 받는 함수. 모델을 내린 뒤 호출합니다.
+            idle_seconds (int, optional): 모델을 내리기까지 기다릴 유휴 시간(초). 기본값은 600초입니다.
+            window (int, optional): 사용 빈도를 계산할 기간(초). 기본값은 3600초입니다.
+            keep_hot_min_jobs (int, optional): window 동안 이 횟수 이상 실행된 서버는 모델을 유지합니다. 기본값은 10입니다.
+            vram_required (dict, optional): 워크플로우 alias -> 필요한 VRAM(byte)
+            interval (int, optional): 유휴 시간을 확인하는 간격(초). 기본값은 30초입니다.
+        """
+        self.busy_fn = busy_fn
+        self.is_hot_fn = is_hot_fn
+        self.on_unload = on_unload
+        self.idle_seconds = idle_seconds
+        self.window = window
+        self.keep_hot_min_jobs = keep_hot_min_jobs
+        self.vram_required = vram_required or {}
+
+        now = time.time()
+        self.last_active = {server_address: now for server_address in server_address}   # 서버 -> 마지막으로 작업이 끝난 시간
+        self.history: dict[str, deque] = {server_address: deque() for server_address in server_address}  # 서버 -> 최근 실행 시간 목록
+        self.unloaded = set()   # 모델을 내린 뒤 아직 작업이 없었던 서버
+        self.unload_count = {server_address: 0 for server_address in server_address}
+
+        self.check_task = asyncio.create_task(self.check_idle(interval=interval))
+
+    def record_activity(self, server_address:str, count:bool=True):
+        """
+        서버에서 작업이 실행되었음을 기록합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            count (bool, optional): 사용 빈도에 반영할지 여부. warmup처럼 유휴 시간만 초기화할 때는 False입니다. 기본값은 True입니다.
+        """
+        now = time.time()
+        self.last_active[server_address] = now
+        self.unloaded.discard(server_address)
+        if count == True:
+            history = self.history.setdefault(server_address, deque())
+            history.append(now)
+            self._trim(history, now)
+
+    def recent_jobs(self, server_address:str):
+        """
+        window 동안 서버에서 실행된 작업 수를 반환합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+
+        Returns:
+            int: 작업 수
+        """
+        history = self.history.get(server_address, deque())
+        self._trim(history, time.time())
+        return len(history)
+
+    async def check_idle(self, interval:int):
+        """
+        주기적으로 유휴 서버를 찾아 모델을 내립니다.
+
+        Args:
+            interval (int): 확인 간격(초)
+        """
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            for server_address in list(self.last_active.keys()):
+                if server_address in self.unloaded or self.busy_fn(server_address):
+                    continue
+                if now - self.last_active[server_address] < self.idle_seconds:
+                    continue
+                if self.recent_jobs(server_address) >= self.keep_hot_min_jobs:
+                    # 자주 사용하는 서버는 모델을 유지합니다.
+                    continue
+                await self.unload(server_address, reason=f"idle {now - self.last_active[server_address]:.0f}s")
+
+    async def ensure_vram(self, server_address:str, workflow:str):
+        """
+        워크플로우를 실행하기 전에 필요한 VRAM이 남아있는지 확인하고, 부족하면 모델을 내립니다.
+        모델이 이미 올라가 있는 워크플로우나 필요한 VRAM이 설정되지 않은 워크플로우는 확인하지 않습니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            workflow (str): 실행할 워크플로우 alias
+        """
+        required = self.vram_required.get(workflow, None)
+        if required is None or self.is_hot_fn(server_address, workflow):
+            return
+        try:
+            system_stats = await asyncio.to_thread(get_system_stats, server_address)
+        except Exception as e:
+            logging.debug(f"[UNLOAD] VRAM CHECK FAILED / {e} / {server_address}")
+            return
+        vram_free = sum(device.get("vram_free", 0) for device in system_stats.get("devices", []))
+        if vram_free < required:
+            await self.unload(server_address, reason=f"{workflow} needs {required} but {vram_free} is free")
+
+    async def unload(self, server_address:str, reason:str=""):
+        """
+        서버의 모델을 VRAM에서 내립니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            reason (str, optional): 로그에 남길 이유
+        """
+        try:
+            await asyncio.to_thread(post_free_memory, server_address)
+        except Exception as e:
+            logging.warning(f"[UNLOAD] FAILED / {e} / {server_address}")
+            return
+        self.unloaded.add(server_address)
+        self.unload_count[server_address] = self.unload_count.get(server_address, 0) + 1
+        logging.info(f"[UNLOAD] {reason} / {server_address}")
+        if self.on_unload is not None:
+            self.on_unload(server_address)
+
+    def stats(self):
+        """
+        서버 별 유휴 시간과 최근 작업 수, 모델을 내린 횟수를 반환합니다.
+
+        Returns:
+            dict: 서버 주소 -> {"idle", "recent_jobs", "unloaded", "unload_count"}
+        """
+        now = time.time()
+        return {
+            server_address: {
+                "idle": round(now - last_active, 1),
+                "recent_jobs": self.recent_jobs(server_address),
+                "unloaded": server_address in self.unloaded,
+                "unload_count": self.unload_count.get(server_address, 0),
+            } for server_address, last_active in self.last_active.items()
+        }
+
+    def _trim(self, history:deque, now:float):
+        while len(history) > 0 and now - history[0] > self.window:
+            history.popleft()
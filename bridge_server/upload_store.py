@@ -0,0 +1,302 @@
+import os, json
+import time
+import uuid
+import shutil
+import asyncio
+import hashlib
+import logging
+import threading
+
+class UploadQuotaError(Exception):
+    def __init__(self, used:int, max_size:int):
+        """
+        업로드 저장소의 용량을 넘을 때 발생하는 예외입니다.
+
+        Args:
+            used (int): 사용 중이거나 예약된 용량(byte)
+            max_size (int): 최대 용량(byte)
+        """
+        super().__init__(f"upload store is full / {used} of {max_size} bytes are used")
+        self.used = used
+        self.max_size = max_size
+
+class UploadEntry:
+    def __init__(self, handle:str, file_name:str, mime_type:str, extension:str, size:int, sha256:str, sid:str, created:float=None, last_used:float=None):
+        self.handle = handle    # client에게 발급한 파일 이름
+        self.file_name = file_name  # 원본 파일 이름
+        self.mime_type = mime_type
+        self.extension = extension  # ComfyUI 서버에 업로드할 때 붙일 확장자
+        self.size = size
+        self.sha256 = sha256
+        self.sid = sid  # 업로드한 client id
+        self.created = created or time.time()
+        self.last_used = last_used or self.created
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+class UploadStore:
+    PREFIX = "bridge_server_comfyui_"
+
+    def __init__(self, store_dir:str, max_size:int=10*1024**3, ttl:int=3600, interval:int=60):
+        """
+        /upload와 이어받기 업로드로 받은 파일을 보관하는 저장소를 초기화합니다.
+        파일 이름 -> 경로, MIME 타입, 크기, 해시, 업로드한 client id를 index로 관리하고,
+        용량 제한을 넘는 업로드는 거절하며, 마지막으로 사용한 뒤 ttl이 지난 파일은 주기적으로 삭제합니다.
+
+        Args:
+            store_dir (str): 파일과 index를 저장할 폴더 경로. tmpfs(/dev/shm 등)를 사용할 수 있습니다.
+            max_size (int, optional): 저장소가 사용할 최대 용량(byte). 기본값은 10GB입니다.
+            ttl (int, optional): 마지막으로 사용한 뒤 파일을 보관할 시간(초). 기본값은 3600초입니다.
+            interval (int, optional): 만료된 파일을 확인하는 간격(초). 기본값은 60초입니다.
+        """
+        self.store_dir = store_dir
+        self.max_size = max_size
+        self.ttl = ttl
+        self.index_fn = os.path.join(store_dir, "index.json")
+
+        self.entries: dict[str, UploadEntry] = {}
+        self.total_size = 0
+        self.reserved = 0   # 아직 완료되지 않은 이어받기 업로드가 예약한 용량
+        self.expired = 0
+        self.rejected = 0
+        # 파일 작업은 executor의 스레드에서 실행되므로 index는 스레드 lock으로 보호합니다.
+        self.lock = threading.Lock()
+
+        os.makedirs(store_dir, exist_ok=True)
+        self._load_index()
+        self.check_task = asyncio.create_task(self.check_expired(interval=interval))
+
+    @classmethod
+    def is_handle(cls, value):
+        """
+        custom input 값이 업로드 저장소에서 발급한 파일 이름인지 확인합니다.
+
+        Args:
+            value (Any): custom input 값
+
+        Returns:
+            bool: 발급한 파일 이름 형식인지 여부
+        """
+        return isinstance(value, str) and value.startswith(cls.PREFIX)
+
+    def path(self, handle:str):
+        """
+        파일 이름의 경로를 반환합니다.
+
+        Args:
+            handle (str): 발급한 파일 이름
+
+        Returns:
+            str: 파일 경로
+        """
+        return os.path.join(self.store_dir, os.path.basename(handle))
+
+    def reserve(self, size:int):
+        """
+        이어받기 업로드가 받을 용량을 미리 예약합니다.
+
+        Args:
+            size (int): 예약할 용량(byte)
+
+        Raises:
+            UploadQuotaError: 용량을 넘을 때 발생
+        """
+        with self.lock:
+            self._check_quota(size)
+            self.reserved += size
+
+    def release(self, size:int):
+        """
+        예약한 용량을 돌려줍니다.
+
+        Args:
+            size (int): 예약했던 용량(byte)
+        """
+        with self.lock:
+            self.reserved = max(0, self.reserved - size)
+
+    def put(self, file_data:bytes, file_name:str, mime_type:str, extension:str, sid:str):
+        """
+        검사를 통과한 파일을 저장하고 파일 이름을 발급합니다. 파일을 쓰므로 executor에서 실행합니다.
+
+        Args:
+            file_data (bytes): 파일 데이터
+            file_name (str): 원본 파일 이름
+            mime_type (str): MIME 타입
+            extension (str): MIME 타입에 해당하는 확장자
+            sid (str): 업로드한 client id
+
+        Returns:
+            UploadEntry: 저장된 항목
+
+        Raises:
+            UploadQuotaError: 용량을 넘을 때 발생
+        """
+        with self.lock:
+            self._check_quota(len(file_data))
+            self.reserved += len(file_data)
+        entry = UploadEntry(handle=self.PREFIX + uuid.uuid4().hex,
+                            file_name=file_name,
+                            mime_type=mime_type,
+                            extension=extension,
+                            size=len(file_data),
+                            sha256=hashlib.sha256(file_data).hexdigest(),
+                            sid=sid)
+        try:
+            with open(self.path(entry.handle), mode="wb") as f:
+                f.write(file_data)
+        except OSError:
+            self.release(entry.size)
+            raise
+        self._add(entry, reserved_size=entry.size)
+        return entry
+
+    def adopt(self, src_path:str, file_name:str, mime_type:str, extension:str, sid:str, reserved_size:int=0):
+        """
+        이어받기 업로드로 받은 파일을 저장소로 옮기고 파일 이름을 발급합니다. 파일을 읽으므로 executor에서 실행합니다.
+
+        Args:
+            src_path (str): 받은 파일 경로
+            file_name (str): 원본 파일 이름
+            mime_type (str): MIME 타입
+            extension (str): MIME 타입에 해당하는 확장자
+            sid (str): 업로드한 client id
+            reserved_size (int, optional): reserve로 예약했던 용량. 발급한 파일이 대신 사용합니다.
+
+        Returns:
+            UploadEntry: 저장된 항목
+        """
+        file_hash = hashlib.sha256()
+        with open(src_path, mode="rb") as f:
+            for chunk in iter(lambda: f.read(1024**2), b''):
+                file_hash.update(chunk)
+        entry = UploadEntry(handle=self.PREFIX + uuid.uuid4().hex,
+                            file_name=file_name,
+                            mime_type=mime_type,
+                            extension=extension,
+                            size=os.path.getsize(src_path),
+                            sha256=file_hash.hexdigest(),
+                            sid=sid)
+        shutil.move(src_path, self.path(entry.handle))
+        self._add(entry, reserved_size=reserved_size)
+        return entry
+
+    def get(self, handle:str):
+        """
+        발급한 파일 이름의 항목을 가져오고 마지막 사용 시간을 갱신합니다.
+
+        Args:
+            handle (str): 발급한 파일 이름
+
+        Returns:
+            UploadEntry: 저장된 항목
+
+        Raises:
+            KeyError: 파일이 없거나 만료되었을 때 발생
+        """
+        with self.lock:
+            entry = self.entries.get(handle, None)
+            if entry is None or not os.path.exists(self.path(handle)):
+                raise KeyError(f"'{handle}' file is not exist in server.")
+            entry.last_used = time.time()
+            return entry
+
+    def remove(self, handle:str):
+        """
+        파일과 항목을 삭제합니다. 이미 옮겨졌거나 삭제된 파일은 항목만 삭제합니다.
+
+        Args:
+            handle (str): 발급한 파일 이름
+        """
+        with self.lock:
+            if self._remove(handle):
+                self._save_index()
+
+    async def check_expired(self, interval:int):
+        """
+        주기적으로 만료된 파일을 삭제합니다.
+
+        Args:
+            interval (int): 확인 간격(초)
+        """
+        while True:
+            await asyncio.sleep(interval)
+            with self.lock:
+                if self._remove_expired() > 0:
+                    self._save_index()
+
+    def stats(self):
+        """
+        업로드 저장소의 사용 현황을 반환합니다.
+
+        Returns:
+            dict: 저장된 파일 수, 사용 중인 용량, 예약된 용량, 최대 용량, 만료되거나 거절된 업로드 수
+        """
+        with self.lock:
+            return {
+                "dir": self.store_dir,
+                "entries": len(self.entries),
+                "size": self.total_size,
+                "reserved": self.reserved,
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "clients": len(set(entry.sid for entry in self.entries.values())),
+                "expired": self.expired,
+                "rejected": self.rejected,
+            }
+
+    def _check_quota(self, size:int):
+        # 용량이 부족하면 만료된 파일을 먼저 삭제한 뒤 다시 확인합니다.
+        if self.total_size + self.reserved + size > self.max_size and self._remove_expired() > 0:
+            self._save_index()
+        if self.total_size + self.reserved + size > self.max_size:
+            self.rejected += 1
+            raise UploadQuotaError(self.total_size + self.reserved, self.max_size)
+
+    def _add(self, entry:UploadEntry, reserved_size:int=0):
+        with self.lock:
+            self.reserved = max(0, self.reserved - reserved_size)
+            self.entries[entry.handle] = entry
+            self.total_size += entry.size
+            self._save_index()
+        logging.debug(f"[UPLOAD] STORED / {entry.file_name} / {entry.mime_type} / {entry.size} / {entry.handle}")
+
+    def _remove(self, handle:str):
+        entry = self.entries.pop(handle, None)
+        if entry is None:
+            return False
+        self.total_size -= entry.size
+        if os.path.exists(self.path(handle)):
+            os.remove(self.path(handle))
+        return True
+
+    def _remove_expired(self):
+        now = time.time()
+        expired = [handle for handle, entry in self.entries.items() if now - entry.last_used > self.ttl]
+        for handle in expired:
+            logging.debug(f"[UPLOAD] EXPIRED / {self.entries[handle].file_name} / {handle}")
+            self._remove(handle)
+        self.expired += len(expired)
+        return len(expired)
+
+    def _save_index(self):
+        with open(self.index_fn, mode="w") as f:
+            json.dump([entry.to_dict() for entry in self.entries.values()], f)
+
+    def _load_index(self):
+        # 이전에 저장한 index를 불러오고, 파일이 없는 항목과 index에 없는 파일(완료되지 않은 업로드 등)은 버림
+        try:
+            with open(self.index_fn, mode="r") as f:
+                entries = [UploadEntry(**cur) for cur in json.load(f)]
+        except (OSError, ValueError, TypeError):
+            entries = []
+
+        for entry in entries:
+            if os.path.exists(self.path(entry.handle)):
+                self.entries[entry.handle] = entry
+                self.total_size += entry.size
+        for cur in os.listdir(self.store_dir):
+            if cur.startswith(("bridge_server_upload_", self.PREFIX)) and cur not in self.entries:
+                os.remove(os.path.join(self.store_dir, cur))
+        self._save_index()
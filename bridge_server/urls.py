@@ -5,12 +5,27 @@ def setup_routes(app:web.Application, server):
         web.get("/", server.main_page),
         web.get("/ws", lambda request: server.websocket_connection(request, mode="PROXY")),
         web.get("/workflow-info", server.get_workflow_info),
+        web.get("/thumbnail/{name}", lambda request: server.get_workflow_image(request, kind="thumbnail")),
+        web.get("/descimage/{name}", lambda request: server.get_workflow_image(request, kind="descimage")),
         web.post("/upload", server.upload),
+        web.post("/upload/resumable", server.create_resumable_upload),
+        web.get("/upload/resumable", server.get_resumable_upload),
+        web.patch("/upload/resumable", server.patch_resumable_upload),
+        web.post("/upload/resumable/finalize", server.finalize_resumable_upload),
         web.post("/generate-based-workflow", server.generate_based_workflow),
+        web.post("/generate-batch", server.generate_batch),
         web.get("/history", server.get_history),
         web.get("/workflow-list", server.get_workflow_list),
         web.get("/execution-info", server.get_execution_info),
+        web.get("/events", server.stream_events),
         web.get("/generation-count", server.get_generation_count),
+        web.get("/cache-info", server.get_cache_info),
+        web.get("/upload-info", server.get_upload_info),
+        web.get("/queue-info", server.get_queue_info),
+        web.get("/estimate", server.get_estimate),
+        web.get("/usage", server.get_usage),
         web.post("/free", server.free_memory),
         web.post("/interrupt", server.interrupt_generation),
+        web.post("/drain", server.start_drain),
+        web.get("/drain", server.get_drain),
     ])
@@ -0,0 +1,224 @@
+import os, json
+import time
+import asyncio
+import logging
+import threading
+
+class UsageLedger:
+    DIMENSIONS = ("workflow", "server", "client")
+    METRICS = ("count", "wait_seconds", "execution_seconds", "input_bytes", "output_bytes")
+
+    def __init__(self, ledger_fn:str, bucket_seconds:int=3600, retention_days:int=90, interval:int=60):
+        """
+        끝난 작업의 사용량을 추가 전용(append-only) 기록에 남기고, 시간 구간과 workflow, ComfyUI 서버, client 별로 집계합니다.
+        집계는 메모리에서 갱신하고 주기적으로 기록 파일의 위치(offset)와 함께 저장하므로, 다시 시작할 때는 저장한 위치 이후의 기록만 재생합니다.
+
+        Args:
+            ledger_fn (str): 기록 파일 경로. 집계는 '{ledger_fn}.rollup.json'에 저장합니다.
+            bucket_seconds (int, optional): 집계할 시간 구간의 크기(초). 기본값은 3600초입니다.
+            retention_days (int, optional): 집계를 보관할 기간(일). 기록 파일은 삭제하지 않습니다. 기본값은 90일입니다.
+            interval (int, optional): 집계를 저장하는 간격(초). 기본값은 60초입니다.
+        """
+        self.ledger_fn = ledger_fn
+        self.rollup_fn = ledger_fn + ".rollup.json"
+        self.bucket_seconds = bucket_seconds
+        self.retention_seconds = retention_days * 86400
+        self.rollups: dict[int, dict[str, list]] = {}   # 구간 시작 시각 -> "workflow|server|client" -> METRICS 순서의 합계
+        self.offset = 0 # 집계에 반영한 기록 파일의 크기(bytes)
+        self.saved_offset = 0
+        self.recorded = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(ledger_fn)), exist_ok=True)
+        self._load_rollups()
+        self._replay()
+        self.save_task = asyncio.create_task(self.check_save(interval=interval))
+
+    def record(self, client_id:str, client:str, workflow:str, server:str, wait_seconds:float, execution_seconds:float,
+               input_bytes:int, output_bytes:int, timestamp:float=None):
+        """
+        끝난 작업 하나의 사용량을 기록하고 집계에 반영합니다.
+
+        Args:
+            client_id (str): client id
+            client (str): 요청자 (ex: client IP)
+            workflow (str): 워크플로우 alias
+            server (str): 작업을 실행한 ComfyUI 서버 주소
+            wait_seconds (float): 대기열에 등록한 뒤 실행이 시작되기까지 걸린 시간(초)
+            execution_seconds (float): 실행 시간(초)
+            input_bytes (int): 업로드한 input 파일의 크기 합계
+            output_bytes (int): 결과물의 크기 합계
+            timestamp (float, optional): 작업이 끝난 시각(unix time). None이면 현재 시각입니다.
+        """
+        entry = {
+            "ts": round(timestamp if timestamp is not None else time.time(), 3),
+            "client_id": client_id,
+            "client": client,
+            "workflow": workflow,
+            "server": server,
+            "wait_seconds": round(wait_seconds, 3),
+            "execution_seconds": round(execution_seconds, 3),
+            "input_bytes": input_bytes,
+            "output_bytes": output_bytes,
+        }
+        line = (json.dumps(entry) + "\n").encode('utf-8')
+        with self.lock:
+            with open(self.ledger_fn, mode="ab") as f:
+                f.write(line)
+            self.offset += len(line)
+            self._roll(entry)
+            self.recorded += 1
+
+    def query(self, start:float=None, end:float=None, bucket_seconds:int=None, group_by:list=None):
+        """
+        집계를 시간 구간과 기준 별로 다시 묶어 반환합니다. 기록 파일은 읽지 않습니다.
+
+        Args:
+            start (float, optional): 시작 시각(unix time). 이 시각이 포함된 구간부터 반환합니다. None이면 처음부터입니다.
+            end (float, optional): 끝 시각(unix time). 이 시각 이전에 시작한 구간까지 반환합니다. None이면 현재까지입니다.
+            bucket_seconds (int, optional): 반환할 시간 구간의 크기(초). 집계 구간 크기의 배수여야 합니다. None이면 집계 구간 크기입니다.
+            group_by (list, optional): 묶을 기준 목록 (workflow, server, client). None이면 workflow입니다.
+
+        Returns:
+            dict: 시간 구간과 기준 별 사용량 목록과 전체 합계
+
+        Raises:
+            ValueError: 구간 크기나 기준이 잘못되었을 때 발생
+        """
+        bucket_seconds = bucket_seconds if bucket_seconds is not None else self.bucket_seconds
+        if bucket_seconds <= 0 or bucket_seconds % self.bucket_seconds != 0:
+            raise ValueError(f"bucket must be a multiple of {self.bucket_seconds}, but got {bucket_seconds}")
+        group_by = group_by if group_by is not None else ["workflow"]
+        for dimension in group_by:
+            if dimension not in self.DIMENSIONS:
+                raise ValueError(f"groupBy must be in {self.DIMENSIONS}, but got '{dimension}'")
+        indices = [self.DIMENSIONS.index(dimension) for dimension in group_by]
+        start = start - start % self.bucket_seconds if start is not None else None
+
+        rows: dict[tuple, list] = {}
+        total = [0] * len(self.METRICS)
+        with self.lock:
+            for bucket, groups in self.rollups.items():
+                if (start is not None and bucket < start) or (end is not None and bucket >= end):
+                    continue
+                for key, metrics in groups.items():
+                    values = key.split("|")
+                    row = rows.setdefault((bucket - bucket % bucket_seconds, *[values[idx] for idx in indices]), [0] * len(self.METRICS))
+                    for idx, value in enumerate(metrics):
+                        row[idx] += value
+                        total[idx] += value
+
+        return {
+            "bucket": bucket_seconds,
+            "group_by": group_by,
+            "rows": [{"start": key[0],
+                      **{dimension: value or None for dimension, value in zip(group_by, key[1:])},
+                      **self._metrics_dict(metrics)} for key, metrics in sorted(rows.items())],
+            "total": self._metrics_dict(total),
+        }
+
+    async def check_save(self, interval:int):
+        """
+        주기적으로 보관 기간이 지난 집계를 삭제하고 집계를 저장합니다.
+
+        Args:
+            interval (int): 저장 간격(초)
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                with self.lock:
+                    self._remove_expired()
+                    if self.offset != self.saved_offset:
+                        self._save_rollups()
+            except OSError as e:
+                logging.error(f"[USAGE] SAVE FAILED / {e}")
+
+    def close(self):
+        """
+        집계를 저장합니다. 다음에 시작할 때 기록 파일을 재생하지 않기 위함입니다.
+        """
+        self.save_task.cancel()
+        with self.lock:
+            if self.offset != self.saved_offset:
+                self._save_rollups()
+
+    def stats(self):
+        """
+        사용량 기록 현황을 반환합니다.
+
+        Returns:
+            dict: 기록 파일 크기, 집계 구간 수, 시작한 뒤 기록한 작업 수
+        """
+        with self.lock:
+            return {
+                "file": self.ledger_fn,
+                "size": self.offset,
+                "bucket_seconds": self.bucket_seconds,
+                "buckets": len(self.rollups),
+                "recorded": self.recorded,
+            }
+
+    def _metrics_dict(self, metrics:list):
+        return {name: round(value, 3) if isinstance(value, float) else value for name, value in zip(self.METRICS, metrics)}
+
+    def _roll(self, entry:dict):
+        bucket = int(entry["ts"] - entry["ts"] % self.bucket_seconds)
+        key = "|".join(str(entry.get(dimension, None) or "") for dimension in self.DIMENSIONS)
+        metrics = self.rollups.setdefault(bucket, {}).setdefault(key, [0] * len(self.METRICS))
+        metrics[0] += 1
+        for idx, name in enumerate(self.METRICS[1:], start=1):
+            metrics[idx] += entry.get(name, 0) or 0
+
+    def _remove_expired(self):
+        oldest = time.time() - self.retention_seconds
+        for bucket in [bucket for bucket in self.rollups if bucket + self.bucket_seconds < oldest]:
+            del self.rollups[bucket]
+
+    def _save_rollups(self):
+        tmp_fn = self.rollup_fn + ".tmp"
+        with open(tmp_fn, mode="w") as f:
+            json.dump({"offset": self.offset, "bucket_seconds": self.bucket_seconds, "rollups": self.rollups}, f)
+        os.replace(tmp_fn, self.rollup_fn)
+        self.saved_offset = self.offset
+
+    def _load_rollups(self):
+        try:
+            with open(self.rollup_fn, mode="r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if saved.get("bucket_seconds", None) != self.bucket_seconds:
+            # 구간 크기가 바뀌었다면 기록 파일을 처음부터 재생합니다.
+            logging.warning("[USAGE] BUCKET SIZE IS CHANGED / rebuilding rollups from ledger")
+            return
+        self.rollups = {int(bucket): groups for bucket, groups in saved["rollups"].items()}
+        self.offset = self.saved_offset = saved["offset"]
+
+    def _replay(self):
+        try:
+            size = os.path.getsize(self.ledger_fn)
+        except OSError:
+            self.rollups, self.offset, self.saved_offset = {}, 0, 0
+            return
+        if size < self.offset:
+            # 기록 파일이 바뀌었다면 처음부터 재생합니다.
+            self.rollups, self.offset = {}, 0
+
+        replayed = 0
+        with open(self.ledger_fn, mode="r+b") as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # 기록 도중 종료되어 잘린 줄은 다음 기록과 이어지지 않도록 잘라냅니다.
+                    logging.warning(f"[USAGE] BROKEN LINE IS TRUNCATED / {len(line)} bytes")
+                    f.truncate(self.offset)
+                    break
+                try:
+                    self._roll(json.loads(line))
+                    replayed += 1
+                except (ValueError, TypeError, KeyError):
+                    logging.warning(f"[USAGE] BROKEN LINE IS IGNORED / {line.strip()[:80]}")
+                self.offset += len(line)
+        self._remove_expired()
+        logging.info(f"[USAGE] REPLAYED / {replayed} lines / {len(self.rollups)} buckets")
@@ -0,0 +1,142 @@
+import time
+import uuid
+import asyncio
+import logging
+from assistant import queue_prompt, get_history, delete_history
+
+class WarmupManager:
+    def __init__(self, workflows:dict, make_prompt_fn, on_warm=None, interval:int=1, timeout:int=300):
+        """
+        ComfyUI 서버에 가벼운 warmup prompt를 실행하여 모델을 미리 불러오고, 서버 별로 모델이 올라가 있는(hot) 워크플로우를 관리합니다.
+
+        Args:
+            workflows (dict): 워크플로우 alias -> {"inputs": warmup에 사용할 custom input, "servers": warmup할 서버 목록(None이면 모든 서버)}
+            make_prompt_fn (Callable): (워크플로우 alias, custom input)을 받아 ComfyUI prompt를 반환하는 함수
+            on_warm (Callable, optional): (서버 주소, 워크플로우 alias)를 받는 함수. warmup이 끝날 때마다 호출합니다.
+            interval (int, optional): warmup prompt의 완료를 확인하는 간격(초). 기본값은 1초입니다.
+            timeout (int, optional): warmup prompt 하나를 기다릴 최대 시간(초). 기본값은 300초입니다.
+        """
+        self.workflows = workflows
+        self.make_prompt_fn = make_prompt_fn
+        self.on_warm = on_warm
+        self.interval = interval
+        self.timeout = timeout
+
+        self.hot: dict[str, dict[str, float]] = {}   # 서버 -> 워크플로우 -> 마지막으로 실행한 시간
+        self.tasks: dict[str, asyncio.Task] = {}    # 서버 -> 진행 중인 warmup
+
+    def targets(self, server_address:str):
+        """
+        서버에서 warmup할 워크플로우 목록을 반환합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+
+        Returns:
+            list: 워크플로우 alias 목록
+        """
+        return [alias for alias, cur in self.workflows.items() if not cur.get("servers") or server_address in cur["servers"]]
+
+    def is_hot(self, server_address:str, workflow:str):
+        """
+        서버에 워크플로우의 모델이 올라가 있는지 확인합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            workflow (str): 워크플로우 alias
+
+        Returns:
+            bool: hot 여부
+        """
+        return workflow in self.hot.get(server_address, {})
+
+    def mark_hot(self, server_address:str, workflow:str):
+        """
+        서버에서 워크플로우를 실행했음을 기록합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            workflow (str): 워크플로우 alias
+        """
+        if workflow is not None:
+            self.hot.setdefault(server_address, {})[workflow] = time.time()
+
+    def mark_cold(self, server_address:str, workflows:list=None):
+        """
+        서버의 모델이 내려갔음을 기록합니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+            workflows (list, optional): 내려간 워크플로우 alias 목록. None이면 모든 워크플로우입니다.
+        """
+        if workflows is None:
+            self.hot.pop(server_address, None)
+            return
+        for workflow in workflows:
+            self.hot.get(server_address, {}).pop(workflow, None)
+
+    def schedule(self, server_address:str):
+        """
+        서버의 warmup을 백그라운드에서 시작합니다. 이미 진행 중이라면 새로 시작하지 않습니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+        """
+        task = self.tasks.get(server_address, None)
+        if task is not None and not task.done():
+            return
+        if len(self.targets(server_address)) == 0:
+            return
+        self.tasks[server_address] = asyncio.create_task(self.warmup(server_address))
+
+    async def warmup(self, server_address:str):
+        """
+        서버에서 warmup 대상 워크플로우를 차례로 실행합니다. 실패한 워크플로우는 건너뜁니다.
+
+        Args:
+            server_address (str): ComfyUI 서버 주소
+        """
+        for workflow in self.targets(server_address):
+            if self.is_hot(server_address, workflow):
+                continue
+            started_at = time.time()
+            try:
+                await self._run(server_address, workflow)
+            except Exception as e:
+                logging.warning(f"[WARMUP] FAILED / {workflow} / {e} / {server_address}")
+                continue
+            self.mark_hot(server_address, workflow)
+            if self.on_warm is not None:
+                self.on_warm(server_address, workflow)
+            logging.info(f"[WARMUP] DONE / {workflow} / {time.time() - started_at:.2f}s / {server_address}")
+
+    def stats(self):
+        """
+        서버 별 hot 워크플로우와 warmup 진행 여부를 반환합니다.
+
+        Returns:
+            dict: 서버 주소 -> {"hot": 워크플로우 alias 목록, "warming": warmup 진행 여부}
+        """
+        server_addresses = set(self.hot.keys()) | set(self.tasks.keys())
+        return {
+            server_address: {
+                "hot": sorted(self.hot.get(server_address, {}).keys()),
+                "warming": server_address in self.tasks and not self.tasks[server_address].done(),
+            } for server_address in server_addresses
+        }
+
+    async def _run(self, server_address:str, workflow:str):
+        prompt = self.make_prompt_fn(workflow, self.workflows[workflow].get("inputs", {}))
+        result = await asyncio.to_thread(queue_prompt, prompt, f"bridge_warmup_{uuid.uuid4().hex}", server_address)
+        prompt_id = result["prompt_id"]
+
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            history = (await asyncio.to_thread(get_history, prompt_id, server_address)).get(prompt_id, None)
+            if history is not None:
+                await asyncio.to_thread(delete_history, prompt_id, server_address)
+                if history.get("status", {}).get("status_str", None) == "error":
+                    raise RuntimeError(f"warmup prompt execution failed / {prompt_id}")
+                return
+            await asyncio.sleep(self.interval)
+        raise TimeoutError(f"warmup prompt is not done in {self.timeout}s / {prompt_id}")
@@ -0,0 +1,301 @@
+import hmac
+import json
+import time
+import uuid
+import socket
+import random
+import asyncio
+import hashlib
+import logging
+import aiohttp
+import ipaddress
+from urllib.parse import urlparse
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+class WebhookQueueFullError(Exception):
+    def __init__(self, pending:int):
+        """
+        전송 대기 중인 webhook이 너무 많을 때 발생하는 예외입니다.
+
+        Args:
+            pending (int): 전송 대기 중인 webhook 수
+        """
+        super().__init__(f"webhook queue is full / {pending} deliveries are pending")
+        self.pending = pending
+
+class WebhookDelivery:
+    def __init__(self, url:str, payload:dict, files:list=None):
+        """
+        callback URL로 보낼 webhook 하나입니다.
+
+        Args:
+            url (str): callback URL
+            payload (dict): 서명하여 보낼 JSON payload
+            files (list, optional): multipart로 함께 보낼 (파일 이름, 파일 내용(bytes), MIME 타입) 튜플 목록. None이면 JSON만 보냅니다.
+        """
+        self.id = uuid.uuid4().hex  # 재시도해도 바뀌지 않으므로 수신 측에서 중복 제거에 사용
+        self.url = url
+        self.payload = payload
+        self.files = files
+        self.attempts = 0
+        self.created = time.time()
+
+class CallbackResolver(AbstractResolver):
+    def __init__(self, is_blocked_fn):
+        """
+        callback URL의 호스트를 연결할 때마다 다시 확인하여, 차단한 주소로 연결하지 않도록 하는 resolver입니다.
+        요청을 받을 때 확인한 뒤 DNS 응답이 바뀌더라도(DNS rebinding) 내부 주소로 보내지 않기 위함입니다.
+
+        Args:
+            is_blocked_fn (Callable): (IP, port)를 받아 차단할 주소인지 반환하는 함수
+        """
+        self.resolver = DefaultResolver()
+        self.is_blocked_fn = is_blocked_fn
+
+    async def resolve(self, host:str, port:int=0, family:int=socket.AF_INET):
+        hosts = await self.resolver.resolve(host, port, family)
+        allowed = [cur for cur in hosts if not self.is_blocked_fn(cur["host"], port)]
+        if len(allowed) == 0:
+            raise OSError(f"callback host '{host}' resolves to a blocked address")
+        return allowed
+
+    async def close(self):
+        await self.resolver.close()
+
+class WebhookDispatcher:
+    def __init__(self, secret:str, max_concurrency:int=4, max_retries:int=3, retry_backoff:float=1.0,
+                 timeout:float=30, max_pending:int=1000, allowed_hosts:list=None, blocked_addresses:list=None, allow_loopback:bool=False):
+        """
+        작업이 끝나면 callback URL로 결과를 보내는 webhook 전송 대기열을 초기화합니다.
+        요청 처리와 분리된 worker가 max_concurrency개까지 동시에 전송하며, 연결 오류, 5xx, 429 응답은 지수 백오프로 재시도합니다.
+        body는 'X-Bridge-Signature' 헤더에 HMAC-SHA256으로 서명합니다.
+        callback URL은 허용한 호스트만 사용할 수 있고, 호스트가 loopback, 사설, link-local 주소나 ComfyUI 서버 주소로 해석되면 보내지 않습니다.
+
+        Args:
+            secret (str): 서명에 사용할 비밀 키. 비어 있으면 초기화하지 않습니다.
+            max_concurrency (int, optional): 동시에 전송할 최대 webhook 수. 기본값은 4입니다.
+            max_retries (int, optional): 전송에 실패했을 때 재시도할 최대 횟수. 기본값은 3입니다.
+            retry_backoff (float, optional): 첫 재시도까지 기다릴 시간(초). 재시도마다 두 배로 늘어납니다. 기본값은 1초입니다.
+            timeout (float, optional): 전송 한 번의 최대 시간(초). 기본값은 30초입니다.
+            max_pending (int, optional): 전송 대기 중인 webhook의 최대 수. 기본값은 1000입니다.
+            allowed_hosts (list): callback URL로 허용할 호스트 목록. 비어 있으면 초기화하지 않습니다.
+            blocked_addresses (list, optional): 허용한 호스트라도 보내지 않을 주소('host:port') 목록 (ex: ComfyUI 서버 주소)
+            allow_loopback (bool, optional): loopback 주소로 보내는 것을 허용할지 여부. 같은 호스트에서 수신하는 테스트용입니다. 기본값은 False입니다.
+
+        Raises:
+            ValueError: secret이나 allowed_hosts가 비어 있을 때 발생
+        """
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET is not set. webhooks must be signed to enable webhook")
+        self.secret = secret.encode('utf-8')
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.allowed_hosts = set(allowed_hosts or [])
+        if len(self.allowed_hosts) == 0:
+            raise ValueError("webhook allowed_hosts is empty. callback hosts must be listed to enable webhook")
+        self.blocked_addresses = list(blocked_addresses or [])
+        self.allow_loopback = allow_loopback
+        self.blocked_endpoints = None   # blocked_addresses를 해석한 (IP, port) 목록. 처음 확인할 때 해석합니다.
+
+        self.queue: asyncio.Queue[WebhookDelivery] = asyncio.Queue()
+        self.retrying = 0   # 재시도를 기다리는 webhook 수
+        self.sending = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout),
+                                             connector=aiohttp.TCPConnector(resolver=CallbackResolver(self.is_blocked)))
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(max_concurrency)]
+
+    async def check_url(self, url:str):
+        """
+        callback URL을 사용할 수 있는지 확인합니다. 호스트를 해석하여 차단한 주소가 하나라도 있다면 사용할 수 없습니다.
+
+        Args:
+            url (str): callback URL
+
+        Raises:
+            ValueError: http(s) URL이 아니거나, 허용하지 않는 호스트이거나, 차단한 주소로 해석될 때 발생
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError(f"callback must be http(s) url, but got '{url}'")
+        if parsed.hostname not in self.allowed_hosts:
+            raise ValueError(f"callback host '{parsed.hostname}' is not allowed")
+
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        await self._resolve_blocked_addresses()
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise ValueError(f"callback host '{parsed.hostname}' is not resolved / {e}")
+        for info in infos:
+            if self.is_blocked(info[4][0], port):
+                raise ValueError(f"callback host '{parsed.hostname}' resolves to a blocked address '{info[4][0]}'")
+
+    def is_blocked(self, ip:str, port:int):
+        """
+        callback을 보내면 안 되는 주소인지 확인합니다.
+
+        Args:
+            ip (str): 해석한 IP 주소
+            port (int): 연결할 port
+
+        Returns:
+            bool: loopback(allow_loopback이 아닐 때), 사설, link-local, multicast, 예약된 주소이거나 차단한 주소라면 True
+        """
+        try:
+            address = ipaddress.ip_address(ip.split("%")[0])
+        except ValueError:
+            return True
+        if getattr(address, "ipv4_mapped", None) is not None:
+            address = address.ipv4_mapped
+        if (str(address), port) in (self.blocked_endpoints or ()):
+            return True
+        if address.is_loopback:
+            return not self.allow_loopback
+        return address.is_private or address.is_link_local or address.is_multicast or address.is_reserved or address.is_unspecified
+
+    async def _resolve_blocked_addresses(self):
+        if self.blocked_endpoints is not None:
+            return
+        endpoints = set()
+        for cur in self.blocked_addresses:
+            host, _, port = cur.rpartition(":")
+            try:
+                infos = await asyncio.get_running_loop().getaddrinfo(host.strip("[]"), int(port), type=socket.SOCK_STREAM)
+            except (socket.gaierror, ValueError) as e:
+                logging.warning(f"[WEBHOOK] BLOCKED ADDRESS IS NOT RESOLVED / {e} / {cur}")
+                continue
+            endpoints.update((str(ipaddress.ip_address(info[4][0].split("%")[0])), int(port)) for info in infos)
+        self.blocked_endpoints = endpoints
+
+    def pending(self):
+        return self.queue.qsize() + self.retrying + self.sending
+
+    def enqueue(self, delivery:WebhookDelivery):
+        """
+        webhook을 전송 대기열에 추가합니다.
+
+        Args:
+            delivery (WebhookDelivery): 보낼 webhook
+
+        Raises:
+            WebhookQueueFullError: 전송 대기 중인 webhook이 너무 많을 때 발생
+        """
+        if self.pending() >= self.max_pending:
+            self.failed += 1
+            raise WebhookQueueFullError(self.pending())
+        self.queue.put_nowait(delivery)
+        logging.debug(f"[WEBHOOK] QUEUED / {delivery.id} / {delivery.url}")
+
+    def sign(self, body:bytes, timestamp:str):
+        """
+        '{timestamp}.{body}'를 HMAC-SHA256으로 서명합니다. 수신 측은 같은 방법으로 계산하여 비교하고, timestamp로 재전송 공격을 거릅니다.
+
+        Args:
+            body (bytes): 서명할 JSON payload
+            timestamp (str): 전송 시각(unix time)
+
+        Returns:
+            str: 'sha256={hex digest}'
+        """
+        digest = hmac.new(self.secret, timestamp.encode('utf-8') + b"." + body, hashlib.sha256).hexdigest()
+        return f"sha256={digest}"
+
+    def stats(self):
+        """
+        webhook 전송 현황을 반환합니다.
+
+        Returns:
+            dict: 대기 중, 재시도 대기 중, 전송 중인 webhook 수와 지금까지 성공, 실패, 재시도한 횟수
+        """
+        return {
+            "queued": self.queue.qsize(),
+            "retrying": self.retrying,
+            "sending": self.sending,
+            "max_concurrency": self.max_concurrency,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+    async def close(self):
+        """
+        worker와 세션을 종료합니다. 전송하지 못한 webhook은 버립니다.
+        """
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        await self.session.close()
+
+    async def _worker(self):
+        while True:
+            delivery = await self.queue.get()
+            self.sending += 1
+            try:
+                await self._deliver(delivery)
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"[WEBHOOK] UNKNOWN ERROR / {e} / {delivery.id}")
+            finally:
+                self.sending -= 1
+
+    async def _deliver(self, delivery:WebhookDelivery):
+        delivery.attempts += 1
+        body = json.dumps(delivery.payload).encode('utf-8')
+        timestamp = str(int(time.time()))
+        headers = {
+            "X-Bridge-Delivery": delivery.id,
+            "X-Bridge-Attempt": str(delivery.attempts),
+            "X-Bridge-Timestamp": timestamp,
+            "X-Bridge-Signature": self.sign(body, timestamp),
+        }
+
+        try:
+            # 연결할 주소는 CallbackResolver가 다시 확인합니다.
+            await self._resolve_blocked_addresses()
+            if delivery.files is None:
+                headers["Content-Type"] = "application/json"
+                data = body
+            else:
+                # 결과물은 payload에 담긴 sha256으로 서명에 포함됩니다.
+                data = aiohttp.FormData()
+                data.add_field("payload", body, content_type="application/json")
+                for idx, (file_name, file_content, content_type) in enumerate(delivery.files):
+                    data.add_field(f"result_{idx}", file_content, content_type=content_type, filename=file_name)
+
+            # 다른 주소로 redirect되어 확인하지 않은 호스트로 보내지 않도록 합니다.
+            async with self.session.post(delivery.url, data=data, headers=headers, allow_redirects=False) as response:
+                status = response.status
+            retryable = status >= 500 or status == 429
+            error = None if status < 300 else f"status {status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            retryable = True
+            error = str(e) or type(e).__name__
+
+        if error is None:
+            self.delivered += 1
+            logging.info(f"[WEBHOOK] DELIVERED / {delivery.attempts} / {delivery.id} / {delivery.url}")
+        elif retryable and delivery.attempts <= self.max_retries:
+            self.retries += 1
+            self.retrying += 1
+            # 여러 webhook이 한꺼번에 재시도하지 않도록 지터를 더합니다.
+            delay = self.retry_backoff * 2 ** (delivery.attempts - 1) * random.uniform(1, 1.5)
+            logging.warning(f"[WEBHOOK] RETRY / {error} / {delivery.attempts} / {round(delay, 1)}s / {delivery.id}")
+            asyncio.create_task(self._retry_later(delivery, delay))
+        else:
+            self.failed += 1
+            logging.error(f"[WEBHOOK] FAILED / {error} / {delivery.attempts} / {delivery.id} / {delivery.url}")
+
+    async def _retry_later(self, delivery:WebhookDelivery, delay:float):
+        # 재시도를 기다리는 동안 worker를 붙잡지 않습니다.
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.retrying -= 1
+        self.queue.put_nowait(delivery)
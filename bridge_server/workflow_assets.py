@@ -0,0 +1,237 @@
+import os, json
+import shutil
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import urllib.parse
+from executor import Executor
+from transcoder import transcode_image
+
+class WorkflowAssets:
+    KINDS = ("thumbnail", "descimage")
+
+    def __init__(self, wf_dir:str, executor:Executor, cache_dir:str=None, sizes:list=None):
+        """
+        workflows/thumbnail, workflows/descimage의 이미지를 내용 해시와 함께 관리합니다.
+        cache_dir가 주어지면 크기 별 WebP 파생 이미지를 만들어 내용 해시 별로 디스크에 보관하고,
+        다시 시작할 때는 바뀐 파일만 다시 만듭니다.
+
+        Args:
+            wf_dir (str): 워크플로우가 저장되어 있는 폴더 경로
+            executor (Executor): 해시 계산과 파생 이미지를 만들 때 사용할 executor
+            cache_dir (str, optional): 파생 이미지와 index를 저장할 폴더 경로. None이면 원본만 제공합니다.
+            sizes (list, optional): 만들 파생 이미지의 긴 변 크기(px) 목록. 기본값은 [128, 256, 512]입니다.
+        """
+        self.wf_dir = wf_dir
+        self.cache_dir = cache_dir
+        self.sizes = sorted(sizes or [128, 256, 512])
+        self.executor = executor
+        self.index_fn = os.path.join(cache_dir, "index.json") if cache_dir is not None else None
+
+        self.entries: dict[tuple, dict] = {}    # (종류, 파일 이름) -> {"stat", "etag", "content", "content_type"}
+        self.index: dict[str, dict] = {}    # "종류/파일 이름" -> {"stat", "hash"}. 다시 시작할 때 해시 계산을 건너뜁니다.
+        self.variants: dict[tuple, bytes] = {}  # (내용 해시, 크기) -> 파생 이미지
+        self.pending: dict[str, asyncio.Task] = {}  # 파생 이미지를 만들고 있는 내용 해시
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            try:
+                with open(self.index_fn, mode="r") as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                self.index = {}
+
+    async def build(self):
+        """
+        모든 thumbnail, desc image의 파생 이미지를 만듭니다. 이미 만든 내용 해시는 건너뛰고, 사용하지 않는 파생 이미지는 삭제합니다.
+        """
+        if self.cache_dir is None:
+            return
+        started_at = asyncio.get_running_loop().time()
+        sources = {}    # 내용 해시 -> 원본 경로. 내용이 같은 이미지는 한 번만 만듭니다.
+        for kind in self.KINDS:
+            kind_dir = os.path.join(self.wf_dir, kind)
+            if not os.path.isdir(kind_dir):
+                continue
+            for name in sorted(os.listdir(kind_dir)):
+                content_type = mimetypes.guess_type(name)[0]
+                if content_type is None or not content_type.startswith("image/"):
+                    continue
+                entry_hash = await self.executor.run(self._hash, kind, name)
+                if entry_hash is not None:
+                    sources.setdefault(entry_hash, os.path.join(kind_dir, name))
+        for entry_hash, path in sources.items():
+            if entry_hash not in self.pending:
+                self.pending[entry_hash] = asyncio.create_task(self._derive(entry_hash, path))
+        await asyncio.gather(*[self.pending[entry_hash] for entry_hash in sources.keys() if entry_hash in self.pending])
+
+        # 지워진 원본의 파생 이미지와 index 항목을 정리합니다.
+        hashes = set(sources.keys())
+        self.index = {key: cur for key, cur in self.index.items() if cur["hash"] in hashes}
+        for cur in os.listdir(self.cache_dir):
+            if os.path.isdir(os.path.join(self.cache_dir, cur)) and cur not in hashes:
+                shutil.rmtree(os.path.join(self.cache_dir, cur), ignore_errors=True)
+        self._save_index()
+        logging.info(f"[ASSETS] BUILT / {len(hashes)} images / {asyncio.get_running_loop().time() - started_at:.2f}s")
+
+    def url(self, kind:str, name:str, size:int=None):
+        """
+        이미지의 URL을 반환합니다. 내용 해시를 쿼리에 담아 이미지가 바뀌면 URL도 바뀝니다.
+        해시를 계산하기 위해 파일을 읽을 수 있으므로 executor에서 호출해야 합니다.
+
+        Args:
+            kind (str): 이미지 종류 (thumbnail, descimage)
+            name (str): 파일 이름
+            size (int, optional): 파생 이미지의 크기. None이면 원본입니다.
+
+        Returns:
+            str or None: 이미지 URL. 파일이 없다면 None
+        """
+        if not self._is_valid_name(kind, name):
+            return None
+        entry_hash = self._hash(kind, name)
+        if entry_hash is None:
+            return None
+        url = f"/{kind}/{urllib.parse.quote(name)}?v={entry_hash[:16]}"
+        if size is not None and self.cache_dir is not None:
+            url += f"&size={size}"
+        return url
+
+    async def get(self, kind:str, name:str, size:int=None):
+        """
+        이미지를 가져옵니다. 파생 이미지가 아직 없다면 만들기 시작하고 원본을 반환합니다.
+        원본을 읽고 해시를 계산하는 작업은 executor에서 실행합니다.
+
+        Args:
+            kind (str): 이미지 종류 (thumbnail, descimage)
+            name (str): 파일 이름
+            size (int, optional): 파생 이미지의 크기. None이면 원본입니다.
+
+        Returns:
+            dict or None: {"etag", "content", "content_type", "is_variant"}. 파일이 없다면 None
+        """
+        if not self._is_valid_name(kind, name):
+            return None
+        entry = await self.executor.run(self._load, kind, name)
+        if entry is None or size is None or self.cache_dir is None:
+            return entry
+
+        variant = self.variants.get((entry["etag"], size), None)
+        if variant is None:
+            variant = await self.executor.run(self._get_variant, entry["etag"], size)
+        if variant is None:
+            # 실행 중에 바뀐 이미지는 요청될 때 파생 이미지를 만듭니다.
+            if entry["etag"] not in self.pending:
+                path = os.path.join(self.wf_dir, kind, name)
+                self.pending[entry["etag"]] = asyncio.create_task(self._derive(entry["etag"], path, save_index=True))
+            return entry
+        return {"etag": f"{entry['etag']}-{size}", "content": variant, "content_type": "image/webp", "is_variant": True}
+
+    def parse_size(self, size:str):
+        """
+        요청한 파생 이미지 크기를 검사합니다.
+
+        Args:
+            size (str): 크기(px) 또는 original
+
+        Returns:
+            int or None: 크기. 원본이라면 None
+
+        Raises:
+            ValueError: 지원하지 않는 크기일 때 발생
+        """
+        if size is None or size == "original" or self.cache_dir is None:
+            return None
+        size = int(size)
+        if size not in self.sizes:
+            raise ValueError(f"size is must be [{', '.join(str(cur) for cur in self.sizes)}, original] but got {size}")
+        return size
+
+    async def _derive(self, entry_hash:str, path:str, save_index:bool=False):
+        variant_dir = os.path.join(self.cache_dir, entry_hash)
+        missing = [size for size in self.sizes if not os.path.exists(os.path.join(variant_dir, f"{size}.webp"))]
+        try:
+            if len(missing) == 0:
+                return
+            os.makedirs(variant_dir, exist_ok=True)
+            results = await asyncio.gather(*[self.executor.run_process(transcode_image, path, "WEBP", 85, size) for size in missing],
+                                           return_exceptions=True)
+            for size, result in zip(missing, results):
+                if isinstance(result, Exception):
+                    logging.warning(f"[ASSETS] DERIVE FAILED / {size} / {result} / {path}")
+                    continue
+                variant_fn = os.path.join(variant_dir, f"{size}.webp")
+                with open(variant_fn + ".tmp", mode="wb") as f:
+                    f.write(result)
+                os.replace(variant_fn + ".tmp", variant_fn)
+            logging.debug(f"[ASSETS] DERIVED / {missing} / {path}")
+            if save_index == True:
+                self._save_index()
+        finally:
+            self.pending.pop(entry_hash, None)
+
+    def _load(self, kind:str, name:str):
+        # stat이 같다면 메모리에 올려둔 원본을 사용합니다.
+        path = os.path.join(self.wf_dir, kind, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.entries.pop((kind, name), None)
+            return None
+
+        entry = self.entries.get((kind, name), None)
+        if entry is None or entry["stat"] != (stat.st_mtime_ns, stat.st_size):
+            with open(path, mode="rb") as f:
+                content = f.read()
+            entry = {
+                "stat": (stat.st_mtime_ns, stat.st_size),
+                "etag": hashlib.sha256(content).hexdigest(),
+                "content": content,
+                "content_type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+                "is_variant": False,
+            }
+            self.entries[(kind, name)] = entry
+            if self.cache_dir is not None:
+                self.index[f"{kind}/{name}"] = {"stat": [stat.st_mtime_ns, stat.st_size], "hash": entry["etag"]}
+        return entry
+
+    def _get_variant(self, entry_hash:str, size:int):
+        variant = self.variants.get((entry_hash, size), None)
+        if variant is None:
+            try:
+                with open(os.path.join(self.cache_dir, entry_hash, f"{size}.webp"), mode="rb") as f:
+                    variant = f.read()
+            except OSError:
+                return None
+            self.variants[(entry_hash, size)] = variant
+        return variant
+
+    def _hash(self, kind:str, name:str):
+        # index의 stat이 같다면 파일을 읽지 않고 기록된 해시를 사용합니다.
+        path = os.path.join(self.wf_dir, kind, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        cur = self.index.get(f"{kind}/{name}", None)
+        if cur is not None and cur["stat"] == [stat.st_mtime_ns, stat.st_size]:
+            return cur["hash"]
+        if self.cache_dir is None:
+            entry = self._load(kind, name)
+            return entry["etag"] if entry is not None else None
+
+        # 원본을 메모리에 올리지 않도록 나눠 읽으며 해시를 계산합니다.
+        file_hash = hashlib.sha256()
+        with open(path, mode="rb") as f:
+            for chunk in iter(lambda: f.read(1024**2), b''):
+                file_hash.update(chunk)
+        self.index[f"{kind}/{name}"] = {"stat": [stat.st_mtime_ns, stat.st_size], "hash": file_hash.hexdigest()}
+        return file_hash.hexdigest()
+
+    def _is_valid_name(self, kind:str, name:str):
+        return kind in self.KINDS and name is not None and name == os.path.basename(name)
+
+    def _save_index(self):
+        with open(self.index_fn, mode="w") as f:
+            json.dump(self.index, f)
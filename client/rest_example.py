@@ -1,4 +1,4 @@
-import os
+import os, json
 import asyncio
 import aiofiles
 import requests
@@ -53,12 +53,11 @@ def post_request(api, data, client_id=None):
     except requests.RequestException as e:
         print(e)
 
-async def get_history(client_id, download=True):
-    await asyncio.sleep(1)
+async def get_history(client_id, download=True, wait=60):
     try:
         async with aiohttp.ClientSession() as session:
             response = await session.get(
-                url=f'http://{server_address}/history?clientId={client_id}')
+                url=f'http://{server_address}/history?clientId={client_id}&wait={wait}')
 
             if download == True and response.status == 200:
                 
@@ -132,24 +131,14 @@ async def save_file_from_part(part, default_filename='downloaded_file'):
     return save_path
 
 async def tracing(ci):
-    timeout_count = 0
-    ex_info_before = None
-    while True:
-        await asyncio.sleep(0.5)
-        ex_info = get_request("execution-info", query={"clientId": ci})
-        print(ex_info)
-
-        if ex_info_before == ex_info:
-            timeout_count += 1
-        else:
-            ex_info_before = ex_info
-            timeout_count = 0
-
-        if timeout_count > 500:
-            print("time out too long delay")
-            break
-        elif ex_info.get("status", None) == "closed": 
-            break
+    # Server-Sent Events로 진행 상태를 받음. status가 closed/error가 되면 서버가 스트림을 닫음
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url=f'http://{server_address}/events?clientId={ci}') as response:
+            async for line in response.content:
+                line = line.decode('utf-8').strip()
+                if line.startswith("data:"):
+                    ex_info = json.loads(line[len("data:"):])
+                    print(ex_info)
 
 async def run_client(client_id, data):
     post_request("generate-based-workflow", data, client_id)